@@ -0,0 +1,459 @@
+"""Execution of the actions triggered by keystrokes.
+
+An action is either a command to execute (CommandAction) or a call to a Python 
+plugin loaded once in-process (PluginAction).
+
+Actions are executed by a bounded pool of worker threads, so that reading events 
+from the devices never waits for an action to complete (or by tasks of an asyncio 
+event loop, see AsyncActionExecutor). 
+Each action has a concurrency policy which decides what happens when it is 
+triggered while a previous invocation of the same action is still in progress.
+
+The modules needed for executing actions (subprocess, concurrent.futures, asyncio) are only 
+imported once actions are prepared or executed, keeping them off the startup path.
+
+Sources:
+    https://github.com/Dvd848/macro_keyboard
+
+License:
+    LGPL v2.1
+
+    This library is free software; you can redistribute it and/or
+    modify it under the terms of the GNU Lesser General Public
+    License as published by the Free Software Foundation; either
+    version 2.1 of the License, or (at your option) any later version.
+
+    This library is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+    Lesser General Public License for more details.
+
+    You should have received a copy of the GNU Lesser General Public
+    License along with this library; if not, write to the Free Software
+    Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301  USA
+
+"""
+import collections
+import enum
+import threading
+import time
+
+from collections import namedtuple
+from typing import Any, Callable, Deque, Dict, List, Optional, Set
+
+class ConcurrencyPolicy(enum.Enum):
+    """What to do when an action is triggered while it is already running."""
+
+    # Run the new invocation after the previous ones are done
+    QUEUE   = "queue"
+
+    # Ignore the new invocation
+    DROP    = "drop"
+
+    # Cancel the running invocation (and any queued ones) and run the new one instead
+    RESTART = "restart"
+
+class Action():
+    """An action to execute in response to a keystroke."""
+
+    def __init__(self, name: Optional[str] = None, policy: ConcurrencyPolicy = ConcurrencyPolicy.QUEUE):
+        """Initialize an action.
+
+        Args:
+            name:
+                Optional name of the action.
+
+            policy:
+                Behavior when the action is triggered while already running.
+        """
+        self.name = name
+        self.policy = policy
+
+    def create_invocation(self) -> "Invocation":
+        """Create a new (not yet started) invocation of the action."""
+        raise NotImplementedError()
+
+    def prepare(self) -> None:
+        """Prepare for future invocations of the action (e.g. warm up caches), without blocking."""
+        pass
+
+class CommandAction(Action):
+    """An action which executes a command compatible with subprocess.run."""
+
+    def __init__(self, command: List[str], name: Optional[str] = None, 
+                 policy: ConcurrencyPolicy = ConcurrencyPolicy.QUEUE):
+        """Initialize an action.
+
+        Args:
+            command:
+                The command to execute, e.g. ["ls", "-l"].
+
+            name:
+                Optional name of the action.
+
+            policy:
+                Behavior when the action is triggered while already running.
+        """
+        super().__init__(name, policy)
+        self.command = command
+
+    def __str__(self) -> str:
+        return str(self.command)
+
+    def create_invocation(self) -> "Invocation":
+        return CommandInvocation(self)
+
+    def prepare(self) -> None:
+        """Import subprocess ahead of the first invocation."""
+        import subprocess
+
+class PluginAction(Action):
+    """An action which calls a Python callable (usually a method of a plugin) in-process.
+
+    This saves the cost of starting a new process (and interpreter) for every keystroke.
+    """
+
+    def __init__(self, function: Callable[..., Any], args: List[Any], kwargs: Dict[str, Any], 
+                 name: Optional[str] = None, policy: ConcurrencyPolicy = ConcurrencyPolicy.QUEUE):
+        """Initialize an action.
+
+        Args:
+            function:
+                The callable to call, e.g. KodiPlayer("192.168.1.50:8080").stop.
+
+            args:
+                Positional arguments for the call.
+
+            kwargs:
+                Keyword arguments for the call.
+
+            name:
+                Optional name of the action.
+
+            policy:
+                Behavior when the action is triggered while already running.
+        """
+        super().__init__(name, policy)
+        self.function = function
+        self.args = args
+        self.kwargs = kwargs
+
+    def __str__(self) -> str:
+        arguments = [repr(arg) for arg in self.args] + [f"{key}={value!r}" for key, value in self.kwargs.items()]
+        return f"{self.function.__qualname__}({', '.join(arguments)})"
+
+    def create_invocation(self) -> "Invocation":
+        return PluginInvocation(self)
+
+    def prepare(self) -> None:
+        """Let the plugin prepare for the call, if it implements prepare_action(method, args, kwargs)."""
+        prepare_action = getattr(getattr(self.function, "__self__", None), "prepare_action", None)
+        if prepare_action is not None:
+            prepare_action(self.function.__name__, self.args, self.kwargs)
+
+class Invocation():
+    """A single, cancellable execution of an action.
+
+    The times (as in time.time()) at which the invocation went through its stages 
+    are kept for measuring latency, see ActionExecutor.
+    """
+
+    def __init__(self, action: Action):
+        self.action = action
+        self._lock = threading.Lock()
+        self._cancelled = False
+
+        # Opaque information about what triggered the invocation, see ActionExecutor.submit
+        self.trigger = None
+        self.submitted = time.time()
+        self.started: Optional[float] = None
+        # Set by invocations which start a process, once it is created
+        self.spawned: Optional[float] = None
+        self.finished: Optional[float] = None
+
+    @property
+    def cancelled(self) -> bool:
+        """True if the invocation was cancelled."""
+        return self._cancelled
+
+    def run(self) -> None:
+        """Execute the action and wait for it to complete, unless it was cancelled."""
+        raise NotImplementedError()
+
+    async def run_async(self) -> None:
+        """Same as run, from a running asyncio event loop.
+
+        By default, run is called from a worker thread of the event loop.
+        """
+        import asyncio
+        await asyncio.get_running_loop().run_in_executor(None, self.run)
+
+    def cancel(self) -> None:
+        """Cancel the invocation, interrupting it if possible."""
+        with self._lock:
+            self._cancelled = True
+
+class CommandInvocation(Invocation):
+    """A single execution of a CommandAction."""
+
+    def __init__(self, action: CommandAction):
+        super().__init__(action)
+        self._process = None
+
+    def run(self) -> None:
+        with self._lock:
+            if self._cancelled:
+                return
+            import subprocess
+            self._process = subprocess.Popen(self.action.command)
+            self.spawned = time.time()
+        self._process.wait()
+
+    async def run_async(self) -> None:
+        """Same as run, waiting for the command without blocking the event loop."""
+        import asyncio
+        if self._cancelled:
+            return
+        self._process = await asyncio.create_subprocess_exec(*self.action.command)
+        self.spawned = time.time()
+        if self._cancelled:
+            # Cancelled while the process was being created
+            self._process.terminate()
+        await self._process.wait()
+
+    def cancel(self) -> None:
+        """Cancel the invocation, terminating the command if it is running."""
+        with self._lock:
+            self._cancelled = True
+            # Either a subprocess.Popen or an asyncio.subprocess.Process
+            if self._process is not None and self._process.returncode is None:
+                self._process.terminate()
+
+class PluginInvocation(Invocation):
+    """A single execution of a PluginAction.
+
+    A running call can't be interrupted, cancelling it only prevents it from starting.
+    """
+
+    def run(self) -> None:
+        with self._lock:
+            if self._cancelled:
+                return
+        result = self.action.function(*self.action.args, **self.action.kwargs)
+        if result is not None:
+            print(result)
+
+    async def run_async(self) -> None:
+        """Same as run, awaiting the function on the event loop if it is a coroutine function."""
+        import asyncio
+        if not asyncio.iscoroutinefunction(self.action.function):
+            await super().run_async()
+            return
+        if self._cancelled:
+            return
+        result = await self.action.function(*self.action.args, **self.action.kwargs)
+        if result is not None:
+            print(result)
+
+# An action which is running or has pending invocations (see ActionExecutor.in_flight): 
+# its running Invocation (or None if waiting for a worker) and the number of pending invocations
+ActionStatus = namedtuple("ActionStatus", "action running pending")
+
+class _ActionState():
+    """Invocations of a single action, running and pending."""
+
+    def __init__(self):
+        self.running = None
+        self.pending: Deque[Invocation] = collections.deque()
+
+    @property
+    def active(self) -> bool:
+        return self.running is not None or len(self.pending) > 0
+
+class ActionExecutor():
+    """Executes actions using a bounded pool of worker threads.
+
+    Implemented as a context manager, which waits for the running actions upon exit.
+
+    Invocations of the same action are executed one after the other (according to the
+    action's concurrency policy), while different actions run concurrently, up to the
+    number of workers.
+
+    Example usage:
+
+    >>> with ActionExecutor(max_workers = 4) as executor:
+    ...     executor.submit(CommandAction(["whoami"]))
+    """
+
+    def __init__(self, max_workers: int = 4, on_done: Optional[Callable[[Invocation], None]] = None):
+        """Initialize the executor.
+
+        Args:
+            max_workers:
+                Maximum number of actions to execute concurrently.
+
+            on_done:
+                Callback to call (from the worker thread) with every invocation which 
+                completed without an error, e.g. for measuring its latency.
+        """
+        self._max_workers = max_workers
+        self._on_done = on_done
+        self._pool = None
+        self._lock = threading.Lock()
+        self._states: Dict[Action, _ActionState] = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.shutdown()
+
+    def start(self) -> None:
+        """Start the pool of workers ahead of the first action (otherwise started by the first action)."""
+        with self._lock:
+            self._start()
+
+    def shutdown(self) -> None:
+        """Wait for the running and pending actions to complete and release the workers."""
+        with self._lock:
+            pool = self._pool
+        if pool is not None:
+            pool.shutdown(wait = True)
+
+    def submit(self, action: Action, trigger: Any = None) -> None:
+        """Schedule the action for execution without waiting for it.
+
+        Args:
+            action:
+                The action to execute.
+
+            trigger:
+                What triggered the action, kept as the trigger of the invocation.
+        """
+        with self._lock:
+            state = self._states.setdefault(action, _ActionState())
+            was_active = state.active
+
+            if action.policy == ConcurrencyPolicy.DROP and was_active:
+                print(f"Action {action} is already running, ignoring")
+                return
+            
+            if action.policy == ConcurrencyPolicy.RESTART:
+                state.pending.clear()
+                if state.running is not None:
+                    state.running.cancel()
+
+            invocation = action.create_invocation()
+            invocation.trigger = trigger
+            state.pending.append(invocation)
+            if not was_active:
+                self._schedule(state)
+
+    def in_flight(self) -> List[ActionStatus]:
+        """Return the actions which are running or have pending invocations."""
+        with self._lock:
+            return [ActionStatus(action, state.running, len(state.pending)) 
+                    for action, state in self._states.items() if state.active]
+
+    def _schedule(self, state: _ActionState) -> None:
+        """Start running the pending invocations of an action, must be called with the lock held."""
+        self._start().submit(self._run_pending, state)
+
+    def _start(self) -> "concurrent.futures.ThreadPoolExecutor":
+        """Create the pool of workers if not created yet, must be called with the lock held."""
+        if self._pool is None:
+            import concurrent.futures
+            self._pool = concurrent.futures.ThreadPoolExecutor(max_workers = self._max_workers, 
+                                                               thread_name_prefix = "action")
+        return self._pool
+
+    def _run_pending(self, state: _ActionState) -> None:
+        """Run the pending invocations of an action until there are none left."""
+        invocation = self._next_invocation(state)
+        while invocation is not None:
+            try:
+                self._starting(invocation)
+                invocation.run()
+                self._finished(invocation)
+            except Exception as e:
+                print(f"Error running {invocation.action}: {str(e)}")
+            invocation = self._next_invocation(state)
+
+    def _next_invocation(self, state: _ActionState) -> Optional[Invocation]:
+        """Mark the next pending invocation of an action as running and return it, or None if there is none."""
+        with self._lock:
+            if not state.pending:
+                state.running = None
+                return None
+            state.running = state.pending.popleft()
+            return state.running
+
+    def _starting(self, invocation: Invocation) -> None:
+        invocation.started = time.time()
+        print("Running command:\n{}".format(invocation.action))
+
+    def _finished(self, invocation: Invocation) -> None:
+        invocation.finished = time.time()
+        print("\nDone")
+        print("-" * 20)
+        if self._on_done is not None:
+            self._on_done(invocation)
+
+class AsyncActionExecutor(ActionExecutor):
+    """Executes actions as tasks of the running asyncio event loop, instead of worker threads.
+
+    Implemented as an asynchronous context manager, which waits for the running actions upon exit.
+    Actions must be submitted from the event loop. Commands are waited for without blocking 
+    the event loop, as are plugin functions which are coroutine functions (other plugin functions 
+    are still called from worker threads, see Invocation.run_async).
+
+    The concurrency policies and the limit on concurrent actions are the same as for ActionExecutor.
+
+    Example usage:
+
+    >>> async with AsyncActionExecutor(max_workers = 4) as executor:
+    ...     executor.submit(CommandAction(["whoami"]))
+    """
+
+    def __init__(self, max_workers: int = 4, on_done: Optional[Callable[[Invocation], None]] = None):
+        """Initialize the executor, see ActionExecutor (on_done is called from the event loop)."""
+        super().__init__(max_workers, on_done)
+        self._semaphore: Optional["asyncio.Semaphore"] = None
+        self._tasks: Set["asyncio.Task"] = set()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.shutdown_async()
+
+    def start(self) -> None:
+        """Nothing to start ahead of the first action, the actions run on the event loop."""
+        pass
+
+    async def shutdown_async(self) -> None:
+        """Wait for the running and pending actions to complete."""
+        import asyncio
+        while self._tasks:
+            await asyncio.wait(set(self._tasks))
+
+    def _schedule(self, state: _ActionState) -> None:
+        import asyncio
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self._max_workers)
+        task = asyncio.get_running_loop().create_task(self._run_pending_async(state))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run_pending_async(self, state: _ActionState) -> None:
+        """Run the pending invocations of an action until there are none left, see ActionExecutor._run_pending."""
+        async with self._semaphore:
+            invocation = self._next_invocation(state)
+            while invocation is not None:
+                try:
+                    self._starting(invocation)
+                    await invocation.run_async()
+                    self._finished(invocation)
+                except Exception as e:
+                    print(f"Error running {invocation.action}: {str(e)}")
+                invocation = self._next_invocation(state)
@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+
+"""Micro-benchmark for decoding input events.
+
+Compares the cost per event of the different ways to decode a buffer of packed
+input events, including the access to the type, code and value fields:
+
+ - ctypes_bytes:  struct_input_event.from_buffer_copy per event read (single reads)
+ - ctypes_copy:   struct_input_event.from_buffer_copy per offset in a buffer (batched reads)
+ - ctypes_view:   struct_input_event.from_buffer per offset in a buffer
+ - struct:        INPUT_EVENT_STRUCT.unpack + InputEvent per event read (single reads)
+ - struct_iter:   INPUT_EVENT_STRUCT.iter_unpack + InputEvent (batched reads)
+
+Example Usage
+-------------
+
+python3 benchmarks/decode_events.py -n 200000
+
+Sources:
+    https://github.com/Dvd848/macro_keyboard
+
+License:
+    LGPL v2.1
+
+    This library is free software; you can redistribute it and/or
+    modify it under the terms of the GNU Lesser General Public
+    License as published by the Free Software Foundation; either
+    version 2.1 of the License, or (at your option) any later version.
+
+    This library is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+    Lesser General Public License for more details.
+
+    You should have received a copy of the GNU Lesser General Public
+    License along with this library; if not, write to the Free Software
+    Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301  USA
+
+"""
+
+import argparse
+import ctypes
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+
+from linux_input import struct_input_event, InputEvent, INPUT_EVENT_STRUCT
+from loop_events import keypad_events
+
+EVENT_SIZE = ctypes.sizeof(struct_input_event)
+
+def decode_ctypes_bytes(buffer: bytearray) -> int:
+    total = 0
+    for offset in range(0, len(buffer), EVENT_SIZE):
+        event = struct_input_event.from_buffer_copy(buffer[offset:offset + EVENT_SIZE])
+        total += event.type + event.code + event.value
+    return total
+
+def decode_ctypes_copy(buffer: bytearray) -> int:
+    total = 0
+    for offset in range(0, len(buffer), EVENT_SIZE):
+        event = struct_input_event.from_buffer_copy(buffer, offset)
+        total += event.type + event.code + event.value
+    return total
+
+def decode_ctypes_view(buffer: bytearray) -> int:
+    total = 0
+    for offset in range(0, len(buffer), EVENT_SIZE):
+        event = struct_input_event.from_buffer(buffer, offset)
+        total += event.type + event.code + event.value
+    return total
+
+def decode_struct(buffer: bytearray) -> int:
+    unpack = INPUT_EVENT_STRUCT.unpack
+    make = InputEvent._make
+    total = 0
+    for offset in range(0, len(buffer), EVENT_SIZE):
+        event = make(unpack(buffer[offset:offset + EVENT_SIZE]))
+        total += event.type + event.code + event.value
+    return total
+
+def decode_struct_iter(buffer: bytearray) -> int:
+    total = 0
+    for event in map(InputEvent._make, INPUT_EVENT_STRUCT.iter_unpack(buffer)):
+        total += event.type + event.code + event.value
+    return total
+
+DECODERS = {
+    "ctypes_bytes": decode_ctypes_bytes,
+    "ctypes_copy": decode_ctypes_copy,
+    "ctypes_view": decode_ctypes_view,
+    "struct":      decode_struct,
+    "struct_iter": decode_struct_iter,
+}
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = 'Benchmark input event decoding')
+    parser.add_argument('-n', '--num-events', action = 'store', type = int, default = 100000, 
+                        help = "Number of events to decode (default: %(default)s)")
+    parser.add_argument('-r', '--repeat', action = 'store', type = int, default = 3, 
+                        help = "Number of repetitions, the best result is reported (default: %(default)s)")
+    args = parser.parse_args()
+
+    buffer = bytearray(keypad_events(args.num_events))
+    num_events = len(buffer) // EVENT_SIZE
+
+    expected = None
+    for name, decode in DECODERS.items():
+        best = None
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            result = decode(buffer)
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        expected = expected if expected is not None else result
+        assert(result == expected)
+        print(f"{name:<13}: {best / num_events * 1e9:>8.1f} ns/event")
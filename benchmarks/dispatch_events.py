@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+
+"""Micro-benchmark for the event handlers of run_macro_keypad.
+
+Compares the cost per event of the original handler (enum attribute lookups and
+a linux_input.Keys construction per key event, followed by a dictionary lookup)
+with the handler of a compiled DispatchTable. Actions are dispatched to a no-op
+callback, so only the handling itself is measured.
+
+Example Usage
+-------------
+
+python3 benchmarks/dispatch_events.py -n 200000
+
+Sources:
+    https://github.com/Dvd848/macro_keyboard
+
+License:
+    LGPL v2.1
+
+    This library is free software; you can redistribute it and/or
+    modify it under the terms of the GNU Lesser General Public
+    License as published by the Free Software Foundation; either
+    version 2.1 of the License, or (at your option) any later version.
+
+    This library is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+    Lesser General Public License for more details.
+
+    You should have received a copy of the GNU Lesser General Public
+    License along with this library; if not, write to the Free Software
+    Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301  USA
+
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+
+from actions import CommandAction
+from dispatch import DispatchTable
+from linux_input import struct_input_event, InputEvent, INPUT_EVENT_STRUCT, EventType, KeyEvent, Keys
+from loop_events import keypad_events
+
+def legacy_handler(action_mapping, dispatch):
+    """The handler of run_macro_keypad prior to the introduction of DispatchTable."""
+    def handle_events(input_event):
+        if input_event.type != EventType.EV_KEY.value:
+            return
+
+        if input_event.value != KeyEvent.KEY_UP.value:
+            return
+
+        key_code = Keys(input_event.code)
+
+        if key_code in action_mapping:
+            dispatch(action_mapping[key_code])
+
+    return handle_events
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = 'Benchmark the run_macro_keypad event handlers')
+    parser.add_argument('-n', '--num-events', action = 'store', type = int, default = 100000, 
+                        help = "Number of events to handle (default: %(default)s)")
+    parser.add_argument('-r', '--repeat', action = 'store', type = int, default = 3, 
+                        help = "Number of repetitions, the best result is reported (default: %(default)s)")
+    args = parser.parse_args()
+
+    buffer = keypad_events(args.num_events)
+    events = {
+        "ctypes": [struct_input_event.from_buffer_copy(buffer, offset) 
+                   for offset in range(0, len(buffer), INPUT_EVENT_STRUCT.size)],
+        "struct": [InputEvent._make(fields) for fields in INPUT_EVENT_STRUCT.iter_unpack(buffer)],
+    }
+
+    # Map some of the keys found in the events
+    action_mapping = {Keys.KEY_KP1: CommandAction(["true"]), Keys.KEY_KP3: CommandAction(["true"])}
+    code_mapping = {key.value: action for key, action in action_mapping.items()}
+    dispatched = []
+    handlers = {
+        "legacy":   legacy_handler(action_mapping, dispatched.append),
+        "dispatch": DispatchTable(code_mapping).create_handler(dispatched.append),
+    }
+
+    for decoder, decoded_events in events.items():
+        for name, handler in handlers.items():
+            best = None
+            for _ in range(args.repeat):
+                dispatched.clear()
+                start = time.perf_counter()
+                for input_event in decoded_events:
+                    handler(input_event)
+                elapsed = time.perf_counter() - start
+                best = elapsed if best is None else min(best, elapsed)
+            print(f"Decoder {decoder:<6} handler {name:<8}: {best / len(decoded_events) * 1e9:>7.1f} ns/event "
+                  f"({len(dispatched)} actions dispatched)")
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+
+"""Micro-benchmark for InputDevice.loop_events.
+
+Measures the number of events per second that InputDevice.loop_events is able to
+deliver to a (trivial) callback, for different batch sizes and event decoders.
+The events are read from a temporary file containing a recording-like stream of
+keypad events (EV_MSC + EV_KEY + EV_SYN for every key down / key up), so no
+physical device or root permissions are required.
+
+Example Usage
+-------------
+
+python3 benchmarks/loop_events.py -n 200000 -b 1 16 64 -d ctypes struct
+
+Sources:
+    https://github.com/Dvd848/macro_keyboard
+
+License:
+    LGPL v2.1
+
+    This library is free software; you can redistribute it and/or
+    modify it under the terms of the GNU Lesser General Public
+    License as published by the Free Software Foundation; either
+    version 2.1 of the License, or (at your option) any later version.
+
+    This library is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+    Lesser General Public License for more details.
+
+    You should have received a copy of the GNU Lesser General Public
+    License along with this library; if not, write to the Free Software
+    Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301  USA
+
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+
+from input_device import InputDevice, EventDecoder
+from linux_input import struct_input_event, EventType, SynchronizationEvent, MiscEvent, KeyEvent, Keys
+
+def keypad_events(num_events: int) -> bytes:
+    """Return a buffer of (approximately) num_events packed input events.
+
+    Args:
+        num_events:
+            Number of events to generate.
+
+    Returns:
+        The packed events.
+    """
+    keys = [Keys.KEY_KP0, Keys.KEY_KP1, Keys.KEY_KP2, Keys.KEY_KP3, Keys.KEY_KP4]
+    events = []
+    i = 0
+    while len(events) < num_events:
+        key = keys[i % len(keys)]
+        for key_event in (KeyEvent.KEY_DOWN, KeyEvent.KEY_UP):
+            for event_type, code, value in ((EventType.EV_MSC, MiscEvent.MSC_SCAN.value, key.value),
+                                            (EventType.EV_KEY, key.value, key_event.value),
+                                            (EventType.EV_SYN, SynchronizationEvent.SYN_REPORT.value, 0)):
+                event = struct_input_event(type = event_type.value, code = code, value = value)
+                event.time.tv_sec = i
+                events.append(bytes(event))
+        i += 1
+    return b"".join(events[:num_events])
+
+def benchmark(path: str, batch_size: int, decoder: EventDecoder) -> float:
+    """Read all events from the given path and return the number of events per second.
+
+    Args:
+        path:
+            Path to a file containing packed events.
+
+        batch_size:
+            Batch size to pass to InputDevice.
+
+        decoder:
+            Event decoder to pass to InputDevice.
+
+    Returns:
+        Events per second.
+    """
+    counter = 0
+    def callback(input_event):
+        nonlocal counter
+        counter += 1
+        _ = (input_event.type, input_event.code, input_event.value)
+
+    with InputDevice(path, batch_size, decoder) as device:
+        start = time.perf_counter()
+        device.loop_events(callback)
+        elapsed = time.perf_counter() - start
+
+    return counter / elapsed
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = 'Benchmark InputDevice.loop_events')
+    parser.add_argument('-n', '--num-events', action = 'store', type = int, default = 100000, 
+                        help = "Number of events to read (default: %(default)s)")
+    parser.add_argument('-b', '--batch-sizes', action = 'store', type = int, nargs = '+', default = [1, 16, 64, 256],
+                        help = "Batch sizes to compare (default: %(default)s)")
+    parser.add_argument('-d', '--decoders', action = 'store', nargs = '+', choices = [d.value for d in EventDecoder],
+                        default = [d.value for d in EventDecoder], help = "Event decoders to compare (default: %(default)s)")
+    parser.add_argument('-r', '--repeat', action = 'store', type = int, default = 3, 
+                        help = "Number of repetitions, the best result is reported (default: %(default)s)")
+    args = parser.parse_args()
+
+    with tempfile.NamedTemporaryFile(prefix = "events_") as f:
+        f.write(keypad_events(args.num_events))
+        f.flush()
+
+        baseline = None
+        for decoder in args.decoders:
+            for batch_size in args.batch_sizes:
+                result = max(benchmark(f.name, batch_size, EventDecoder(decoder)) for _ in range(args.repeat))
+                baseline = baseline or result
+                print(f"Decoder {decoder:<6} batch size {batch_size:>5}: "
+                      f"{result:>12,.0f} events/sec ({result / baseline:.2f}x)")
@@ -0,0 +1,321 @@
+#!/usr/bin/env python3
+
+"""Benchmark suite for the event handling pipeline of macro_keypad.
+
+Drives the real pipeline (InputDevice.loop_events, or loop_frames with --frames, followed by the handlers compiled
+by macro_keypad from a configuration file) with synthetic keystrokes, written to a
+FIFO by a separate process, so no physical device or root permissions are required.
+Actions are counted instead of being executed.
+
+Every scenario (a kind of configuration and a distribution of the keys pressed) is
+measured by three runs:
+
+    * Throughput: keystrokes are written as fast as possible, reporting the events
+                  handled per second and the CPU time of the reading thread per event.
+    * Latency:    keystrokes are written at a fixed rate, reporting the percentiles of
+                  the time from writing a key event until its action is dispatched.
+    * Memory:     under tracemalloc, reporting the peak memory allocated while handling
+                  the events and the number of memory blocks still allocated after.
+
+The results can be saved as a baseline, and later runs compared against it: metrics
+which are worse than the baseline by more than the threshold are reported as
+regressions (and the exit code is 1). Tail latencies are noisy on a busy machine,
+a higher threshold may be needed when comparing them.
+
+Example Usage
+-------------
+
+python3 benchmarks/pipeline.py --save-baseline baseline.json
+python3 benchmarks/pipeline.py --baseline baseline.json -b 64 -d struct
+python3 benchmarks/pipeline.py -s keys-skewed -n 500000 --rate 5000
+
+Sources:
+    https://github.com/Dvd848/macro_keyboard
+
+License:
+    LGPL v2.1
+
+    This library is free software; you can redistribute it and/or
+    modify it under the terms of the GNU Lesser General Public
+    License as published by the Free Software Foundation; either
+    version 2.1 of the License, or (at your option) any later version.
+
+    This library is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+    Lesser General Public License for more details.
+
+    You should have received a copy of the GNU Lesser General Public
+    License along with this library; if not, write to the Free Software
+    Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301  USA
+
+"""
+
+import argparse
+import json
+import os
+import random
+import select
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+
+import macro_keypad
+
+from input_device import InputDevice, EventDecoder
+from latency import LatencyHistogram, LatencyTracker
+from linux_input import INPUT_EVENT_STRUCT, EventType, SynchronizationEvent, MiscEvent, KeyEvent, KeyCodes
+from startup import generate_config
+
+BASELINE_VERSION = 1
+
+# Keys pressed by the synthetic keystrokes, the first ones are mapped by the configurations
+KEYS = [getattr(KeyCodes, f"KEY_KP{i}") for i in range(10)] + \
+       [getattr(KeyCodes, f"KEY_{chr(c)}") for c in range(ord("A"), ord("Z") + 1)]
+
+# Every keystroke is a key down and a key up, each reported as EV_MSC + EV_KEY + EV_SYN
+EVENTS_PER_KEYSTROKE = 6
+
+# Writes of up to PIPE_BUF bytes to a FIFO are atomic, so whole events are never split between reads 
+#  (as with a real device, which InputDevice expects when reading a single event at a time)
+CHUNK_SIZE = select.PIPE_BUF - select.PIPE_BUF % INPUT_EVENT_STRUCT.size
+
+# Scenario name -> (configuration, key distribution)
+SCENARIOS = {
+    "keys-uniform":  ("keys", "uniform"),
+    "keys-skewed":   ("keys", "skewed"),
+    "mixed-uniform": ("mixed", "uniform"),
+    "mixed-skewed":  ("mixed", "skewed"),
+}
+
+# Metric -> True if higher values are better
+METRICS = {
+    "events_per_second": True,
+    "cpu_per_event":     False,
+    "latency_p50":       False,
+    "latency_p95":       False,
+    "latency_p99":       False,
+    "peak_memory":       False,
+    "blocks":            False,
+}
+
+def scenario_config(kind: str) -> dict:
+    """Return the configuration of the given kind: single keys only (handled by a dispatch table),
+    or single keys with sequences and chords (handled by a sequence matcher)."""
+    config = generate_config(len(KEYS) // 2)
+    if kind == "keys":
+        config["ActionMapping"] = [item for item in config["ActionMapping"] if "KeyCode" in item]
+    return config
+
+def generate_keys(distribution: str, count: int, seed: int = 0) -> list:
+    """Return the codes of count keys to press, uniformly distributed or skewed (Zipf-like) towards a few keys."""
+    rng = random.Random(seed)
+    if distribution == "uniform":
+        return [rng.choice(KEYS) for _ in range(count)]
+    weights = [1 / rank for rank in range(1, len(KEYS) + 1)]
+    return rng.choices(KEYS, weights = weights, k = count)
+
+def pack_keystroke(code: int, timestamp: float) -> bytes:
+    """Return the packed events of a keystroke (key down and key up) at the given time."""
+    tv_sec = int(timestamp)
+    tv_usec = int((timestamp - tv_sec) * 1000000)
+    events = []
+    for key_event in (KeyEvent.KEY_DOWN, KeyEvent.KEY_UP):
+        for event_type, event_code, value in ((EventType.EV_MSC.value, MiscEvent.MSC_SCAN.value, code),
+                                              (EventType.EV_KEY.value, code, key_event.value),
+                                              (EventType.EV_SYN.value, SynchronizationEvent.SYN_REPORT.value, 0)):
+            events.append(INPUT_EVENT_STRUCT.pack(tv_sec, tv_usec, event_type, event_code, value))
+    return b"".join(events)
+
+def write_keystrokes(fifo: str, keys: list, rate: float) -> None:
+    """Write the keystrokes of the given keys to the FIFO, as fast as possible (rate 0) or at the given rate (events/sec)."""
+    if not rate:
+        # Packed before opening the FIFO, which starts the measurement
+        now = time.time()
+        data = b"".join(pack_keystroke(code, now) for code in keys)
+
+    with open(fifo, "wb", buffering = 0) as f:
+        if not rate:
+            for offset in range(0, len(data), CHUNK_SIZE):
+                f.write(data[offset:offset + CHUNK_SIZE])
+            return
+
+        interval = EVENTS_PER_KEYSTROKE / rate
+        next_time = time.perf_counter()
+        for code in keys:
+            delay = next_time - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            f.write(pack_keystroke(code, time.time()))
+            next_time += interval
+
+def run_pipeline(config_file: str, keys: list, rate: float, batch_size: int, decoder: EventDecoder,
+                 measure_latency: bool = False, trace_memory: bool = False, frames: bool = False) -> dict:
+    """Write the given keystrokes from a child process and handle them, returning the measurements of the run."""
+    with tempfile.TemporaryDirectory(prefix = "pipeline_") as temp_dir:
+        fifo = os.path.join(temp_dir, "keypad")
+        os.mkfifo(fifo)
+
+        config = macro_keypad.load_config(config_file, [fifo])
+        histogram = LatencyHistogram()
+        dispatched = 0
+
+        def dispatch(action, trigger = None):
+            nonlocal dispatched
+            dispatched += 1
+            if trigger is not None:
+                histogram.record(time.time() - trigger.timestamp)
+
+        latency = LatencyTracker() if measure_latency else None
+        compiled = macro_keypad._compile_config(config, dispatch, latency, frames)
+        handler = compiled.handlers[fifo]
+
+        pid = os.fork()
+        if pid == 0:
+            try:
+                write_keystrokes(fifo, keys, rate)
+            finally:
+                os._exit(0)
+
+        try:
+            with InputDevice(fifo, batch_size, decoder) as device:
+                if trace_memory:
+                    tracemalloc.start()
+                    before = tracemalloc.take_snapshot()
+                start_cpu = time.thread_time()
+                start = time.perf_counter()
+                if frames:
+                    device.loop_frames(handler)
+                else:
+                    device.loop_events(handler)
+                elapsed = time.perf_counter() - start
+                cpu = time.thread_time() - start_cpu
+                if trace_memory:
+                    peak_memory = tracemalloc.get_traced_memory()[1]
+                    after = tracemalloc.take_snapshot()
+                    tracemalloc.stop()
+        finally:
+            os.waitpid(pid, 0)
+
+    events = len(keys) * EVENTS_PER_KEYSTROKE
+    result = {"events_per_second": events / elapsed, "cpu_per_event": cpu / events, "dispatched": dispatched}
+    if measure_latency:
+        result.update({f"latency_p{percentile}": histogram.percentile(percentile) for percentile in (50, 95, 99)})
+    if trace_memory:
+        result["peak_memory"] = peak_memory
+        result["blocks"] = sum(stat.count_diff for stat in after.compare_to(before, "filename"))
+    return result
+
+def run_scenario(config_file: str, distribution: str, args: argparse.Namespace) -> dict:
+    """Run the throughput, latency and memory runs of a scenario, returning its metrics."""
+    decoder = EventDecoder(args.decoder)
+    keystrokes = args.num_events // EVENTS_PER_KEYSTROKE
+    keys = generate_keys(distribution, keystrokes)
+
+    runs = [run_pipeline(config_file, keys, 0, args.batch_size, decoder, frames = args.frames) for _ in range(args.repeat)]
+    best = max(runs, key = lambda run: run["events_per_second"])
+    result = {"events_per_second": best["events_per_second"],
+              "cpu_per_event": min(run["cpu_per_event"] for run in runs)}
+
+    latency_keys = generate_keys(distribution, max(int(args.rate * args.latency_duration) // EVENTS_PER_KEYSTROKE, 1), seed = 1)
+    result.update({metric: value for metric, value in
+                   run_pipeline(config_file, latency_keys, args.rate, args.batch_size, decoder, measure_latency = True, 
+                                               frames = args.frames).items()
+                   if metric.startswith("latency_")})
+
+    memory_keys = keys[:max(keystrokes // 10, 1)]
+    memory = run_pipeline(config_file, memory_keys, 0, args.batch_size, decoder, trace_memory = True, frames = args.frames)
+    result["peak_memory"] = memory["peak_memory"]
+    result["blocks"] = memory["blocks"]
+    return result
+
+def format_metric(metric: str, value: float) -> str:
+    if metric == "events_per_second":
+        return f"{value:,.0f} events/sec"
+    if metric == "cpu_per_event":
+        return f"{value * 1e6:.2f} us CPU/event"
+    if metric.startswith("latency_"):
+        return f"{value * 1000:.3f} ms"
+    if metric == "peak_memory":
+        return f"{value / 1024:.1f} KiB"
+    return f"{value:.0f}"
+
+def compare(metric: str, value: float, baseline: float, threshold: float) -> tuple:
+    """Return the ratio of value to baseline, and whether it is a regression beyond the threshold."""
+    if not baseline:
+        return None, False
+    ratio = value / baseline
+    regression = ratio < 1 - threshold if METRICS[metric] else ratio > 1 + threshold
+    return ratio, regression
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = 'Benchmark the event handling pipeline of macro_keypad')
+    parser.add_argument('-s', '--scenarios', action = 'store', nargs = '+', choices = list(SCENARIOS),
+                        default = list(SCENARIOS), help = "Scenarios to run (default: all)")
+    parser.add_argument('-n', '--num-events', action = 'store', type = int, default = 120000,
+                        help = "Number of events to handle in the throughput runs (default: %(default)s)")
+    parser.add_argument('--rate', action = 'store', type = float, default = 2000,
+                        help = "Events per second written in the latency runs (default: %(default)s)")
+    parser.add_argument('--latency-duration', action = 'store', type = float, default = 2.0,
+                        help = "Duration (in seconds) of the latency runs (default: %(default)s)")
+    parser.add_argument('-b', '--batch-size', action = 'store', type = int, default = 1,
+                        help = "Batch size to pass to InputDevice (default: %(default)s)")
+    parser.add_argument('-d', '--decoder', action = 'store', choices = [d.value for d in EventDecoder],
+                        default = EventDecoder.CTYPES.value, help = "Event decoder to use (default: %(default)s)")
+    parser.add_argument('--frames', action = 'store_true',
+                        help = "Handle the events frame by frame (see InputDevice.loop_frames)")
+    parser.add_argument('-r', '--repeat', action = 'store', type = int, default = 5,
+                        help = "Number of throughput runs, the best result is reported (default: %(default)s)")
+    parser.add_argument('--save-baseline', action = 'store', metavar = 'BASELINE_FILE',
+                        help = "Save the results as a baseline to the given file")
+    parser.add_argument('--baseline', action = 'store', metavar = 'BASELINE_FILE',
+                        help = "Compare the results to the baseline in the given file")
+    parser.add_argument('--threshold', action = 'store', type = float, default = 0.1,
+                        help = "Relative change of a metric considered a regression (default: %(default)s)")
+    args = parser.parse_args()
+
+    baseline = {}
+    if args.baseline is not None:
+        with open(args.baseline) as f:
+            baseline_file = json.load(f)
+        if baseline_file.get("version") != BASELINE_VERSION:
+            sys.exit(f"Unsupported baseline version in '{args.baseline}'")
+        baseline = baseline_file["results"]
+        if (baseline_file["batch_size"], baseline_file["decoder"], baseline_file.get("frames", False)) != \
+                (args.batch_size, args.decoder, args.frames):
+            print(f"Note: the baseline was measured with batch size {baseline_file['batch_size']}, "
+                  f"decoder {baseline_file['decoder']}{' and frames' if baseline_file.get('frames') else ''}")
+
+    results = {}
+    regressions = []
+    with tempfile.TemporaryDirectory(prefix = "pipeline_") as temp_dir:
+        for scenario in args.scenarios:
+            kind, distribution = SCENARIOS[scenario]
+            config_file = os.path.join(temp_dir, f"{kind}.json")
+            with open(config_file, "w") as f:
+                json.dump(scenario_config(kind), f)
+
+            results[scenario] = result = run_scenario(config_file, distribution, args)
+            print(f"{scenario}:")
+            for metric, value in result.items():
+                line = f"  {metric:<18}: {format_metric(metric, value):>22}"
+                if scenario in baseline and metric in baseline[scenario]:
+                    ratio, regression = compare(metric, value, baseline[scenario][metric], args.threshold)
+                    if ratio is not None:
+                        line += f"  ({ratio:.2f}x baseline{', REGRESSION' if regression else ''})"
+                    if regression:
+                        regressions.append(f"{scenario} {metric}")
+                print(line)
+
+    if args.save_baseline is not None:
+        with open(args.save_baseline, "w") as f:
+            json.dump({"version": BASELINE_VERSION, "python": sys.version, "batch_size": args.batch_size,
+                       "decoder": args.decoder, "frames": args.frames, "results": results}, f, indent = 4)
+        print(f"Saved the baseline to '{args.save_baseline}'")
+
+    if regressions:
+        print(f"Regressions: {', '.join(regressions)}")
+        sys.exit(1)
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+
+"""Benchmark for the startup time of macro_keypad.
+
+Measures the time until the event handlers are compiled, i.e. the point where
+the daemon attaches to the devices, by running a fresh interpreter for each
+repetition. Both the total time since launching the interpreter and the time
+spent by macro_keypad itself (imports, loading the configuration and compiling
+it) are reported. The configuration file is loaded without a cache, and with a
+(warm) cache of the parsed configuration.
+
+Example Usage
+-------------
+
+python3 benchmarks/startup.py -r 20
+python3 benchmarks/startup.py -m config.json
+
+Sources:
+    https://github.com/Dvd848/macro_keyboard
+
+License:
+    LGPL v2.1
+
+    This library is free software; you can redistribute it and/or
+    modify it under the terms of the GNU Lesser General Public
+    License as published by the Free Software Foundation; either
+    version 2.1 of the License, or (at your option) any later version.
+
+    This library is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+    Lesser General Public License for more details.
+
+    You should have received a copy of the GNU Lesser General Public
+    License along with this library; if not, write to the Free Software
+    Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301  USA
+
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir)
+
+# Runs in a fresh interpreter: load the configuration and compile the handlers, as run_macro_keypad does
+STARTUP_SCRIPT = """
+import time
+start = time.perf_counter()
+import sys
+sys.path.insert(0, {root!r})
+import macro_keypad
+config = macro_keypad.load_config({config_file!r}, ["/dev/input/by-id/keypad"], cache_file = {cache_file!r})
+macro_keypad._compile_config(config, lambda action: None)
+print(time.perf_counter() - start)
+"""
+
+def generate_config(num_keys: int) -> dict:
+    """Return a configuration with num_keys single keys and a few sequences and chords."""
+    keypad = ["KEY_KP0", "KEY_KP1", "KEY_KP2", "KEY_KP3", "KEY_KP4", "KEY_KP5", "KEY_KP6", "KEY_KP7", "KEY_KP8", "KEY_KP9"]
+    letters = [f"KEY_{chr(c)}" for c in range(ord("A"), ord("Z") + 1)]
+    keys = (keypad + letters)[:num_keys]
+    mapping = [{"KeyCode": key, "Action": ["echo", key]} for key in keys]
+    mapping += [{"Sequence": [keypad[i], keypad[i + 1]], "Action": ["echo", "sequence"]} for i in range(0, 8, 2)]
+    mapping += [{"Chord": ["KEY_LEFTCTRL", key], "Action": ["echo", "chord"]} for key in keypad[:4]]
+    return {"ActionMapping": mapping}
+
+def run_interpreter(script: str) -> tuple:
+    """Run the given script in a fresh interpreter, returning the total time and the script output."""
+    start = time.perf_counter()
+    output = subprocess.run([sys.executable, "-c", script], check = True, stdout = subprocess.PIPE).stdout
+    return time.perf_counter() - start, output
+
+def benchmark(config_file: str, cache_file: str, repeat: int) -> tuple:
+    """Return the total startup times and the in-process times (in seconds) of repeat runs."""
+    script = STARTUP_SCRIPT.format(root = ROOT_DIR, config_file = config_file, cache_file = cache_file)
+    total_times = []
+    process_times = []
+    for _ in range(repeat):
+        total_time, output = run_interpreter(script)
+        total_times.append(total_time)
+        process_times.append(float(output))
+    return total_times, process_times
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = 'Benchmark the startup time of macro_keypad')
+    parser.add_argument('-m', '--macro', action = 'store', type = str, metavar = ('CONFIG_FILE'),
+                        help = "Configuration file to load (default: a generated configuration)")
+    parser.add_argument('-k', '--num-keys', action = 'store', type = int, default = 36,
+                        help = "Number of keys in the generated configuration (default: %(default)s)")
+    parser.add_argument('-r', '--repeat', action = 'store', type = int, default = 10,
+                        help = "Number of repetitions (default: %(default)s)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix = "startup_") as temp_dir:
+        config_file = args.macro
+        if config_file is None:
+            config_file = os.path.join(temp_dir, "config.json")
+            with open(config_file, "w") as f:
+                json.dump(generate_config(args.num_keys), f)
+        cache_file = os.path.join(temp_dir, "config.cache")
+
+        # Warm up the bytecode caches, then measure the interpreter alone as a baseline
+        benchmark(config_file, None, 1)
+        interpreter = [run_interpreter("pass")[0] for _ in range(args.repeat)]
+        print(f"{'interpreter only':<16}: total median {statistics.median(interpreter) * 1000:>6.1f} ms")
+
+        results = {"no cache": benchmark(config_file, None, args.repeat)}
+        benchmark(config_file, cache_file, 1) # Warm the cache
+        results["cached"] = benchmark(config_file, cache_file, args.repeat)
+
+        for name, (total_times, process_times) in results.items():
+            print(f"{name:<16}: total median {statistics.median(total_times) * 1000:>6.1f} ms, "
+                  f"macro_keypad median {statistics.median(process_times) * 1000:>6.1f} ms "
+                  f"(min {min(process_times) * 1000:>6.1f} ms)")
@@ -0,0 +1,228 @@
+"""Conditioning of the keystrokes arriving from a device before they trigger actions.
+
+Worn keypads (and children) produce bursts of repeated presses. The InputConditioner
+sits between the device and the action dispatch, and offers:
+
+    * Debouncing: A press of a key shortly after its previous press is ignored.
+    * Coalescing: A burst of presses of the same key results in a single press (the last one),
+                  delivered once the burst is over.
+    * Rate limiting: Token buckets limiting the rate of presses per key and in total.
+
+Auto-repeat events (a key being held down) are always dropped, since they don't trigger actions.
+Timing is based on the timestamps of the events, as reported by the kernel.
+
+Sources:
+    https://github.com/Dvd848/macro_keyboard
+
+License:
+    LGPL v2.1
+
+    This library is free software; you can redistribute it and/or
+    modify it under the terms of the GNU Lesser General Public
+    License as published by the Free Software Foundation; either
+    version 2.1 of the License, or (at your option) any later version.
+
+    This library is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+    Lesser General Public License for more details.
+
+    You should have received a copy of the GNU Lesser General Public
+    License along with this library; if not, write to the Free Software
+    Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301  USA
+
+"""
+from collections import namedtuple
+from typing import Callable, Dict, List, Optional, Set
+
+from input_device import Event, event_timestamp
+from linux_input import EventType, KeyEvent
+
+EV_KEY = EventType.EV_KEY.value
+KEY_DOWN = KeyEvent.KEY_DOWN.value
+KEY_HOLD = KeyEvent.KEY_HOLD.value
+
+# Allows "rate" presses per second on average, with bursts of up to "burst" presses
+RateLimit = namedtuple("RateLimit", "rate burst")
+
+# Settings of an InputConditioner, where a value of zero / None disables the matching stage
+ConditioningConfig = namedtuple("ConditioningConfig", "debounce coalesce key_rate_limit global_rate_limit",
+                                defaults = (0.0, 0.0, None, None))
+
+class TokenBucket():
+    """A token bucket, refilled according to the timestamps of the events consuming it."""
+
+    def __init__(self, rate_limit: RateLimit):
+        """Create a full bucket.
+
+        Args:
+            rate_limit:
+                Rate at which the bucket is refilled, and its capacity.
+        """
+        self._rate = rate_limit.rate
+        self._burst = rate_limit.burst
+        self._tokens = float(rate_limit.burst)
+        self._last: Optional[float] = None
+
+    def consume(self, timestamp: float) -> bool:
+        """Consume a token at the given time.
+
+        Args:
+            timestamp:
+                Time of the consumption, in seconds.
+
+        Returns:
+            True if a token was available, False if the rate limit was exceeded.
+        """
+        if self._last is not None and timestamp > self._last:
+            self._tokens = min(self._burst, self._tokens + (timestamp - self._last) * self._rate)
+        if self._last is None or timestamp > self._last:
+            self._last = timestamp
+
+        if self._tokens < 1:
+            return False
+        self._tokens -= 1
+        return True
+
+class InputConditioner():
+    """Filters the key events of a device before passing them on to a handler.
+
+    Decisions are made per press: if the KEY_DOWN event of a press is dropped, so is the
+    matching KEY_UP event. Events other than key events are passed on as is.
+
+    When coalescing, events are delayed until the burst is over, hence expire() must be
+    called periodically (see next_deadline).
+    """
+
+    def __init__(self, handler: Callable[[Event], None], config: ConditioningConfig,
+                 global_bucket: Optional[TokenBucket] = None):
+        """Create a conditioner for a device.
+
+        Args:
+            handler:
+                Callback to call for every event which passes the conditioning.
+
+            config:
+                Conditioning settings.
+
+            global_bucket:
+                Token bucket for all presses, may be shared between the conditioners of
+                several devices. If not provided, created according to config.global_rate_limit.
+        """
+        self._handler = handler
+        self._debounce = config.debounce
+        self._coalesce = config.coalesce
+        self._key_rate_limit = config.key_rate_limit
+        if global_bucket is None and config.global_rate_limit is not None:
+            global_bucket = TokenBucket(config.global_rate_limit)
+        self._global_bucket = global_bucket
+
+        self._key_buckets: Dict[int, TokenBucket] = {}
+        self._last_press: Dict[int, float] = {}
+        self._suppressed: Set[int] = set()
+        self._pending: List[Event] = []
+        self._deadline: Optional[float] = None
+
+        # Number of presses dropped so far
+        self.dropped = 0
+
+    @property
+    def next_deadline(self) -> Optional[float]:
+        """Time (as in time.time()) at which expire() should be called, or None if not needed."""
+        return self._deadline
+
+    def handle_event(self, input_event: Event) -> None:
+        """Handle an event from the device, passing it on to the handler if it should not be filtered.
+
+        Args:
+            input_event:
+                The event.
+        """
+        if input_event.type != EV_KEY:
+            self._handler(input_event)
+            return
+
+        code = input_event.code
+        if input_event.value == KEY_HOLD:
+            return
+
+        timestamp = event_timestamp(input_event)
+        if input_event.value == KEY_DOWN:
+            if self._debounce and timestamp - self._last_press.get(code, float("-inf")) < self._debounce:
+                self._drop(code)
+                return
+            self._last_press[code] = timestamp
+        elif code in self._suppressed:
+            self._suppressed.discard(code)
+            return
+
+        if not self._coalesce:
+            if input_event.value == KEY_DOWN and not self._consume(code, timestamp):
+                self._drop(code)
+                return
+            self._handler(input_event)
+            return
+
+        if self._pending and self._pending[0].code != code:
+            # Another key ends the burst
+            self._flush()
+
+        if input_event.value == KEY_DOWN:
+            if self._pending:
+                # The last press of the burst wins
+                self.dropped += 1
+            self._pending = [input_event]
+        elif self._pending:
+            self._pending.append(input_event)
+        else:
+            # The press was already delivered while the key was held down
+            self._handler(input_event)
+            return
+
+        self._deadline = timestamp + self._coalesce
+
+    def expire(self, now: float) -> Optional[float]:
+        """Deliver the pending press if the burst is over.
+
+        Args:
+            now:
+                The current time, as in time.time().
+
+        Returns:
+            The next deadline (see next_deadline).
+        """
+        if self._deadline is not None and now >= self._deadline:
+            self._flush()
+        return self._deadline
+
+    def _consume(self, code: int, timestamp: float) -> bool:
+        """Check the rate limits for a press of the given key."""
+        if self._key_rate_limit is not None:
+            bucket = self._key_buckets.get(code)
+            if bucket is None:
+                bucket = self._key_buckets[code] = TokenBucket(self._key_rate_limit)
+            if not bucket.consume(timestamp):
+                return False
+        return self._global_bucket is None or self._global_bucket.consume(timestamp)
+
+    def _drop(self, code: int) -> None:
+        """Drop a press of the given key, including its KEY_UP event."""
+        self._suppressed.add(code)
+        self.dropped += 1
+
+    def _flush(self) -> None:
+        """Deliver the pending press, subject to the rate limits."""
+        pending = self._pending
+        self._pending = []
+        self._deadline = None
+
+        first = pending[0]
+        if not self._consume(first.code, event_timestamp(first)):
+            self.dropped += 1
+            if len(pending) == 1:
+                # The key is still held down
+                self._suppressed.add(first.code)
+            return
+
+        for input_event in pending:
+            self._handler(input_event)
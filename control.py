@@ -0,0 +1,216 @@
+"""Control of a running process over a Unix domain socket.
+
+Clients connect to the socket and send requests, one JSON object per line, each
+naming a command. Every request is answered by a single line of JSON, in order:
+
+    --> {"command": "trigger", "name": "Stop"}
+    <-- {"ok": true, "result": {"action": "['kodi-send', '--action=Stop']"}}
+    --> {"command": "unknown"}
+    <-- {"ok": false, "error": "Unknown command 'unknown' (valid commands: ...)"}
+
+The socket is served from the loop handling the devices (see DeviceLoop.add_source),
+so requests are handled between events, without any additional thread or process.
+The commands themselves are provided by the owner of the server (see run_macro_keypad).
+
+Sources:
+    https://github.com/Dvd848/macro_keyboard
+
+License:
+    LGPL v2.1
+
+    This library is free software; you can redistribute it and/or
+    modify it under the terms of the GNU Lesser General Public
+    License as published by the Free Software Foundation; either
+    version 2.1 of the License, or (at your option) any later version.
+
+    This library is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+    Lesser General Public License for more details.
+
+    You should have received a copy of the GNU Lesser General Public
+    License along with this library; if not, write to the Free Software
+    Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301  USA
+
+"""
+import json
+import os
+import socket
+import stat
+
+from typing import Any, Callable, Dict, Optional
+
+# A request which is longer than this (without a newline) closes the connection
+MAX_REQUEST_SIZE = 64 * 1024
+
+# Size of a single read from a client
+READ_SIZE = 4096
+
+class ControlServer():
+    """Serves requests on a Unix domain socket, from the loop handling the devices.
+
+    Implemented as a context manager. The socket is created upon entering (e.g. before
+    dropping privileges), and requests are served once started (see start).
+
+    Example usage:
+
+    >>> with ControlServer("/run/macro_keypad.sock") as server:
+    ...     server.start(loop, {"ping": lambda request: "pong"})
+    ...     loop.run()
+    """
+
+    def __init__(self, socket_path: str, mode: int = 0o600):
+        """Initialize the server.
+
+        Args:
+            socket_path:
+                Path of the socket. A socket left at this path (e.g. by a previous run) is replaced.
+
+            mode:
+                Permissions of the socket, which decide who can connect to it.
+        """
+        self._socket_path = socket_path
+        self._mode = mode
+        self._socket: Optional[socket.socket] = None
+        self._loop = None
+        self._commands: Dict[str, Callable[[dict], Any]] = {}
+        # Connected client -> received data which isn't a whole request yet
+        self._clients: Dict[socket.socket, bytearray] = {}
+
+    def __enter__(self):
+        try:
+            if stat.S_ISSOCK(os.stat(self._socket_path).st_mode):
+                os.unlink(self._socket_path)
+        except FileNotFoundError:
+            pass
+        self._socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM | socket.SOCK_NONBLOCK | socket.SOCK_CLOEXEC)
+        try:
+            self._socket.bind(self._socket_path)
+            os.chmod(self._socket_path, self._mode)
+            self._socket.listen()
+        except OSError:
+            self._socket.close()
+            raise
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        for client in list(self._clients):
+            self._disconnect(client)
+        self._socket.close()
+        try:
+            os.unlink(self._socket_path)
+        except OSError:
+            # E.g. no longer permitted after dropping privileges, replaced by the next run
+            pass
+
+    def start(self, loop: "DeviceLoop", commands: Dict[str, Callable[[dict], Any]]) -> None:
+        """Start serving requests from the given loop.
+
+        Args:
+            loop:
+                The loop handling the devices, from which the commands are called.
+
+            commands:
+                Mapping of command name -> callback to call with the request, returning the
+                result (which must be serializable to JSON). An exception raised by the callback
+                is reported to the client as an error.
+        """
+        self._loop = loop
+        self._commands = dict(commands)
+        loop.add_source(self._socket, self._accept)
+
+    def _accept(self) -> None:
+        while True:
+            try:
+                client, _ = self._socket.accept()
+            except BlockingIOError:
+                return
+            client.setblocking(False)
+            self._clients[client] = bytearray()
+            self._loop.add_source(client, lambda client = client: self._handle_client(client))
+
+    def _disconnect(self, client: socket.socket) -> None:
+        del self._clients[client]
+        if self._loop is not None:
+            self._loop.remove_source(client)
+        client.close()
+
+    def _handle_client(self, client: socket.socket) -> None:
+        try:
+            data = client.recv(READ_SIZE)
+        except BlockingIOError:
+            return
+        except OSError:
+            data = b""
+        if not data:
+            self._disconnect(client)
+            return
+
+        buffer = self._clients[client]
+        buffer += data
+        while True:
+            end = buffer.find(b"\n")
+            if end < 0:
+                break
+            request = bytes(buffer[:end])
+            del buffer[:end + 1]
+            if not request.strip():
+                continue
+            try:
+                client.sendall(json.dumps(self._handle_request(request)).encode("utf-8") + b"\n")
+            except OSError:
+                # Including a client which doesn't read its responses, since the socket never blocks
+                self._disconnect(client)
+                return
+
+        if len(buffer) > MAX_REQUEST_SIZE:
+            self._disconnect(client)
+
+    def _handle_request(self, request_line: bytes) -> dict:
+        """Handle a single request, returning the response."""
+        try:
+            request = json.loads(request_line)
+            if not isinstance(request, dict):
+                raise ValueError("A request must be a JSON object")
+            command = self._commands.get(request.get("command"))
+            if command is None:
+                raise ValueError(f"Unknown command '{request.get('command')}' "
+                                 f"(valid commands: {', '.join(self._commands)})")
+            return {"ok": True, "result": command(request)}
+        except Exception as e:
+            return {"ok": False, "error": str(e)}
+
+def send_request(socket_path: str, request: dict, timeout: float = 5.0) -> Any:
+    """Send a single request to a ControlServer and wait for its response.
+
+    Args:
+        socket_path:
+            Path of the socket of the server.
+
+        request:
+            The request, e.g. {"command": "trigger", "name": "Stop"}.
+
+        timeout:
+            Maximal time (in seconds) to wait for the server.
+
+    Returns:
+        The result of the request.
+
+    Raises:
+        RuntimeError: If the server reported an error.
+    """
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+        client.settimeout(timeout)
+        client.connect(socket_path)
+        client.sendall(json.dumps(request).encode("utf-8") + b"\n")
+        response = b""
+        while not response.endswith(b"\n"):
+            data = client.recv(READ_SIZE)
+            if not data:
+                raise ConnectionError("The connection was closed before a response was received")
+            response += data
+
+    response = json.loads(response)
+    if not response["ok"]:
+        raise RuntimeError(response["error"])
+    return response["result"]
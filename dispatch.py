@@ -0,0 +1,135 @@
+"""Dispatching of input events to actions.
+
+The action mapping loaded from the configuration file is compiled into a flat
+table indexed by the integer fields of the triggering event, so that handling an 
+event requires a couple of integer comparisons and a single list lookup, 
+without constructing any enum members.
+
+Sources:
+    https://github.com/Dvd848/macro_keyboard
+
+License:
+    LGPL v2.1
+
+    This library is free software; you can redistribute it and/or
+    modify it under the terms of the GNU Lesser General Public
+    License as published by the Free Software Foundation; either
+    version 2.1 of the License, or (at your option) any later version.
+
+    This library is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+    Lesser General Public License for more details.
+
+    You should have received a copy of the GNU Lesser General Public
+    License along with this library; if not, write to the Free Software
+    Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301  USA
+
+"""
+from typing import Callable, Dict, List, Optional, Set
+
+from actions import Action
+from input_device import Event, Frame
+from linux_input import EventType, KeyEvent, KEY_CNT
+
+EV_KEY = EventType.EV_KEY.value
+
+# Number of possible values of an EV_KEY event (up, down, hold)
+KEY_VALUE_CNT = len(KeyEvent)
+
+class DispatchTable():
+    """Table of actions, indexed by the (type, code, value) of the triggering event.
+
+    Only EV_KEY events trigger actions, so the table is a flat list of 
+    KEY_VALUE_CNT * KEY_CNT entries, where the action triggered by an event
+    is found at index (value * KEY_CNT + code).
+    """
+
+    def __init__(self, action_mapping: Dict[int, Action], key_event: KeyEvent = KeyEvent.KEY_UP):
+        """Compile an action mapping into a dispatch table.
+
+        Args:
+            action_mapping:
+                Mapping of key code -> action.
+
+            key_event:
+                The key event triggering the actions.
+        """
+        self.table: List[Optional[Action]] = [None] * (KEY_VALUE_CNT * KEY_CNT)
+        for code, action in action_mapping.items():
+            self.table[key_event.value * KEY_CNT + code] = action
+
+    def lookup(self, type: int, code: int, value: int) -> Optional[Action]:
+        """Return the action triggered by the given event, or None.
+
+        Args:
+            type:
+                Event type.
+
+            code:
+                Event code.
+
+            value:
+                Event value.
+        """
+        if type != EV_KEY or not 0 <= code < KEY_CNT:
+            return None
+        index = value * KEY_CNT + code
+        return self.table[index] if 0 <= index < len(self.table) else None
+
+    def event_mask(self) -> Dict[int, Set[int]]:
+        """Return the events which may trigger an action, for InputDevice.set_event_mask.
+
+        Returns:
+            Dictionary of event type -> codes (where type 0 maps to the event types).
+        """
+        codes = {index % KEY_CNT for index, action in enumerate(self.table) if action is not None}
+        return {EventType.EV_SYN.value: {EV_KEY}, EV_KEY: codes}
+
+    def create_handler(self, dispatch: Callable[[Action], None]) -> Callable[[Event], None]:
+        """Create an event handler which dispatches the actions triggered by the events.
+
+        Args:
+            dispatch:
+                Callback to call with each triggered action.
+
+        Returns:
+            An event handler.
+        """
+        table = self.table
+        table_size = len(table)
+
+        def handle_events(input_event: Event):
+            # Other codes (e.g. from a replayed trace) would alias the entry of another key and value
+            if input_event.type == EV_KEY and input_event.code < KEY_CNT:
+                index = input_event.value * KEY_CNT + input_event.code
+                if 0 <= index < table_size:
+                    action = table[index]
+                    if action is not None:
+                        dispatch(action)
+
+        return handle_events
+
+    def create_frame_handler(self, dispatch: Callable[[Action], None]) -> Callable[[Frame], None]:
+        """Create a frame handler (see InputDevice.loop_frames) which dispatches the actions triggered by the events.
+
+        Args:
+            dispatch:
+                Callback to call with each triggered action, in the order of the events in the frame.
+
+        Returns:
+            A frame handler.
+        """
+        table = self.table
+        table_size = len(table)
+
+        def handle_frame(frame: Frame):
+            for input_event in frame:
+                if input_event.type == EV_KEY and input_event.code < KEY_CNT:
+                    index = input_event.value * KEY_CNT + input_event.code
+                    if 0 <= index < table_size:
+                        action = table[index]
+                        if action is not None:
+                            dispatch(action)
+
+        return handle_frame
@@ -0,0 +1,173 @@
+"""Recording of input events to trace files, for replaying them later on.
+
+A trace holds the raw struct input_event records read from one or more devices,
+in the order they were read, so that they can be replayed through the same
+handlers without the devices (e.g. for benchmarks, or for reproducing issues).
+
+Trace file format (little endian):
+
+    Header:  magic (8 bytes), version (u16), size of struct input_event (u16),
+             number of devices (u16)
+    Devices: for every device, its path and name, each as a length (u16)
+             followed by UTF-8 bytes
+    Records: for every event, the index of its device (u16) followed by the
+             struct input_event, as read from the device
+
+The size of struct input_event depends on the architecture (32 or 64 bit),
+hence traces can only be read on an architecture with the same size.
+
+Sources:
+    https://github.com/Dvd848/macro_keyboard
+
+License:
+    LGPL v2.1
+
+    This library is free software; you can redistribute it and/or
+    modify it under the terms of the GNU Lesser General Public
+    License as published by the Free Software Foundation; either
+    version 2.1 of the License, or (at your option) any later version.
+
+    This library is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+    Lesser General Public License for more details.
+
+    You should have received a copy of the GNU Lesser General Public
+    License along with this library; if not, write to the Free Software
+    Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301  USA
+
+"""
+import struct
+
+from collections import namedtuple
+from typing import BinaryIO, List, Tuple
+
+import linux_input
+
+from input_device import Event
+
+TRACE_MAGIC = b"MKTRACE\x00"
+TRACE_VERSION = 1
+
+TRACE_HEADER_STRUCT = struct.Struct("<8sHHH")
+STRING_LENGTH_STRUCT = struct.Struct("<H")
+RECORD_HEADER_STRUCT = struct.Struct("<H")
+
+# A device recorded in a trace
+TraceDevice = namedtuple("TraceDevice", "path name")
+
+# A recorded event: the index of its device in the trace, its kernel timestamp
+# (in seconds, as in time.time()) and the struct input_event itself
+TraceRecord = namedtuple("TraceRecord", "device timestamp data")
+
+def encode_event(input_event: Event) -> bytes:
+    """Return the struct input_event of the given event, as read from the device."""
+    if isinstance(input_event, linux_input.InputEvent):
+        return linux_input.INPUT_EVENT_STRUCT.pack(*input_event)
+    return bytes(input_event)
+
+class TraceWriter():
+    """Writes a trace file.
+
+    Implemented as a context manager. The devices must be written (see write_devices)
+    before any event.
+
+    Example usage:
+
+    >>> with TraceWriter("keypad.trace") as writer:
+    ...     writer.write_devices([TraceDevice("/dev/input/by-id/my_device", "My Keypad")])
+    ...     writer.write_event(0, input_event)
+    """
+
+    def __init__(self, trace_file: str):
+        """Initialize the writer.
+
+        Args:
+            trace_file:
+                Path of the trace file, overwritten if it exists.
+        """
+        self._trace_file = trace_file
+        self._file: BinaryIO = None
+        self.events = 0
+
+    def __enter__(self):
+        self._file = open(self._trace_file, "wb")
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self._file.close()
+
+    def write_devices(self, devices: List[TraceDevice]) -> None:
+        """Write the header of the trace, with the devices whose events are recorded.
+
+        Args:
+            devices:
+                The devices, where the index of a device in the list identifies its events.
+        """
+        self._file.write(TRACE_HEADER_STRUCT.pack(TRACE_MAGIC, TRACE_VERSION,
+                                                  linux_input.INPUT_EVENT_STRUCT.size, len(devices)))
+        for device in devices:
+            for string in (device.path, device.name):
+                data = string.encode("utf-8")
+                self._file.write(STRING_LENGTH_STRUCT.pack(len(data)) + data)
+
+    def write_event(self, device: int, input_event: Event) -> None:
+        """Write an event.
+
+        Args:
+            device:
+                Index of the device which the event was read from.
+
+            input_event:
+                The event.
+        """
+        self._file.write(RECORD_HEADER_STRUCT.pack(device) + encode_event(input_event))
+        self.events += 1
+
+def read_trace(trace_file: str) -> Tuple[List[TraceDevice], List[TraceRecord]]:
+    """Read a trace file.
+
+    Args:
+        trace_file:
+            Path of the trace file.
+
+    Returns:
+        The devices and the recorded events. A partial event at the end of the trace
+        (e.g. if the recording was interrupted) is ignored.
+    """
+    with open(trace_file, "rb") as f:
+        data = f.read()
+
+    if len(data) < TRACE_HEADER_STRUCT.size:
+        raise ValueError(f"'{trace_file}' is not a trace file")
+    magic, version, event_size, device_count = TRACE_HEADER_STRUCT.unpack_from(data)
+    if magic != TRACE_MAGIC:
+        raise ValueError(f"'{trace_file}' is not a trace file")
+    if version != TRACE_VERSION:
+        raise ValueError(f"Unsupported trace version: {version}")
+    if event_size != linux_input.INPUT_EVENT_STRUCT.size:
+        raise ValueError(f"The trace was recorded on a different architecture "
+                         f"(events of {event_size} bytes instead of {linux_input.INPUT_EVENT_STRUCT.size})")
+
+    offset = TRACE_HEADER_STRUCT.size
+    devices = []
+    for _ in range(device_count):
+        strings = []
+        for _ in range(2):
+            length, = STRING_LENGTH_STRUCT.unpack_from(data, offset)
+            offset += STRING_LENGTH_STRUCT.size
+            strings.append(data[offset:offset + length].decode("utf-8"))
+            offset += length
+        devices.append(TraceDevice(*strings))
+
+    records = []
+    record_size = RECORD_HEADER_STRUCT.size + event_size
+    unpack_event = linux_input.INPUT_EVENT_STRUCT.unpack_from
+    for record_offset in range(offset, len(data) - record_size + 1, record_size):
+        device, = RECORD_HEADER_STRUCT.unpack_from(data, record_offset)
+        if device >= device_count:
+            raise ValueError(f"Invalid device index {device} in trace")
+        event_offset = record_offset + RECORD_HEADER_STRUCT.size
+        tv_sec, tv_usec = unpack_event(data, event_offset)[:2]
+        records.append(TraceRecord(device, tv_sec + tv_usec / 1000000, data[event_offset:event_offset + event_size]))
+    return devices, records
@@ -0,0 +1,133 @@
+"""Minimal wrapper of the Linux inotify API, for watching directories without polling.
+
+Sources:
+    https://github.com/Dvd848/macro_keyboard
+    https://man7.org/linux/man-pages/man7/inotify.7.html
+
+License:
+    LGPL v2.1
+
+    This library is free software; you can redistribute it and/or
+    modify it under the terms of the GNU Lesser General Public
+    License as published by the Free Software Foundation; either
+    version 2.1 of the License, or (at your option) any later version.
+
+    This library is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+    Lesser General Public License for more details.
+
+    You should have received a copy of the GNU Lesser General Public
+    License along with this library; if not, write to the Free Software
+    Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301  USA
+
+"""
+import ctypes
+import enum
+import os
+import struct
+
+from collections import namedtuple
+from typing import Dict, List
+
+class InotifyMask(enum.IntFlag):
+    """Events which can be watched, from <sys/inotify.h>."""
+    IN_MODIFY      = 0x00000002
+    IN_ATTRIB      = 0x00000004
+    IN_CLOSE_WRITE = 0x00000008
+    IN_MOVED_FROM  = 0x00000040
+    IN_MOVED_TO    = 0x00000080
+    IN_CREATE      = 0x00000100
+    IN_DELETE      = 0x00000200
+    IN_DELETE_SELF = 0x00000400
+    IN_MOVE_SELF   = 0x00000800
+    IN_IGNORED     = 0x00008000
+
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC  = os.O_CLOEXEC
+
+# struct inotify_event { int wd; uint32_t mask; uint32_t cookie; uint32_t len; char name[]; };
+INOTIFY_EVENT_STRUCT = struct.Struct("iIII")
+
+# An inotify event, where "path" is the watched path and "name" the name of the file under it (if any)
+InotifyEvent = namedtuple("InotifyEvent", "path mask cookie name")
+
+# The functions are resolved from the C library already loaded into the process
+_libc = ctypes.CDLL(None, use_errno = True)
+
+def _check(result: int) -> int:
+    if result < 0:
+        errno = ctypes.get_errno()
+        raise OSError(errno, os.strerror(errno))
+    return result
+
+class Inotify():
+    """An inotify instance.
+
+    Implemented as a context manager, and can be registered with a selector.
+
+    Example usage:
+
+    >>> with Inotify() as inotify:
+    ...     inotify.add_watch("/dev/input/by-id", InotifyMask.IN_CREATE)
+    ...     for event in inotify.read_events():
+    ...         print(event.name)
+    """
+
+    # Enough for a burst of events, including a name of up to NAME_MAX characters
+    BUFFER_SIZE = 64 * (INOTIFY_EVENT_STRUCT.size + 256)
+
+    def __init__(self):
+        self._fd = None
+        self._watches: Dict[int, str] = {}
+
+    def __enter__(self):
+        self._fd = _check(_libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC))
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+    def fileno(self) -> int:
+        """File descriptor of the inotify instance, allowing to register it with a selector."""
+        return self._fd
+
+    def add_watch(self, path: str, mask: InotifyMask) -> None:
+        """Watch the given path for the given events.
+
+        Args:
+            path:
+                Path to watch (a directory or a file).
+
+            mask:
+                Events to watch.
+        """
+        wd = _check(_libc.inotify_add_watch(self._fd, os.fsencode(path), ctypes.c_uint32(mask)))
+        self._watches[wd] = path
+
+    def read_events(self) -> List[InotifyEvent]:
+        """Read the events available without blocking.
+
+        Returns:
+            The events read, or an empty list if no events are available.
+        """
+        try:
+            data = os.read(self._fd, self.BUFFER_SIZE)
+        except BlockingIOError:
+            return []
+
+        events = []
+        offset = 0
+        while offset < len(data):
+            wd, mask, cookie, length = INOTIFY_EVENT_STRUCT.unpack_from(data, offset)
+            offset += INOTIFY_EVENT_STRUCT.size
+            name = os.fsdecode(data[offset:offset + length].rstrip(b"\x00"))
+            offset += length
+            path = self._watches.get(wd)
+            if mask & InotifyMask.IN_IGNORED:
+                self._watches.pop(wd, None)
+            if path is not None:
+                events.append(InotifyEvent(path, InotifyMask(mask & 0xffff), cookie, name))
+        return events
@@ -1,107 +1,614 @@
-"""Representation of an input device.
-
-Sources:
-    https://github.com/Dvd848/macro_keyboard
-
-License:
-    LGPL v2.1
-
-    This library is free software; you can redistribute it and/or
-    modify it under the terms of the GNU Lesser General Public
-    License as published by the Free Software Foundation; either
-    version 2.1 of the License, or (at your option) any later version.
-
-    This library is distributed in the hope that it will be useful,
-    but WITHOUT ANY WARRANTY; without even the implied warranty of
-    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
-    Lesser General Public License for more details.
-
-    You should have received a copy of the GNU Lesser General Public
-    License along with this library; if not, write to the Free Software
-    Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301  USA
-
-"""
-import fcntl
-from typing import Callable
-import ctypes
-import linux_input
-
-class InputDevice():
-    """Representation of an input device.
-    
-    Implemented as a context manager.
-
-    Example usage:
-
-    >>> with InputDevice("/dev/input/by-id/my_device") as device:
-    ...     print(device.name)
-    """
-
-    def __init__(self, device_path: str):
-        """Initialize an input device.
-
-        Args:
-            device_path: 
-                Path to the device, under "/dev/input/"
-        """
-        self._device_path = device_path
-        self._fd = None
-        self._name = None
-
-    def __enter__(self):
-        self._fd = open(self._device_path, "rb")
-        return self
-
-    def __exit__(self, exc_type, exc_value, traceback):
-        if self._fd is not None:
-            self._fd.close()
-            self._fd = None
-
-    @property
-    def name(self) -> str:
-        """Name of the device as reported by EVIOCGNAME."""
-
-        if self._name is None:      
-            buffer_length = 255
-            name = (ctypes.c_char * buffer_length)()
-            actual_length = fcntl.ioctl(self._fd, linux_input.EVIOCGNAME(buffer_length), name, True)
-            if actual_length < 0:
-                raise OSError(-actual_length)
-            if name[actual_length - 1] == b'\x00':
-                actual_length -= 1
-            self._name = name[:actual_length].decode("ascii")
-        return self._name
-
-    def grab(self, do_grab: bool) -> None:
-        """Grab the device for exclusive use (block input from arriving to other programs).
-
-        Args:
-            do_grab:
-                True for grabbing the device for exclusive use, False for releasing the device.
-        """
-        res = fcntl.ioctl(self._fd, linux_input.EVIOCGRAB, int(do_grab))
-        if res < 0:
-            raise OSError(-res)
-
-    def loop_events(self, callback: Callable[[linux_input.struct_input_event], None]) -> None:
-        """Attach to the device, wait for incoming events and transfer them to the callback for handling.
-
-        Args:
-            callback:
-                A callback to which incoming events are transferred to.
-        """
-        event = self._fd.read(ctypes.sizeof(linux_input.struct_input_event))
-        while event:
-
-            # https://stackoverflow.com/questions/38197517/
-            # Note: type = EV_SYN, code = SYN_REPORT (0,0), is a synchronization event.
-            # It means that at this point, the input event state has been completely updated.
-
-            # You receive zero or more input records, followed by a type = EV_SYN, code = SYN_REPORT (0,0), 
-            #  for events that happened "at the same time".
-
-
-            input_event = linux_input.struct_input_event.from_buffer_copy(event)
-            callback(input_event)
-            event = self._fd.read(ctypes.sizeof(linux_input.struct_input_event))
-
+"""Representation of an input device.
+
+Sources:
+    https://github.com/Dvd848/macro_keyboard
+
+License:
+    LGPL v2.1
+
+    This library is free software; you can redistribute it and/or
+    modify it under the terms of the GNU Lesser General Public
+    License as published by the Free Software Foundation; either
+    version 2.1 of the License, or (at your option) any later version.
+
+    This library is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+    Lesser General Public License for more details.
+
+    You should have received a copy of the GNU Lesser General Public
+    License along with this library; if not, write to the Free Software
+    Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301  USA
+
+"""
+import fcntl
+import os
+from typing import AsyncIterator, Callable, Dict, Iterable, List, Optional, Set, Union
+import ctypes
+import enum
+import time
+import linux_input
+
+# An event, as decoded by either of the EventDecoder options
+Event = Union[linux_input.struct_input_event, linux_input.InputEvent]
+
+# The events reported together by the device, up to (and excluding) their SYN_REPORT
+Frame = List[Event]
+
+EV_SYN = linux_input.EventType.EV_SYN.value
+EV_KEY = linux_input.EventType.EV_KEY.value
+SYN_REPORT = linux_input.SynchronizationEvent.SYN_REPORT.value
+SYN_DROPPED = linux_input.SynchronizationEvent.SYN_DROPPED.value
+KEY_UP = linux_input.KeyEvent.KEY_UP.value
+KEY_DOWN = linux_input.KeyEvent.KEY_DOWN.value
+
+def event_timestamp(input_event: Event) -> float:
+    """Return the time of the given event as reported by the kernel, in seconds (as in time.time())."""
+    return input_event.time.tv_sec + input_event.time.tv_usec / 1000000
+
+class EventDecoder(enum.Enum):
+    """Available representations for events read from the device."""
+
+    # linux_input.struct_input_event (ctypes structure)
+    CTYPES = "ctypes"
+
+    # linux_input.InputEvent (namedtuple decoded via linux_input.INPUT_EVENT_STRUCT), 
+    #  performs as CTYPES (see benchmarks/decode_events.py)
+    STRUCT = "struct"
+
+class InputDevice():
+    """Representation of an input device.
+    
+    Implemented as a context manager.
+
+    If the events aren't read fast enough, the kernel drops events and reports SYN_DROPPED.
+    The events up to the next SYN_REPORT are then discarded, and the state of the keys is 
+    resynchronized (using EVIOCGKEY): keys which were released or pressed meanwhile are 
+    reported by synthetic KEY_UP / KEY_DOWN events, followed by a SYN_REPORT. Key events which 
+    were already queued by then are discarded if the resynchronized state reflects them.
+
+    Example usage:
+
+    >>> with InputDevice("/dev/input/by-id/my_device") as device:
+    ...     print(device.name)
+    """
+
+    def __init__(self, device_path: str, batch_size: int = 1, decoder: EventDecoder = EventDecoder.CTYPES, 
+                 on_dropped: Optional[Callable[["InputDevice"], None]] = None):
+        """Initialize an input device.
+
+        Args:
+            device_path: 
+                Path to the device, under "/dev/input/"
+
+            batch_size:
+                Maximum number of events to read from the device with a single read.
+                A value of 1 reads and copies each event separately, larger values
+                read many events at once into a preallocated buffer (see loop_events).
+
+            decoder:
+                Representation of the events passed to the loop_events callback.
+
+            on_dropped:
+                Callback to call once the state is resynchronized after the kernel dropped events.
+        """
+        if batch_size < 1:
+            raise ValueError(f"Invalid batch size: {batch_size}")
+        self._device_path = device_path
+        self._batch_size = batch_size
+        self._event_size = ctypes.sizeof(linux_input.struct_input_event)
+        self._decode_event = event_decoder(decoder)
+        if decoder == EventDecoder.STRUCT:
+            self._decode_events = self._decode_struct_events
+        else:
+            self._decode_events = self._decode_ctypes_events
+        self._view = memoryview(bytearray(self._event_size * batch_size))
+        # Partial event left at the end of the previous read, at this offset of the buffer
+        self._pending = 0
+        self._pending_offset = 0
+        self._fd = None
+        self._name = None
+        self._on_dropped = on_dropped
+        self._event_masks: Dict[int, Set[int]] = {}
+
+        # Keys which are down according to the events delivered so far
+        self._held: Set[int] = set()
+        # True while discarding events after SYN_DROPPED
+        self._dropping = False
+        # Time of the last resynchronization (as in event_timestamp), while reading the events which were 
+        #  already queued by then: the resynchronized state reflects them (see _is_resynced)
+        self._resync_time: Optional[float] = None
+        # Events of the current frame, until its SYN_REPORT is read (see read_frames)
+        self._frame: Frame = []
+
+        # Number of times the kernel dropped events
+        self.dropped = 0
+
+    def __enter__(self):
+        return self.open()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def open(self) -> "InputDevice":
+        """Open the device, returning self."""
+        self._fd = open(self._device_path, "rb", buffering = 0)
+        self._pending = 0
+        self._held.clear()
+        self._dropping = False
+        self._resync_time = None
+        self._frame = []
+        return self
+
+    def close(self) -> None:
+        """Close the device, if open."""
+        if self._fd is not None:
+            self._fd.close()
+            self._fd = None
+
+    def fileno(self) -> int:
+        """File descriptor of the device, allowing to register the device with a selector."""
+        return self._fd.fileno()
+
+    @property
+    def path(self) -> str:
+        """Path of the device."""
+        return self._device_path
+
+    @property
+    def name(self) -> str:
+        """Name of the device as reported by EVIOCGNAME."""
+
+        if self._name is None:      
+            buffer_length = 255
+            name = (ctypes.c_char * buffer_length)()
+            actual_length = fcntl.ioctl(self._fd, linux_input.EVIOCGNAME(buffer_length), name, True)
+            if actual_length < 0:
+                raise OSError(-actual_length)
+            if name[actual_length - 1] == b'\x00':
+                actual_length -= 1
+            self._name = name[:actual_length].decode("ascii")
+        return self._name
+
+    def grab(self, do_grab: bool) -> None:
+        """Grab the device for exclusive use (block input from arriving to other programs).
+
+        Args:
+            do_grab:
+                True for grabbing the device for exclusive use, False for releasing the device.
+        """
+        res = fcntl.ioctl(self._fd, linux_input.EVIOCGRAB, int(do_grab))
+        if res < 0:
+            raise OSError(-res)
+
+    def set_event_mask(self, event_type: int, codes: Iterable[int]) -> None:
+        """Set which events the kernel delivers to us, using EVIOCSMASK (Linux 4.4+).
+
+        The mask is applied by the kernel, so filtered events don't wake us up at all.
+        EV_SYN events are never filtered, and SYN_REPORT events which end up
+        reporting nothing (since all their events were filtered) are dropped.
+
+        Args:
+            event_type:
+                The type of the events to mask (e.g. EV_KEY). 
+                Type 0 (EV_SYN) masks the event types themselves: codes are then event types.
+
+            codes:
+                The codes to deliver, events of the given type with other codes are filtered.
+        """
+        # The kernel expects a bitmap of longs. KEY_CNT is the largest count of codes for any type,
+        #  and the kernel only reads as many bits as needed for the given type.
+        bits_per_long = ctypes.sizeof(ctypes.c_ulong) * 8
+        bitmap = (ctypes.c_ulong * ((linux_input.KEY_CNT + bits_per_long - 1) // bits_per_long))()
+        for code in codes:
+            bitmap[code // bits_per_long] |= 1 << (code % bits_per_long)
+
+        input_mask = linux_input.struct_input_mask(type = event_type, codes_size = ctypes.sizeof(bitmap), 
+                                                   codes_ptr = ctypes.addressof(bitmap))
+        res = fcntl.ioctl(self._fd, linux_input.EVIOCSMASK, input_mask)
+        if res < 0:
+            raise OSError(-res)
+        self._event_masks[event_type] = set(codes)
+
+    def get_key_state(self) -> Set[int]:
+        """Return the codes of the keys which are currently down, as reported by EVIOCGKEY."""
+        state = bytearray((linux_input.KEY_CNT + 7) // 8)
+        res = fcntl.ioctl(self._fd, linux_input.EVIOCGKEY(len(state)), state, True)
+        if res < 0:
+            raise OSError(-res)
+        return {index * 8 + bit for index, byte in enumerate(state) if byte for bit in range(8) if byte >> bit & 1}
+
+    def loop_events(self, callback: Callable[[Event], None]) -> None:
+        """Attach to the device, wait for incoming events and transfer them to the callback for handling.
+
+        If the device was created with a batch size larger than 1, all events available
+        in a single read are transferred to the callback before the next read.
+
+        Args:
+            callback:
+                A callback to which incoming events are transferred to.
+        """
+        # https://stackoverflow.com/questions/38197517/
+        # Note: type = EV_SYN, code = SYN_REPORT (0,0), is a synchronization event.
+        # It means that at this point, the input event state has been completely updated.
+
+        # You receive zero or more input records, followed by a type = EV_SYN, code = SYN_REPORT (0,0), 
+        #  for events that happened "at the same time".
+
+        read_events = self.read_events
+        while read_events(callback):
+            pass
+
+    def read_events(self, callback: Callable[[Event], None]) -> bool:
+        """Perform a single read from the device and transfer the events read to the callback.
+
+        Reads up to batch_size events. This is meant to be called when the device is known
+        to be readable (e.g. via the selectors module, see fileno), in order to handle
+        several devices from a single thread.
+
+        Args:
+            callback:
+                A callback to which incoming events are transferred to.
+
+        Returns:
+            False if the end of the input has been reached, True otherwise.
+        """
+        if self._batch_size == 1:
+            event = self._read_event()
+            if event:
+                self._deliver(self._decode_event(event), callback)
+            return event is not None
+
+        view = self._read_batch()
+        if view is None:
+            return False
+
+        events = iter(self._decode_events(view))
+        if self._dropping or self._resync_time is not None:
+            self._deliver_all(events, callback)
+        else:
+            # Same as _deliver, inlined until events are dropped
+            press = self._held.add
+            release = self._held.discard
+            for input_event in events:
+                event_type = input_event.type
+                if event_type == EV_KEY:
+                    if input_event.value == KEY_UP:
+                        release(input_event.code)
+                    else:
+                        press(input_event.code)
+                elif event_type == EV_SYN and input_event.code == SYN_DROPPED:
+                    self._deliver(input_event, callback)
+                    self._deliver_all(events, callback)
+                    break
+                callback(input_event)
+        return True
+
+    def read_raw_events(self, callback: Callable[[Event], None]) -> bool:
+        """Perform a single read from the device and transfer the events read to the callback, exactly as read.
+
+        Same as read_events, except that dropped events aren't handled: SYN_DROPPED and the events 
+        following it are transferred as well, and the state of the keys isn't resynchronized
+        (e.g. for recording the events, see macro_keypad.record_events).
+
+        Args:
+            callback:
+                A callback to which incoming events are transferred to.
+
+        Returns:
+            False if the end of the input has been reached, True otherwise.
+        """
+        if self._batch_size == 1:
+            event = self._read_event()
+            if event:
+                callback(self._decode_event(event))
+            return event is not None
+
+        view = self._read_batch()
+        if view is None:
+            return False
+        for input_event in self._decode_events(view):
+            callback(input_event)
+        return True
+
+    def loop_frames(self, callback: Callable[[Frame], None]) -> None:
+        """Attach to the device, wait for incoming events and transfer them to the callback frame by frame.
+
+        Same as loop_events, except that the callback is called once per frame: the list of events 
+        reported together (sharing a single timestamp), without the SYN_REPORT ending them. 
+        This allows handling simultaneous keystrokes at once, with a single call per frame.
+
+        Args:
+            callback:
+                A callback to which incoming frames are transferred to. The callback may keep the list.
+        """
+        read_frames = self.read_frames
+        while read_frames(callback):
+            pass
+
+    def read_frames(self, callback: Callable[[Frame], None]) -> bool:
+        """Perform a single read from the device and transfer the complete frames read to the callback.
+
+        Same as read_events, except that the events are transferred as frames (see loop_frames).
+        The events of a frame whose SYN_REPORT wasn't read yet are kept until a following read.
+
+        Args:
+            callback:
+                A callback to which incoming frames are transferred to.
+
+        Returns:
+            False if the end of the input has been reached, True otherwise.
+        """
+        if self._batch_size == 1:
+            event = self._read_event()
+            if event:
+                self._deliver(self._decode_event(event), self._frame_collector(callback))
+            return event is not None
+
+        view = self._read_batch()
+        if view is None:
+            return False
+
+        events = list(self._decode_events(view))
+        if self._dropping or self._resync_time is not None:
+            self._deliver_all(events, self._frame_collector(callback))
+            return True
+
+        # Same as _deliver followed by _frame_collector, inlined until events are dropped. 
+        #  The frames are sliced from the events, rather than built event by event.
+        press = self._held.add
+        release = self._held.discard
+        start = 0
+        for end, input_event in enumerate(events):
+            event_type = input_event.type
+            if event_type == EV_KEY:
+                if input_event.value == KEY_UP:
+                    release(input_event.code)
+                else:
+                    press(input_event.code)
+            elif event_type == EV_SYN:
+                code = input_event.code
+                if code == SYN_REPORT:
+                    if self._frame:
+                        frame = self._frame + events[start:end]
+                        self._frame = []
+                        callback(frame)
+                    elif end > start:
+                        callback(events[start:end])
+                    start = end + 1
+                elif code == SYN_DROPPED:
+                    # The events of the current frame are discarded by _deliver
+                    self._frame += events[start:end]
+                    self._deliver_all(events[end:], self._frame_collector(callback))
+                    return True
+        self._frame += events[start:]
+        return True
+
+    async def async_events(self) -> AsyncIterator[Event]:
+        """Asynchronously iterate over the events of the device, until the end of the input.
+
+        Must be iterated from a running asyncio event loop. The device is made non-blocking, 
+        and waiting for events is done by registering it with the event loop (using add_reader), 
+        so other tasks of the event loop run meanwhile.
+
+        Example usage:
+
+        >>> async for input_event in device.async_events():
+        ...     print(input_event.code)
+        """
+        async for events in self._read_async(InputDevice.read_events):
+            for input_event in events:
+                yield input_event
+
+    async def async_frames(self) -> AsyncIterator[Frame]:
+        """Asynchronously iterate over the frames of the device (see loop_frames), until the end of the input.
+
+        Same as async_events, except that the events are grouped into frames.
+        """
+        async for frames in self._read_async(InputDevice.read_frames):
+            for frame in frames:
+                yield frame
+
+    async def _read_async(self, read: Callable[["InputDevice", Callable], bool]) -> AsyncIterator[list]:
+        """Read from the device with the given read method until the end of the input, yielding what each read transferred."""
+        import asyncio
+
+        loop = asyncio.get_running_loop()
+        fd = self.fileno()
+        os.set_blocking(fd, False)
+
+        def on_readable():
+            if not readable.done():
+                readable.set_result(None)
+
+        try:
+            items = []
+            while read(self, items.append):
+                if items:
+                    yield items
+                    items = []
+                    continue
+                # Only registered while waiting, since the device stays readable until it is read
+                readable = loop.create_future()
+                loop.add_reader(fd, on_readable)
+                try:
+                    await readable
+                finally:
+                    loop.remove_reader(fd)
+        finally:
+            if self._fd is not None:
+                os.set_blocking(fd, True)
+
+    def _read_event(self) -> Optional[bytes]:
+        """Read a single event (for a batch size of 1).
+
+        Returns:
+            The event, empty if a whole event isn't available yet, 
+            or None if the end of the input has been reached.
+        """
+        if self._pending:
+            return self._read_batch()
+        event = self._fd.read(self._event_size)
+        if event is None:
+            return b""
+        if 0 < len(event) < self._event_size:
+            # A pipe (e.g. a recording) might return a partial event, completed by the next read
+            self._view[:len(event)] = event
+            self._pending = len(event)
+            self._pending_offset = 0
+            return b""
+        return event or None
+
+    def _read_batch(self) -> Optional[memoryview]:
+        """Read up to batch_size events into the buffer.
+
+        Returns:
+            The whole events read (only valid until the next read), 
+            or None if the end of the input has been reached.
+        """
+        # The kernel only returns whole events, but a regular file or a pipe (e.g. a recording) 
+        #  might not, so a partial event is moved to the start of the buffer for the next read
+        view = self._view
+        pending = self._pending
+        if pending and self._pending_offset:
+            view[:pending] = view[self._pending_offset:self._pending_offset + pending]
+            self._pending_offset = 0
+        bytes_read = self._fd.readinto(view[pending:])
+        if not bytes_read:
+            return None if bytes_read == 0 else view[:0]
+
+        available = pending + bytes_read
+        end = available - (available % self._event_size)
+        self._pending = available - end
+        self._pending_offset = end
+        return view[:end]
+
+    def _frame_collector(self, callback: Callable[[Frame], None]) -> Callable[[Event], None]:
+        """Return an event callback which collects the events into frames, transferred to the given callback."""
+        def collect(input_event: Event):
+            if input_event.type == EV_SYN and input_event.code == SYN_REPORT:
+                if self._frame:
+                    callback(self._frame)
+                    self._frame = []
+            else:
+                self._frame.append(input_event)
+
+        return collect
+
+    def _deliver(self, input_event: Event, callback: Callable[[Event], None]) -> None:
+        """Transfer an event to the callback, keeping track of the keys and of dropped events."""
+        event_type = input_event.type
+        if event_type == EV_KEY:
+            if self._dropping:
+                return
+            if self._resync_time is not None and self._is_resynced(input_event):
+                return
+            if input_event.value == KEY_UP:
+                self._held.discard(input_event.code)
+            else:
+                self._held.add(input_event.code)
+        elif event_type == EV_SYN:
+            code = input_event.code
+            if code == SYN_DROPPED:
+                # The events since the last SYN_REPORT are incomplete as well: discarded if not delivered 
+                #  yet (the current frame, see read_frames), but already delivered by read_events
+                self._discard_frame()
+                self._dropping = True
+                self.dropped += 1
+                return
+            if self._dropping:
+                if code == SYN_REPORT:
+                    self._dropping = False
+                    self._resync(input_event, callback)
+                return
+        elif self._dropping:
+            return
+        callback(input_event)
+
+    def _discard_frame(self) -> None:
+        """Discard the events of the current frame, restoring the state of the keys from before it."""
+        # The kernel only reports changes in the state of a key, so the state before the frame 
+        #  is the opposite of the first change of each key in it (held unless pressed)
+        first_values = {}
+        for input_event in self._frame:
+            if input_event.type == EV_KEY:
+                first_values.setdefault(input_event.code, input_event.value)
+        for code, value in first_values.items():
+            if value == KEY_DOWN:
+                self._held.discard(code)
+            else:
+                self._held.add(code)
+        self._frame = []
+
+    def _deliver_all(self, events: Iterable[Event], callback: Callable[[Event], None]) -> None:
+        deliver = self._deliver
+        for input_event in events:
+            deliver(input_event, callback)
+
+    def _is_resynced(self, input_event: Event) -> bool:
+        """Check whether a key event read after a resynchronization is already reflected by the state of the keys.
+
+        The state is queried once the events are no longer dropped, so it includes the events which 
+        were queued by then, and delivering them as well would e.g. release a key twice.
+        """
+        if event_timestamp(input_event) > self._resync_time:
+            self._resync_time = None
+            return False
+        return (input_event.code in self._held) == (input_event.value != KEY_UP)
+
+    def _resync(self, report: Event, callback: Callable[[Event], None]) -> None:
+        """Report the changes in the state of the keys since events were dropped, ending with the given SYN_REPORT."""
+        try:
+            state = self.get_key_state()
+        except OSError:
+            # Not an input device (e.g. a recording), consider all keys released rather than stuck
+            state = set()
+        self._resync_time = time.time()
+        if EV_KEY not in self._event_masks.get(EV_SYN, {EV_KEY}):
+            state = set()
+        codes = self._event_masks.get(EV_KEY)
+        if codes is not None:
+            state &= codes
+
+        changes = [(code, KEY_UP) for code in sorted(self._held - state)] + \
+                  [(code, KEY_DOWN) for code in sorted(state - self._held)]
+        # Updated in place, since read_events holds its methods
+        self._held.clear()
+        self._held.update(state)
+        for code, value in changes:
+            callback(self._decode_event(linux_input.INPUT_EVENT_STRUCT.pack(
+                report.time.tv_sec, report.time.tv_usec, EV_KEY, code, value)))
+        callback(report)
+
+        if self._on_dropped is not None:
+            self._on_dropped(self)
+
+    @staticmethod
+    def _decode_struct_event(data: bytes) -> linux_input.InputEvent:
+        """Decode a single event to an InputEvent."""
+        return linux_input.InputEvent._make(linux_input.INPUT_EVENT_STRUCT.unpack(data))
+
+    @staticmethod
+    def _decode_struct_events(view: memoryview) -> Iterable[linux_input.InputEvent]:
+        """Decode a buffer of whole events to InputEvents."""
+        return map(linux_input.InputEvent._make, linux_input.INPUT_EVENT_STRUCT.iter_unpack(view))
+
+    def _decode_ctypes_events(self, view: memoryview) -> Iterable[linux_input.struct_input_event]:
+        """Decode a buffer of whole events to struct_input_events."""
+        # from_buffer_copy is cheaper than a from_buffer view, which needs to keep the buffer exported
+        from_buffer_copy = linux_input.struct_input_event.from_buffer_copy
+        return (from_buffer_copy(view, offset) for offset in range(0, len(view), self._event_size))
+
+def frame_handler(handler: Callable[[Event], None]) -> Callable[[Frame], None]:
+    """Return a frame handler (see InputDevice.loop_frames) which transfers every event of the frame to the given event handler."""
+    def handle_frame(frame: Frame):
+        for input_event in frame:
+            handler(input_event)
+
+    return handle_frame
+
+def event_decoder(decoder: EventDecoder) -> Callable[[bytes], Event]:
+    """Return a function decoding a single struct input_event (as read from a device) to the given representation."""
+    if decoder == EventDecoder.STRUCT:
+        return InputDevice._decode_struct_event
+    return linux_input.struct_input_event.from_buffer_copy
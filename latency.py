@@ -0,0 +1,428 @@
+"""Measurement of the latency between a keystroke and the completion of its action.
+
+The time from a keystroke to the completion of the action it triggers is split into stages:
+
+    * read:     From the kernel timestamp of the key event until the event is read by us.
+    * dispatch: From reading the event until its action is submitted for execution
+                (including any wait for a sequence to time out or a burst to end).
+    * queue:    From submitting the action until a worker starts executing it.
+    * spawn:    From starting a command until its process is created (commands only).
+    * run:      From starting the action until it completes.
+    * total:    From the kernel timestamp of the key event until the action completes.
+
+Each stage is recorded per key and/or per action into LatencyHistograms, which keep
+counts in log-linear buckets (as HDR histograms do): recording is a few integer
+operations, and percentiles are accurate to within 1/64 (~1.6%) of the value.
+
+The statistics can be written periodically to a file in the Prometheus text format
+(see MetricsWriter), e.g. for the textfile collector of the Prometheus node exporter,
+and read back by read_metrics(). The metrics include the number of times the kernel
+dropped the events of each device (see InputDevice).
+
+Sources:
+    https://github.com/Dvd848/macro_keyboard
+    http://hdrhistogram.org/
+    https://prometheus.io/docs/instrumenting/exposition_formats/
+
+License:
+    LGPL v2.1
+
+    This library is free software; you can redistribute it and/or
+    modify it under the terms of the GNU Lesser General Public
+    License as published by the Free Software Foundation; either
+    version 2.1 of the License, or (at your option) any later version.
+
+    This library is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+    Lesser General Public License for more details.
+
+    You should have received a copy of the GNU Lesser General Public
+    License along with this library; if not, write to the Free Software
+    Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301  USA
+
+"""
+import os
+import re
+import threading
+import time
+
+from collections import namedtuple
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import linux_input
+
+from actions import Action, Invocation
+from input_device import Event, event_timestamp
+from linux_input import EventType, KeyEvent
+
+EV_KEY = EventType.EV_KEY.value
+KEY_HOLD = KeyEvent.KEY_HOLD.value
+
+# The stages of handling a keystroke, in order
+STAGES = ("read", "dispatch", "queue", "spawn", "run", "total")
+
+# Percentiles reported by LatencyStats.summary and written as the quantiles of the metrics
+PERCENTILES = (50, 95, 99)
+
+METRIC_NAME = "macro_keypad_latency_seconds"
+DROPPED_METRIC_NAME = "macro_keypad_dropped_total"
+
+# Identifies a histogram: the stage, and the key (by name) or action (by description) measured
+SeriesKey = namedtuple("SeriesKey", "stage label value")
+
+# Summary of a histogram, where the percentiles are a mapping of percentile -> seconds
+SeriesSummary = namedtuple("SeriesSummary", "count sum max percentiles")
+
+# The key event which triggered an action: its key code and kernel timestamp
+KeyTrigger = namedtuple("KeyTrigger", "code timestamp")
+
+class LatencyHistogram():
+    """A histogram of latencies, in log-linear buckets of microseconds.
+
+    Values under 2 * SUB_BUCKETS microseconds have a bucket each. Above that, every
+    power of two is split into SUB_BUCKETS buckets of equal width.
+    Not thread safe, see LatencyStats.
+    """
+
+    SUB_BUCKET_BITS = 6
+    SUB_BUCKETS = 1 << SUB_BUCKET_BITS
+
+    def __init__(self):
+        self.counts: List[int] = []
+        self.count = 0
+        self.total = 0
+        self.max = 0
+
+    def record(self, seconds: float) -> None:
+        """Record a latency.
+
+        Args:
+            seconds:
+                The latency, negative values (e.g. due to clock adjustments) are recorded as zero.
+        """
+        value = max(int(seconds * 1000000), 0)
+        shift = value.bit_length() - self.SUB_BUCKET_BITS - 1
+        index = value if shift <= 0 else (shift << self.SUB_BUCKET_BITS) + (value >> shift)
+        counts = self.counts
+        if index >= len(counts):
+            counts.extend([0] * (index + 1 - len(counts)))
+        counts[index] += 1
+        self.count += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+
+    def percentile(self, percentile: float) -> float:
+        """Return the given percentile of the recorded latencies, in seconds.
+
+        Args:
+            percentile:
+                The percentile, between 0 and 100.
+
+        Returns:
+            The highest value of the bucket holding the percentile (capped by the
+            maximal latency recorded), or 0 if nothing was recorded.
+        """
+        if self.count == 0:
+            return 0.0
+        threshold = max(self.count * percentile / 100, 1)
+        cumulative = 0
+        for index, count in enumerate(self.counts):
+            cumulative += count
+            if cumulative >= threshold:
+                return min(self._bucket_end(index), self.max) / 1000000
+        return self.max / 1000000
+
+    def summary(self) -> SeriesSummary:
+        """Return the count, sum, maximum and percentiles (see PERCENTILES) of the latencies."""
+        return SeriesSummary(self.count, self.total / 1000000, self.max / 1000000,
+                             {percentile: self.percentile(percentile) for percentile in PERCENTILES})
+
+    @classmethod
+    def _bucket_end(cls, index: int) -> int:
+        """Return the highest value (in microseconds) recorded into the given bucket."""
+        if index < 2 * cls.SUB_BUCKETS:
+            return index
+        shift = (index >> cls.SUB_BUCKET_BITS) - 1
+        sub_bucket = index - (shift << cls.SUB_BUCKET_BITS)
+        return ((sub_bucket + 1) << shift) - 1
+
+class LatencyStats():
+    """The latency histograms of all stages, keys and actions. Thread safe."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._histograms: Dict[SeriesKey, LatencyHistogram] = {}
+        self._dropped: Dict[str, int] = {}
+
+    def record(self, stage: str, label: str, value: str, seconds: float) -> None:
+        """Record a latency.
+
+        Args:
+            stage:
+                The stage measured, one of STAGES.
+
+            label:
+                What the latency is attributed to: "key" or "action".
+
+            value:
+                The name of the key, or the description of the action.
+
+            seconds:
+                The latency.
+        """
+        key = SeriesKey(stage, label, value)
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = LatencyHistogram()
+            histogram.record(seconds)
+
+    def record_dropped(self, device_path: str) -> None:
+        """Record that the kernel dropped events of the given device."""
+        with self._lock:
+            self._dropped[device_path] = self._dropped.get(device_path, 0) + 1
+
+    def summary(self) -> Dict[SeriesKey, SeriesSummary]:
+        """Return a summary of every histogram."""
+        with self._lock:
+            return {key: histogram.summary() for key, histogram in self._histograms.items()}
+
+    def dropped(self) -> Dict[str, int]:
+        """Return the number of times the kernel dropped events, per device path."""
+        with self._lock:
+            return dict(self._dropped)
+
+def _key_name(code: int) -> str:
+    try:
+        return linux_input.Keys(code).name
+    except ValueError:
+        return f"KEY_{code}"
+
+def _action_name(action: Action) -> str:
+    return action.name if action.name is not None else str(action)
+
+class LatencyTracker():
+    """Records the latency of every stage of handling the keystrokes which trigger actions.
+
+    Used by wrapping the event handlers of the devices and the dispatch of the actions
+    (see wrap_handler and wrap_dispatch), and by passing on_done to the ActionExecutor.
+    The handlers must be called from a single thread.
+
+    An action is attributed to the last key event handled before it was dispatched,
+    which is the last key of a sequence, or the key whose release ended it.
+    """
+
+    def __init__(self, stats: Optional[LatencyStats] = None):
+        """Initialize the tracker.
+
+        Args:
+            stats:
+                Statistics to record into, created if not provided.
+        """
+        self.stats = stats if stats is not None else LatencyStats()
+        self._last: Optional[Tuple[int, float, float]] = None
+        self._key_names: Dict[int, str] = {}
+
+    def wrap_handler(self, handler: Callable[[Event], None]) -> Callable[[Event], None]:
+        """Wrap the event handler of a device, measuring the time until each key event is read.
+
+        Args:
+            handler:
+                The event handler.
+
+        Returns:
+            An event handler which calls the given one.
+        """
+        record = self.stats.record
+        key_name = self._key_name
+
+        def handle_event(input_event: Event):
+            if input_event.type == EV_KEY and input_event.value != KEY_HOLD:
+                now = time.time()
+                timestamp = event_timestamp(input_event)
+                self._last = (input_event.code, timestamp, now)
+                record("read", "key", key_name(input_event.code), now - timestamp)
+            handler(input_event)
+
+        return handle_event
+
+    def wrap_dispatch(self, dispatch: Callable[[Action, KeyTrigger], None]) -> Callable[[Action], None]:
+        """Wrap the dispatch of actions, measuring the time from reading the triggering key event.
+
+        Args:
+            dispatch:
+                Callback to call with each triggered action, and the key event which triggered it
+                (e.g. ActionExecutor.submit).
+
+        Returns:
+            A dispatch callback, taking the action only.
+        """
+        record = self.stats.record
+
+        def dispatch_action(action: Action):
+            if self._last is None:
+                dispatch(action, None)
+                return
+            code, timestamp, read_time = self._last
+            record("dispatch", "key", self._key_name(code), time.time() - read_time)
+            dispatch(action, KeyTrigger(code, timestamp))
+
+        return dispatch_action
+
+    def on_done(self, invocation: Invocation) -> None:
+        """Record the stages of a completed invocation, called by the ActionExecutor (from any thread)."""
+        if invocation.cancelled or invocation.started is None:
+            return
+        record = self.stats.record
+        action = _action_name(invocation.action)
+        record("queue", "action", action, invocation.started - invocation.submitted)
+        if invocation.spawned is not None:
+            record("spawn", "action", action, invocation.spawned - invocation.started)
+        record("run", "action", action, invocation.finished - invocation.started)
+
+        trigger = invocation.trigger
+        if trigger is not None:
+            total = invocation.finished - trigger.timestamp
+            record("total", "action", action, total)
+            record("total", "key", self._key_name(trigger.code), total)
+
+    def on_dropped(self, device_path: str) -> None:
+        """Record that the kernel dropped events of the given device, called by the DeviceLoop."""
+        self.stats.record_dropped(device_path)
+
+    def _key_name(self, code: int) -> str:
+        name = self._key_names.get(code)
+        if name is None:
+            name = self._key_names[code] = _key_name(code)
+        return name
+
+def _escape_label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+def _unescape_label(value: str) -> str:
+    return re.sub(r"\\(.)", lambda match: "\n" if match.group(1) == "n" else match.group(1), value)
+
+def format_metrics(stats: LatencyStats) -> str:
+    """Format the statistics in the Prometheus text format, as a summary per stage and key/action.
+
+    Args:
+        stats:
+            The statistics.
+
+    Returns:
+        The metrics, where the quantiles are computed over all latencies recorded so far.
+    """
+    lines = [f"# HELP {METRIC_NAME} Latency of each stage of handling a keystroke, per key or action.",
+             f"# TYPE {METRIC_NAME} summary"]
+    for key, summary in sorted(stats.summary().items()):
+        labels = f'stage="{key.stage}",{key.label}="{_escape_label(key.value)}"'
+        for percentile, seconds in summary.percentiles.items():
+            lines.append(f'{METRIC_NAME}{{{labels},quantile="{percentile / 100}"}} {seconds:.6f}')
+        lines.append(f"{METRIC_NAME}_sum{{{labels}}} {summary.sum:.6f}")
+        lines.append(f"{METRIC_NAME}_count{{{labels}}} {summary.count}")
+
+    lines += [f"# HELP {DROPPED_METRIC_NAME} Number of times the kernel dropped events of a device (SYN_DROPPED).",
+              f"# TYPE {DROPPED_METRIC_NAME} counter"]
+    for device_path, count in sorted(stats.dropped().items()):
+        lines.append(f'{DROPPED_METRIC_NAME}{{device="{_escape_label(device_path)}"}} {count}')
+    return "\n".join(lines) + "\n"
+
+def write_metrics(stats: LatencyStats, metrics_file: str) -> None:
+    """Write the statistics to the given file in the Prometheus text format (atomically, by replacing the file)."""
+    temp_file = f"{metrics_file}.tmp"
+    with open(temp_file, "w") as f:
+        f.write(format_metrics(stats))
+    os.replace(temp_file, metrics_file)
+
+_METRIC_LINE = re.compile(METRIC_NAME + r'(_sum|_count)?\{stage="(\w+)",(key|action)="((?:[^"\\]|\\.)*)"'
+                          r'(?:,quantile="([\d.]+)")?\} (\S+)')
+
+def read_metrics(metrics_file: str) -> Dict[SeriesKey, SeriesSummary]:
+    """Read the statistics written by write_metrics.
+
+    Args:
+        metrics_file:
+            Path of the metrics file.
+
+    Returns:
+        A summary of every histogram, where the maximum isn't available (None).
+    """
+    series: Dict[SeriesKey, Dict[str, Any]] = {}
+    with open(metrics_file) as f:
+        for line in f:
+            match = _METRIC_LINE.match(line)
+            if match is None:
+                continue
+            suffix, stage, label, value, quantile, number = match.groups()
+            fields = series.setdefault(SeriesKey(stage, label, _unescape_label(value)), {"percentiles": {}})
+            if suffix == "_sum":
+                fields["sum"] = float(number)
+            elif suffix == "_count":
+                fields["count"] = int(number)
+            else:
+                fields["percentiles"][round(float(quantile) * 100)] = float(number)
+
+    return {key: SeriesSummary(fields.get("count", 0), fields.get("sum", 0.0), None, fields["percentiles"])
+            for key, fields in series.items()}
+
+def print_summary(summaries: Dict[SeriesKey, SeriesSummary]) -> None:
+    """Print a table of the percentiles of each stage, per key and per action."""
+    for label, title in (("key", "Per key"), ("action", "Per action")):
+        rows = sorted((key for key in summaries if key.label == label),
+                      key = lambda key: (key.value, STAGES.index(key.stage) if key.stage in STAGES else len(STAGES)))
+        if not rows:
+            continue
+        width = max(len(key.value) for key in rows)
+        print(f"\n{title}:")
+        print(f"  {label.capitalize():<{width}}  {'Stage':<8}  {'Count':>7}  " +
+              "  ".join(f"{'p' + str(percentile):>10}" for percentile in PERCENTILES))
+        for key in rows:
+            summary = summaries[key]
+            print(f"  {key.value:<{width}}  {key.stage:<8}  {summary.count:>7}  " +
+                  "  ".join(f"{summary.percentiles.get(percentile, 0) * 1000:>7.2f} ms" for percentile in PERCENTILES))
+
+class MetricsWriter():
+    """Writes the statistics to a file periodically, from a background thread.
+
+    Implemented as a context manager, which writes the file once more upon exit.
+    """
+
+    def __init__(self, stats: LatencyStats, metrics_file: str, interval: float = 10.0):
+        """Initialize the writer.
+
+        Args:
+            stats:
+                The statistics to write.
+
+            metrics_file:
+                Path of the file to write.
+
+            interval:
+                Time (in seconds) between writes.
+        """
+        self._stats = stats
+        self._metrics_file = metrics_file
+        self._interval = interval
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target = self._run, name = "MetricsWriter", daemon = True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self._stopped.set()
+        self._thread.join()
+        self._write()
+
+    def _run(self) -> None:
+        while not self._stopped.wait(self._interval):
+            self._write()
+
+    def _write(self) -> None:
+        try:
+            write_metrics(self._stats, self._metrics_file)
+        except OSError as e:
+            print(f"Can't write metrics file '{self._metrics_file}' ({str(e)})")
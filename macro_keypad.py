@@ -1,225 +1,1604 @@
-#!/usr/bin/env python3
-
-"""A macro keypad (or keyboard) implementation.
-
-This program allows you to attach to a specific keyboard and execute
-custom predefined commands for each keystroke.
-The keystrokes are captured by the program and not propagated to any additional 
-program, turning the keyboard into a macro-only keyboard.
-
-The commands are defined in a JSON configuration file provided to the program.
-The KeyCode is a name of a key from linux_input.Keys.
-The Action is an array of commands compatible with subprocess.run.
-Example:
-    {
-        "ActionMapping": [
-            {
-                "KeyCode": "KEY_KP1",
-                "Action": ["whoami"]
-            },
-            {
-                "KeyCode": "KEY_KP2",
-                "Action": ["echo", "Hello World!"]
-            }
-        ]
-    }
-
-Sources:
-    https://github.com/Dvd848/macro_keyboard
-
-License:
-    LGPL v2.1
-
-    This library is free software; you can redistribute it and/or
-    modify it under the terms of the GNU Lesser General Public
-    License as published by the Free Software Foundation; either
-    version 2.1 of the License, or (at your option) any later version.
-
-    This library is distributed in the hope that it will be useful,
-    but WITHOUT ANY WARRANTY; without even the implied warranty of
-    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
-    Lesser General Public License for more details.
-
-    You should have received a copy of the GNU Lesser General Public
-    License along with this library; if not, write to the Free Software
-    Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301  USA
-
-"""
-
-from input_device import linux_input, InputDevice
-from linux_input import struct_input_event, EventType, KeyEvent, Keys
-from typing import Callable, List, Dict
-
-import json
-import subprocess
-import os, pwd, grp
-import argparse
-import enum
-
-def drop_privileges(uid_name = 'nobody', gid_name = 'nogroup'):
-    """Drop privileges of current program in case it is running as root.
-
-    Based on https://stackoverflow.com/questions/2699907/
-    """
-    if os.getuid() != 0:
-        # We're not root
-        return
-
-    # Get the uid/gid from the name
-    running_uid = pwd.getpwnam(uid_name).pw_uid
-    running_gid = grp.getgrnam(gid_name).gr_gid
-
-    # Remove group privileges
-    os.setgroups([])
-
-    # Try setting the new uid/gid
-    os.setgid(running_gid)
-    os.setuid(running_uid)
-
-    # Ensure a very conservative umask
-    os.umask(0o022)
-
-def list_devices():
-    """List devices under /dev/input/by-id/"""
-    print("The following devices are connected:")
-    for device in os.listdir("/dev/input/by-id/"):
-        print(f" (-) {device}")
-
-
-def get_action_mapping(config_file: str) -> Dict[Keys, List[str]]:
-    """Translate action mapping from a file to a dictionary.
-
-    Given a configuration file containing a mapping of keys to actions,
-    read the file and return a dictionary of key -> action.
-    The action is an array of commands, compatible with subprocess.run,
-    For example: ["ls", "-l"].
-
-    Args:
-        config_str: Path to JSON configuration file.
-
-    Returns:
-        Dictionary of key -> action
-    """
-    action_mapping = {}
-
-    with open(config_file) as f:
-        config = json.load(f)
-        for item in config["ActionMapping"]:
-            action_mapping[Keys[item["KeyCode"]]] = item["Action"]
-
-    return action_mapping
-
-def print_keystrokes(device_path: str) -> None:
-    """Callback to print keystrokes of a given device.
-    
-    Args:
-        device_path: 
-            Path to device.
-    """
-    def handle_events(input_event: struct_input_event):
-        if input_event.type != EventType.EV_KEY.value:
-            return
-
-        if input_event.value != KeyEvent.KEY_UP.value:
-            return
-
-        print(f"\nReceived keystroke: {Keys(input_event.code)}")
-
-    run(device_path, False, handle_events)
-
-def run_macro_keypad(device_path: str, action_mapping: Dict[Keys, List[str]]) -> None:
-    """Callback to execute commands from the given mapping for a given device.
-
-    This function accepts a path to a device and a mapping of keys -> actions.
-    It executes the appropriate action given the matching keystroke.
-    
-    Args:
-        device_path: 
-            Path to device.
-
-        action_mapping:
-            Mapping of key -> action.
-    """
-    def handle_events(input_event: struct_input_event):
-        if input_event.type != EventType.EV_KEY.value:
-            return
-
-        if input_event.value != KeyEvent.KEY_UP.value:
-            return
-
-        key_code = linux_input.Keys(input_event.code)
-
-        if key_code in action_mapping:
-            print("Running command:\n{}".format(action_mapping[key_code]))
-            subprocess.run(action_mapping[key_code])
-            print("\nDone")
-            print("-" * 20)
-        
-
-    run(device_path, True, handle_events)
-
-def run(device_path: str, grab_device: bool, handler: Callable[[struct_input_event], None]) -> None:
-    """Attach to a given device and call the handler for every device event.
-
-    Args:
-        device_path:
-            Path to the device.
-
-        grab_device:
-            True if keystrokes from the device should be blocked from arriving to other programs.
-
-        handler:
-            Callback to call for every event from the device.
-
-    """
-    try:
-        with InputDevice(device_path) as device:
-            drop_privileges() # Opening the device must be done as root, drop privileges after
-            assert(os.getresuid() != (0, 0, 0))
-
-            print(f"Connected to device '{device.name}'")
-            if grab_device:
-                device.grab(True)
-
-            device.loop_events(handler)
-    except PermissionError as e:
-        raise PermissionError("Permission denied, are you running as root?") from e
-
-
-
-if __name__ == "__main__":
-    class Commands(enum.Enum):
-        """Commands for argument parsing."""
-        LIST = "list"
-        RUN  = "run"
-
-    parser = argparse.ArgumentParser(description = 'A program to utilize a dedicated keyboard as a macro keyboard')
-
-    subparsers = parser.add_subparsers(dest = 'command', required = True, title = 'subcommands',
-                                       description = 'Valid subcommands')
-    # A "list" command
-    list_parser = subparsers.add_parser(Commands.LIST.value, help = 'List the devices under /dev/input/by-id/')
-
-    # A "run" command
-    run_parser = subparsers.add_parser(Commands.RUN.value, help = 'Attach to keyboard device and handle keystrokes')
-    run_parser.add_argument('-d', '--device', action = 'store', help = "The device path to connect to", required = True)
-    run_action = run_parser.add_mutually_exclusive_group(required = True)
-    run_action.add_argument('-p', '--print-keystrokes', action = 'store_true', help = "Interactively print the user keystrokes")
-    run_action.add_argument('-m', '--macro', action = 'store', type = str, metavar = ('CONFIG_FILE'), 
-                            help = "Execute macros with the given configuration file")
-
-    args = parser.parse_args()
-
-    try:
-        if args.command == Commands.LIST.value:
-            list_devices()
-        elif args.command == Commands.RUN.value:
-            if args.print_keystrokes:
-                print_keystrokes(args.device)
-            elif args.macro:
-                run_macro_keypad(args.device, get_action_mapping(args.macro))
-    except Exception as e:
-        print(f"Error: {str(e)}")
-    except KeyboardInterrupt:
-        print ("\nQuitting...")
-
+#!/usr/bin/env python3
+
+"""A macro keypad (or keyboard) implementation.
+
+This program allows you to attach to specific keyboards and execute
+custom predefined commands for each keystroke.
+The keystrokes are captured by the program and not propagated to any additional 
+program, turning the keyboard into a macro-only keyboard.
+
+The commands are defined in a JSON configuration file provided to the program.
+The KeyCode is a name of a key from linux_input.KeyCodes.
+The Action is an array of commands compatible with subprocess.run, or a call
+to a plugin loaded in-process (see load_plugins).
+The optional Policy decides what happens when a key is pressed while its action 
+is still running: "queue" (default), "drop" or "restart" (see actions.ConcurrencyPolicy).
+Actions run in the background, so keystrokes are handled while actions are running.
+Example:
+    {
+        "ActionMapping": [
+            {
+                "KeyCode": "KEY_KP1",
+                "Action": ["whoami"]
+            },
+            {
+                "KeyCode": "KEY_KP2",
+                "Action": ["echo", "Hello World!"],
+                "Policy": "drop"
+            }
+        ]
+    }
+Mappings dedicated to specific devices can be provided via a "Devices" list, 
+see load_config.
+Instead of a "KeyCode", an action can be triggered by a "Sequence" or a "Chord" 
+of keys, see get_action_mapping.
+
+Sources:
+    https://github.com/Dvd848/macro_keyboard
+
+License:
+    LGPL v2.1
+
+    This library is free software; you can redistribute it and/or
+    modify it under the terms of the GNU Lesser General Public
+    License as published by the Free Software Foundation; either
+    version 2.1 of the License, or (at your option) any later version.
+
+    This library is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+    Lesser General Public License for more details.
+
+    You should have received a copy of the GNU Lesser General Public
+    License along with this library; if not, write to the Free Software
+    Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301  USA
+
+"""
+
+from input_device import linux_input, InputDevice, Event, EventDecoder, Frame, event_decoder, frame_handler
+from linux_input import EventType, KeyEvent
+from actions import Action, ActionExecutor, AsyncActionExecutor, CommandAction, ConcurrencyPolicy, PluginAction
+from dispatch import DispatchTable
+from sequences import KeySequenceMatcher, Trigger
+from conditioning import ConditioningConfig, InputConditioner, RateLimit, TokenBucket
+from inotify import Inotify, InotifyMask
+from typing import Any, Callable, Iterable, List, Dict, Optional, Set, Tuple
+
+import marshal
+import os, pwd, grp
+import contextlib
+import importlib
+import selectors
+import signal
+import threading
+import time
+
+from collections import namedtuple
+
+DEFAULT_SEQUENCE_TIMEOUT = 1.0
+
+# Version of the format of the configuration cache, see load_config
+CONFIG_CACHE_VERSION = 1
+
+# Configuration loaded from the configuration file, see load_config
+Config = namedtuple("Config", "device_mappings sequence_timeout conditioning plugins")
+
+# Configuration compiled into event handlers for DeviceLoop, where the timers must be expired periodically, 
+# along with the device mappings it was compiled from
+CompiledConfig = namedtuple("CompiledConfig", "handlers event_masks timers device_mappings")
+
+# Changes in a directory of devices which might mean that a device was connected
+DEVICE_DIRECTORY_MASK = InotifyMask.IN_CREATE | InotifyMask.IN_MOVED_TO | InotifyMask.IN_ATTRIB
+
+def drop_privileges(uid_name = 'nobody', gid_name = 'nogroup', keep_groups: Iterable[str] = ()):
+    """Drop privileges of current program in case it is running as root.
+
+    Based on https://stackoverflow.com/questions/2699907/
+
+    Args:
+        keep_groups:
+            Names of supplementary groups to keep (e.g. "input" to be able to open 
+            input devices later on). Groups which don't exist are ignored.
+    """
+    if os.getuid() != 0:
+        # We're not root
+        return
+
+    # Get the uid/gid from the name
+    running_uid = pwd.getpwnam(uid_name).pw_uid
+    running_gid = grp.getgrnam(gid_name).gr_gid
+
+    # Remove group privileges, except for the groups to keep
+    groups = []
+    for group_name in keep_groups:
+        try:
+            groups.append(grp.getgrnam(group_name).gr_gid)
+        except KeyError:
+            pass
+    os.setgroups(groups)
+
+    # Try setting the new uid/gid
+    os.setgid(running_gid)
+    os.setuid(running_uid)
+
+    # Ensure a very conservative umask
+    os.umask(0o022)
+
+def list_devices():
+    """List devices under /dev/input/by-id/"""
+    print("The following devices are connected:")
+    for device in os.listdir("/dev/input/by-id/"):
+        print(f" (-) {device}")
+
+
+def load_plugins(plugins_config: Dict[str, dict], loaded: Optional[Dict[str, Tuple[dict, Any]]] = None) -> Dict[str, Any]:
+    """Load the plugins defined under "Plugins" in the configuration file.
+
+    Each plugin is loaded once, and can then be called in-process by any action, 
+    saving the cost of starting a new process for every keystroke. 
+    A plugin is defined by a "Module" to import, and optionally a "Class" from that 
+    module to instantiate with the given "Args" and "KwArgs":
+
+        "Plugins": {
+            "kodi": {
+                "Module": "plugins.kodi",
+                "Class": "KodiPlayer",
+                "Args": ["192.168.1.50:8080"]
+            }
+        }
+
+    Actions can then call methods of the plugin (or functions, if no class is given):
+
+        {
+            "KeyCode": "KEY_KP1",
+            "Action": {"Plugin": "kodi", "Method": "play_stream", "Args": ["http://..."]}
+        }
+
+    Args:
+        plugins_config:
+            Plugins configuration (name -> definition).
+
+        loaded:
+            Previously loaded plugins (name -> (definition, plugin object)), which are 
+            reused if their definition didn't change (e.g. when reloading the configuration).
+
+    Returns:
+        Dictionary of plugin name -> plugin object (class instance or module).
+    """
+    plugins = {}
+    try:
+        for plugin_name, definition in plugins_config.items():
+            if loaded is not None and plugin_name in loaded and loaded[plugin_name][0] == definition:
+                plugins[plugin_name] = loaded[plugin_name][1]
+                continue
+            plugin = importlib.import_module(definition["Module"])
+            if "Class" in definition:
+                plugin = getattr(plugin, definition["Class"])(*definition.get("Args", []), **definition.get("KwArgs", {}))
+            plugins[plugin_name] = plugin
+    except Exception:
+        close_plugins({name: (plugins_config[name], plugin) for name, plugin in plugins.items()}, 
+                      [loaded] if loaded is not None else [])
+        raise
+    return plugins
+
+def close_plugins(plugins: Dict[str, Tuple[dict, Any]], keep: Iterable[Dict[str, Tuple[dict, Any]]] = ()) -> None:
+    """Close the plugin objects which have a close() method (e.g. KodiPlayer), see load_plugins.
+
+    Args:
+        plugins:
+            Plugins to close (name -> (definition, plugin object)), as in Config.plugins.
+
+        keep:
+            Plugins which are still in use (e.g. by the current configuration), 
+            and therefore aren't closed even if also found in plugins.
+    """
+    in_use = {id(plugin) for kept in keep for _, plugin in kept.values()}
+    for plugin_name, (definition, plugin) in plugins.items():
+        if "Class" not in definition or id(plugin) in in_use or not hasattr(plugin, "close"):
+            continue
+        try:
+            plugin.close()
+        except Exception as e:
+            print(f"Error closing plugin '{plugin_name}' ({type(e).__name__}: {str(e)})")
+
+def _parse_action(item: dict, plugins_config: Dict[str, dict]) -> tuple:
+    """Translate an "ActionMapping" item to an action specification (see _create_action)."""
+    policy = ConcurrencyPolicy(item.get("Policy", ConcurrencyPolicy.QUEUE.value)).value
+    action = item["Action"]
+    if isinstance(action, list):
+        return ("command", list(action), item.get("Name"), policy)
+
+    if action["Plugin"] not in plugins_config:
+        raise ValueError(f"Unknown plugin '{action['Plugin']}'")
+    return ("plugin", action["Plugin"], action["Method"], action.get("Args", []), action.get("KwArgs", {}), 
+            item.get("Name"), policy)
+
+def _create_action(spec: tuple, plugins: Dict[str, Any]) -> Action:
+    """Create an action from its specification (see _parse_action)."""
+    if spec[0] == "command":
+        _, command, name, policy = spec
+        return CommandAction(command, name, ConcurrencyPolicy(policy))
+
+    _, plugin_name, method, args, kwargs, name, policy = spec
+    function = getattr(plugins[plugin_name], method)
+    return PluginAction(function, args, kwargs, name, ConcurrencyPolicy(policy))
+
+def _parse_trigger(item: dict) -> Trigger:
+    """Translate the trigger of an "ActionMapping" item: a "KeyCode", a "Sequence" or a "Chord"."""
+    if "Sequence" in item:
+        codes = tuple(linux_input.key_code(key_name) for key_name in item["Sequence"])
+        return codes[0] if len(codes) == 1 else codes
+    if "Chord" in item:
+        return frozenset(linux_input.key_code(key_name) for key_name in item["Chord"])
+    return linux_input.key_code(item["KeyCode"])
+
+def _parse_action_mapping(items: List[dict], plugins_config: Dict[str, dict]) -> List[Tuple[Trigger, tuple]]:
+    """Translate a list of "ActionMapping" items to a list of (trigger, action specification)."""
+    return [(_parse_trigger(item), _parse_action(item, plugins_config)) for item in items]
+
+def _create_action_mapping(items: List[Tuple[Trigger, tuple]], plugins: Dict[str, Any]) -> Dict[Trigger, Action]:
+    """Create a dictionary of trigger -> action from a parsed action mapping (see _parse_action_mapping)."""
+    return {trigger: _create_action(spec, plugins) for trigger, spec in items}
+
+def _parse_conditioning(item: dict) -> tuple:
+    """Translate the "Conditioning" item of the configuration file to the fields of a ConditioningConfig."""
+    def parse_rate_limit(key: str) -> Optional[tuple]:
+        if key not in item:
+            return None
+        return (float(item[key]["Rate"]), int(item[key].get("Burst", 1)))
+
+    return (float(item.get("Debounce", 0)), float(item.get("Coalesce", 0)),
+            parse_rate_limit("KeyRateLimit"), parse_rate_limit("GlobalRateLimit"))
+
+def _parse_config(config: dict) -> dict:
+    """Validate the contents of a configuration file, and translate them to plain data.
+
+    Key names are resolved to key codes and actions to specifications, so that the 
+    result only contains builtin types and can be cached with marshal (see _read_config).
+    """
+    plugins_config = config.get("Plugins", {})
+    return {
+        "Plugins": plugins_config,
+        "ActionMapping": _parse_action_mapping(config.get("ActionMapping", []), plugins_config),
+        "Devices": [(device["Device"], _parse_action_mapping(device["ActionMapping"], plugins_config)) 
+                    for device in config.get("Devices", [])],
+        "SequenceTimeout": float(config.get("SequenceTimeout", DEFAULT_SEQUENCE_TIMEOUT)),
+        "Conditioning": _parse_conditioning(config.get("Conditioning", {})),
+    }
+
+def _read_config(config_file: str, cache_file: Optional[str] = None) -> dict:
+    """Read and parse the configuration file (see _parse_config), using the given cache if possible.
+
+    The cache holds the parsed configuration, together with the modification time, size 
+    and hash of the file it was parsed from. If the modification time and size match, 
+    the file isn't read at all. Otherwise, the file is read and only parsed if its hash 
+    doesn't match either.
+    """
+    cached = None
+    if cache_file is not None:
+        try:
+            with open(cache_file, "rb") as f:
+                cached = marshal.load(f)
+            if cached.get("Version") != (CONFIG_CACHE_VERSION, marshal.version) or cached.get("File") != config_file:
+                cached = None
+        except (OSError, EOFError, ValueError, TypeError, AttributeError):
+            cached = None
+
+    stat = os.stat(config_file)
+    if cached is not None and cached["MTime"] == stat.st_mtime_ns and cached["Size"] == stat.st_size:
+        return cached["Config"]
+
+    # Only imported when the cache can't be used, to save their import time
+    import hashlib
+    import json
+
+    with open(config_file, "rb") as f:
+        content = f.read()
+    digest = hashlib.sha256(content).hexdigest()
+    if cached is not None and cached["Hash"] == digest:
+        config = cached["Config"]
+    else:
+        config = _parse_config(json.loads(content))
+
+    if cache_file is not None:
+        cached = {"Version": (CONFIG_CACHE_VERSION, marshal.version), "File": config_file, 
+                  "MTime": stat.st_mtime_ns, "Size": stat.st_size, "Hash": digest, "Config": config}
+        try:
+            temp_file = f"{cache_file}.tmp"
+            with open(temp_file, "wb") as f:
+                marshal.dump(cached, f)
+            os.replace(temp_file, cache_file)
+        except OSError as e:
+            print(f"Can't write configuration cache '{cache_file}' ({str(e)})")
+
+    return config
+
+def get_action_mapping(config_file: str) -> Dict[Trigger, Action]:
+    """Translate action mapping from a file to a dictionary.
+
+    Given a configuration file containing a mapping of keys to actions,
+    read the file and return a dictionary of key code -> action.
+    The action wraps an array of commands, compatible with subprocess.run,
+    For example: ["ls", "-l"], or a call to a plugin (see load_plugins).
+
+    Instead of a single key ("KeyCode"), an action can be triggered by a "Sequence" 
+    of keys pressed one after the other, which is mapped to a tuple of key codes, or by a 
+    "Chord" of keys held down together, which is mapped to a frozenset of key codes 
+    (see sequences.KeySequenceMatcher).
+
+    Args:
+        config_str: Path to JSON configuration file.
+
+    Returns:
+        Dictionary of key code -> action
+    """
+    config = _read_config(config_file)
+    return _create_action_mapping(config["ActionMapping"], load_plugins(config["Plugins"]))
+
+def load_config(config_file: str, device_paths: List[str], previous: Optional[Config] = None, 
+                cache_file: Optional[str] = None) -> Config:
+    """Load the configuration file.
+
+    In addition to the top-level "ActionMapping", the configuration file may contain 
+    a "Devices" list, where each entry is composed of a "Device" path and a dedicated 
+    "ActionMapping" for that device:
+
+        {
+            "ActionMapping": [ ... ],
+            "Devices": [
+                {
+                    "Device": "/dev/input/by-id/usb-04d9_1203-event-kbd",
+                    "ActionMapping": [ ... ]
+                }
+            ],
+            "SequenceTimeout": 1.0,
+            "Conditioning": {
+                "Debounce": 0.05,
+                "Coalesce": 0.3,
+                "KeyRateLimit": {"Rate": 1, "Burst": 3},
+                "GlobalRateLimit": {"Rate": 5, "Burst": 10}
+            }
+        }
+
+    All devices listed in the file are included in the result, as well as any device 
+    from device_paths, which uses the top-level "ActionMapping" unless listed in the file.
+    The optional "SequenceTimeout" is the maximal time in seconds between the keys of a 
+    "Sequence" (see get_action_mapping).
+    The optional "Conditioning" filters bursts of keystrokes before they trigger actions 
+    (see conditioning.InputConditioner), all of its entries are optional.
+
+    Args:
+        config_file: 
+            Path to JSON configuration file.
+
+        device_paths:
+            Additional devices to include in the result.
+
+        previous:
+            The previously loaded configuration, whose plugins are reused if unchanged.
+
+        cache_file:
+            Path to a cache of the parsed configuration file, for faster startup.
+            Created (or updated) if missing or stale.
+
+    Returns:
+        The configuration, where the device mappings are a dictionary of 
+        device path -> (dictionary of trigger -> action)
+    """
+    config = _read_config(config_file, cache_file)
+
+    plugins_config = config["Plugins"]
+    plugins = load_plugins(plugins_config, previous.plugins if previous is not None else None)
+    try:
+        default_mapping = _create_action_mapping(config["ActionMapping"], plugins)
+        device_mappings = {device_path: default_mapping for device_path in device_paths}
+        for device_path, action_mapping in config["Devices"]:
+            device_mappings[device_path] = _create_action_mapping(action_mapping, plugins)
+    except Exception:
+        # Plugins which were created for this configuration, and won't be used
+        close_plugins({name: (plugins_config[name], plugin) for name, plugin in plugins.items()}, 
+                      [previous.plugins] if previous is not None else [])
+        raise
+
+    debounce, coalesce, key_rate_limit, global_rate_limit = config["Conditioning"]
+    conditioning = ConditioningConfig(debounce, coalesce, 
+                                      RateLimit(*key_rate_limit) if key_rate_limit is not None else None, 
+                                      RateLimit(*global_rate_limit) if global_rate_limit is not None else None)
+
+    return Config(device_mappings = device_mappings, 
+                  sequence_timeout = config["SequenceTimeout"],
+                  conditioning = conditioning,
+                  plugins = {name: (plugins_config[name], plugin) for name, plugin in plugins.items()})
+
+def get_device_action_mappings(config_file: str, device_paths: List[str]) -> Dict[str, Dict[Trigger, Action]]:
+    """Translate the per-device action mappings from a file to a dictionary (see load_config).
+
+    Args:
+        config_file: 
+            Path to JSON configuration file.
+
+        device_paths:
+            Additional devices to include in the result.
+
+    Returns:
+        Dictionary of device path -> (dictionary of trigger -> action)
+    """
+    return load_config(config_file, device_paths).device_mappings
+
+def print_keystrokes(device_paths: List[str], batch_size: int = 1, decoder: EventDecoder = EventDecoder.CTYPES, 
+                     hotplug: bool = False, frames: bool = False) -> None:
+    """Callback to print keystrokes of the given devices.
+    
+    Args:
+        device_paths: 
+            Paths to devices.
+
+        batch_size:
+            Maximum number of events to read from the device at once.
+
+        decoder:
+            Representation of the events read from the device.
+
+        hotplug:
+            True to reattach to devices which are reconnected (see run).
+
+        frames:
+            True to handle the events frame by frame, printing keys released together on a single line.
+    """
+    def key_name(code: int) -> str:
+        try:
+            return str(linux_input.Keys(code))
+        except ValueError:
+            return f"Unknown key ({code})"
+
+    def create_handler(device_path: str) -> Callable[[Event], None]:
+        source = f" ({device_path})" if len(device_paths) > 1 else ""
+
+        def handle_events(input_event: Event):
+            if input_event.type != EventType.EV_KEY.value:
+                return
+
+            if input_event.value != KeyEvent.KEY_UP.value:
+                return
+
+            print(f"\nReceived keystroke: {key_name(input_event.code)}{source}")
+
+        return handle_events
+
+    def create_frame_handler(device_path: str) -> Callable[[Frame], None]:
+        source = f" ({device_path})" if len(device_paths) > 1 else ""
+
+        def handle_frame(frame: Frame):
+            keys = [key_name(input_event.code) for input_event in frame 
+                    if input_event.type == EventType.EV_KEY.value and input_event.value == KeyEvent.KEY_UP.value]
+            if keys:
+                print(f"\nReceived keystroke: {' + '.join(keys)}{source}")
+
+        return handle_frame
+
+    # Only key events are handled
+    event_mask = {EventType.EV_SYN.value: {EventType.EV_KEY.value}}
+    run({device_path: (create_frame_handler if frames else create_handler)(device_path) for device_path in device_paths}, 
+        False, batch_size, decoder, event_masks = {device_path: event_mask for device_path in device_paths}, 
+        hotplug = hotplug, frames = frames)
+
+def record_events(device_paths: List[str], trace_file: str, batch_size: int = 1, 
+                  decoder: EventDecoder = EventDecoder.CTYPES) -> None:
+    """Record all events of the given devices to a trace file (see event_trace), until they are disconnected.
+
+    The devices aren't grabbed, so their keystrokes still reach other programs while recording.
+    The events are recorded exactly as read, including any SYN_DROPPED reported by the kernel.
+
+    Args:
+        device_paths: 
+            Paths to devices.
+
+        trace_file:
+            Path of the trace file to write.
+
+        batch_size:
+            Maximum number of events to read from the device at once.
+
+        decoder:
+            Representation of the events read from the device.
+    """
+    from event_trace import TraceDevice, TraceWriter
+
+    device_paths = list(dict.fromkeys(device_paths))
+
+    def create_handler(device: int) -> Callable[[Event], None]:
+        write_event = writer.write_event
+
+        def handle_events(input_event: Event):
+            write_event(device, input_event)
+
+        return handle_events
+
+    def on_connected():
+        devices = loop.devices
+        writer.write_devices([TraceDevice(device_path, devices[device_path].name) for device_path in device_paths])
+        print(f"Recording events to '{trace_file}', press Ctrl+C to stop")
+
+    # The trace file is created before dropping privileges
+    with TraceWriter(trace_file) as writer:
+        # Recorded as read, including events dropped by the kernel, rather than resynchronized
+        loop = DeviceLoop({device_path: create_handler(index) for index, device_path in enumerate(device_paths)}, 
+                          False, batch_size, decoder, raw = True)
+        try:
+            loop.run(on_connected)
+        finally:
+            print(f"Recorded {writer.events} events")
+
+class ConfigReloader():
+    """Reloads the configuration file when it changes, or upon SIGHUP.
+
+    The file is watched with inotify (which also catches editors replacing the file).
+    The new configuration is loaded, validated and compiled by a background thread, 
+    and then handed over to the loop thread, which swaps it in between events.
+    Hence, no event is ever handled with a partially loaded configuration.
+    If the new configuration is invalid, the current one is kept.
+    Plugins which are no longer used (replaced, or created for an invalid configuration) are closed.
+
+    Implemented as a context manager.
+    """
+
+    # Changes which mean that the configuration file was rewritten
+    CONFIG_FILE_MASK = InotifyMask.IN_CLOSE_WRITE | InotifyMask.IN_MOVED_TO
+
+    def __init__(self, config_file: str, device_paths: List[str], config: Config):
+        """Initialize the reloader.
+
+        Args:
+            config_file:
+                Path to JSON configuration file.
+
+            device_paths:
+                Additional devices to include in the configuration (see load_config).
+
+            config:
+                The currently loaded configuration.
+        """
+        self._config_file = os.path.abspath(config_file)
+        self._device_paths = device_paths
+        # The latest loaded configuration, and the configuration which is applied (or about to be)
+        self._config = config
+        self._applied = config
+        self._inotify = Inotify()
+        self._wakeup_read, self._wakeup_write = os.pipe2(os.O_NONBLOCK | os.O_CLOEXEC)
+        self._lock = threading.Lock()
+        self._reloading = False
+        self._reload_again = False
+        self._compiled = None
+        self._loop: Optional["DeviceLoop"] = None
+        self._compile = None
+        self._apply = None
+
+    def __enter__(self):
+        # Watching must be started before dropping privileges
+        self._inotify.__enter__()
+        self._inotify.add_watch(os.path.dirname(self._config_file), self.CONFIG_FILE_MASK)
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        signal.signal(signal.SIGHUP, signal.SIG_DFL)
+        self._inotify.__exit__(exc_type, exc_value, traceback)
+        os.close(self._wakeup_read)
+        os.close(self._wakeup_write)
+
+    def start(self, loop: "DeviceLoop", compile: Callable[[Config], Any], apply: Callable[[Any], None]) -> None:
+        """Start reloading the configuration when needed.
+
+        Args:
+            loop:
+                The loop handling the devices, from which apply is called.
+
+            compile:
+                Callback to compile a newly loaded configuration, called from a background thread.
+
+            apply:
+                Callback to apply a compiled configuration, called from the loop thread.
+        """
+        self._loop = loop
+        self._compile = compile
+        self._apply = apply
+        loop.add_source(self._inotify, self._handle_file_events)
+        loop.add_source(self._wakeup_read, self._handle_wakeup)
+        signal.signal(signal.SIGHUP, lambda signum, frame: self.reload())
+
+    def reload(self) -> None:
+        """Reload the configuration in the background (may be called from any thread)."""
+        with self._lock:
+            if self._reloading:
+                # Reload again once done, since the file might have changed meanwhile
+                self._reload_again = True
+                return
+            self._reloading = True
+        threading.Thread(target = self._reload, name = "ConfigReloader", daemon = True).start()
+
+    def _reload(self) -> None:
+        while True:
+            start = time.monotonic()
+            config = None
+            try:
+                config = load_config(self._config_file, self._device_paths, self._config)
+                if not config.device_mappings:
+                    raise ValueError("No devices to attach to")
+                compiled = self._compile(config)
+            except Exception as e:
+                print(f"Error reloading configuration file, keeping the current configuration ({type(e).__name__}: {str(e)})")
+                if config is not None:
+                    close_plugins(config.plugins, [self._config.plugins])
+            else:
+                self._config = config
+                with self._lock:
+                    superseded = self._compiled
+                    self._compiled = (compiled, config, start)
+                    applied = self._applied
+                if superseded is not None:
+                    # Never applied, replaced by this configuration
+                    close_plugins(superseded[1].plugins, [config.plugins, applied.plugins])
+                os.write(self._wakeup_write, b"\x00")
+
+            with self._lock:
+                if not self._reload_again:
+                    self._reloading = False
+                    return
+                self._reload_again = False
+
+    def _handle_file_events(self) -> None:
+        if any(os.path.join(event.path, event.name) == self._config_file for event in self._inotify.read_events()):
+            self.reload()
+
+    def _handle_wakeup(self) -> None:
+        try:
+            while os.read(self._wakeup_read, 64):
+                pass
+        except BlockingIOError:
+            pass
+
+        with self._lock:
+            pending = self._compiled
+            self._compiled = None
+            if pending is not None:
+                replaced = self._applied
+                self._applied = pending[1]
+        if pending is not None:
+            # Applied once the events which are ready have been handled, since devices might be closed
+            self._loop.call_soon(lambda: self._apply_compiled(*pending, replaced))
+
+    def _apply_compiled(self, compiled: Any, config: Config, start: float, replaced: Config) -> None:
+        self._apply(compiled)
+        print(f"Reloaded configuration file in {(time.monotonic() - start) * 1000:.1f} ms")
+        close_plugins(replaced.plugins, [config.plugins])
+
+def run_macro_keypad(device_mappings: Dict[str, Dict[Trigger, Action]], batch_size: int = 1, 
+                     decoder: EventDecoder = EventDecoder.CTYPES, workers: int = 4, 
+                     sequence_timeout: float = DEFAULT_SEQUENCE_TIMEOUT, 
+                     conditioning: ConditioningConfig = ConditioningConfig(), 
+                     hotplug: bool = False, reloader: Optional["ConfigReloader"] = None, 
+                     latency: Optional["LatencyTracker"] = None, frames: bool = False, 
+                     use_asyncio: bool = False, control: Optional["ControlServer"] = None) -> None:
+    """Callback to execute commands from the given mappings for the given devices.
+
+    This function accepts a dictionary of device paths to mappings of triggers -> actions.
+    It executes the appropriate action given the matching keystroke from each device.
+    Actions are executed by a pool of workers, without blocking the handling of 
+    further keystrokes.
+    
+    Args:
+        device_mappings: 
+            Mapping of device path -> (mapping of trigger -> action).
+
+        batch_size:
+            Maximum number of events to read from the device at once.
+
+        decoder:
+            Representation of the events read from the device.
+
+        workers:
+            Maximum number of actions to execute concurrently.
+
+        sequence_timeout:
+            Maximal time (in seconds) between the keys of a sequence.
+
+        conditioning:
+            Filtering of bursts of keystrokes (debouncing, coalescing and rate limits), 
+            applied to each device before its keystrokes trigger actions.
+
+        hotplug:
+            True to reattach to devices which are reconnected (see run).
+
+        reloader:
+            Reloads the configuration when it changes, replacing the mappings 
+            given above.
+
+        latency:
+            Records the latency of every stage of handling the keystrokes, 
+            from the kernel timestamp of the key event to the completion of the action.
+
+        frames:
+            True to handle the events of each device frame by frame (see InputDevice.loop_frames).
+
+        use_asyncio:
+            True to handle the devices, the timers and the actions from a single asyncio 
+            event loop (see run_async and AsyncActionExecutor), instead of executing the 
+            actions by worker threads.
+
+        control:
+            Serves requests for triggering actions and querying the state, from the loop 
+            handling the devices (see _control_commands).
+    """
+    def prepare_actions(device_mappings: Dict[str, Dict[Trigger, Action]]) -> None:
+        for action_mapping in device_mappings.values():
+            for action in action_mapping.values():
+                action.prepare()
+
+    def compile_config(config: Config) -> CompiledConfig:
+        compiled = _compile_config(config, executor.submit, latency, frames)
+        prepare_actions(config.device_mappings)
+        return compiled
+
+    def apply_config(compiled: CompiledConfig) -> None:
+        nonlocal current
+        current = compiled
+        loop.set_handlers(compiled.handlers, compiled.event_masks)
+
+    def expire_timers() -> Optional[float]:
+        deadlines = [deadline for deadline in (timer.expire(time.time()) for timer in current.timers) 
+                     if deadline is not None]
+        return min(deadlines, default = None)
+
+    def on_connected():
+        # Once attached to the devices, get ready for the first action
+        executor.start()
+        prepare_actions(device_mappings)
+
+    def create_loop() -> DeviceLoop:
+        nonlocal current, loop
+        current = _compile_config(Config(device_mappings, sequence_timeout, conditioning, {}), 
+                                  executor.submit, latency, frames)
+        loop = DeviceLoop(current.handlers, True, batch_size, decoder, current.event_masks, expire_timers, hotplug, 
+                          latency.on_dropped if latency is not None else None, frames)
+        if reloader is not None:
+            reloader.start(loop, compile_config, apply_config)
+        if control is not None:
+            control.start(loop, _control_commands(lambda: current.device_mappings, executor, latency))
+        return loop
+
+    async def run_event_loop():
+        nonlocal executor
+        async with AsyncActionExecutor(workers, on_done) as executor:
+            await create_loop().run_async(on_connected)
+
+    current = loop = executor = None
+    on_done = latency.on_done if latency is not None else None
+    if use_asyncio:
+        import asyncio
+        asyncio.run(run_event_loop())
+    else:
+        with ActionExecutor(workers, on_done) as executor:
+            create_loop().run(on_connected)
+
+def _compile_config(config: Config, dispatch: Callable[..., None], 
+                    latency: Optional["LatencyTracker"] = None, frames: bool = False) -> CompiledConfig:
+    """Compile the device mappings of the given configuration into event handlers (or frame handlers).
+
+    The dispatch callback is called with each triggered action, and when measuring 
+    the latency, with the key event which triggered it as well (see ActionExecutor.submit).
+    """
+    if latency is not None:
+        dispatch = latency.wrap_dispatch(dispatch)
+
+    global_bucket = None
+    if config.conditioning.global_rate_limit is not None:
+        global_bucket = TokenBucket(config.conditioning.global_rate_limit)
+
+    handlers = {}
+    event_masks = {}
+    conditioners = []
+    matchers = []
+    for device_path, action_mapping in config.device_mappings.items():
+        if all(isinstance(trigger, int) for trigger in action_mapping):
+            # Single keys only, use the faster dispatch table
+            table = DispatchTable(action_mapping)
+            event_masks[device_path] = table.event_mask()
+            if frames and latency is None and config.conditioning == ConditioningConfig():
+                # Nothing wraps the handler, so the table can handle whole frames
+                handlers[device_path] = table.create_frame_handler(dispatch)
+                continue
+            handlers[device_path] = table.create_handler(dispatch)
+        else:
+            matcher = KeySequenceMatcher(action_mapping, dispatch, config.sequence_timeout)
+            matchers.append(matcher)
+            handlers[device_path] = matcher.handle_event
+            event_masks[device_path] = matcher.event_mask()
+
+        if config.conditioning != ConditioningConfig():
+            conditioner = InputConditioner(handlers[device_path], config.conditioning, global_bucket)
+            conditioners.append(conditioner)
+            handlers[device_path] = conditioner.handle_event
+
+        if latency is not None:
+            handlers[device_path] = latency.wrap_handler(handlers[device_path])
+
+        if frames:
+            handlers[device_path] = frame_handler(handlers[device_path])
+
+    # Conditioners first, since delivering their pending keystrokes may start a sequence
+    return CompiledConfig(handlers, event_masks, conditioners + matchers, config.device_mappings)
+
+def _describe_trigger(trigger: Trigger) -> dict:
+    """Describe a trigger as in the configuration file (see _parse_trigger)."""
+    def key_name(code: int) -> str:
+        try:
+            return linux_input.Keys(code).name
+        except ValueError:
+            return str(code)
+
+    if isinstance(trigger, int):
+        return {"KeyCode": key_name(trigger)}
+    if isinstance(trigger, tuple):
+        return {"Sequence": [key_name(code) for code in trigger]}
+    return {"Chord": sorted(key_name(code) for code in trigger)}
+
+def _control_commands(get_device_mappings: Callable[[], Dict[str, Dict[Trigger, Action]]], 
+                      executor: ActionExecutor, latency: Optional["LatencyTracker"]) -> Dict[str, Callable[[dict], Any]]:
+    """Return the commands served by the control socket (see control.ControlServer).
+
+        {"command": "trigger", "name": NAME}  Execute the action with the given "Name" in the configuration
+        {"command": "list"}                   List the mappings of every device
+        {"command": "status"}                 List the actions which are running or pending
+        {"command": "stats"}                  Report the latency statistics (when measured, see LatencyTracker)
+
+    Args:
+        get_device_mappings:
+            Callback returning the current device mappings (which change when the configuration is reloaded).
+
+        executor:
+            The executor of the actions.
+
+        latency:
+            The latency tracker, or None if the latency isn't measured.
+    """
+    def trigger(request: dict) -> dict:
+        name = request.get("name")
+        for action_mapping in get_device_mappings().values():
+            for action in action_mapping.values():
+                if action.name is not None and action.name == name:
+                    executor.submit(action)
+                    return {"action": str(action)}
+        raise ValueError(f"Unknown action '{name}'")
+
+    def list_mappings(request: dict) -> List[dict]:
+        return [dict(_describe_trigger(trigger), Device = device_path, Action = str(action), 
+                     Name = action.name, Policy = action.policy.value)
+                for device_path, action_mapping in get_device_mappings().items() 
+                for trigger, action in action_mapping.items()]
+
+    def status(request: dict) -> List[dict]:
+        return [{"action": str(status.action), "name": status.action.name, 
+                 "running": status.running is not None, 
+                 "started": status.running.started if status.running is not None else None, 
+                 "pending": status.pending}
+                for status in executor.in_flight()]
+
+    def stats(request: dict) -> dict:
+        if latency is None:
+            raise ValueError("The latency isn't measured (see run --metrics-file)")
+        return {"latency": [{"stage": key.stage, "label": key.label, "value": key.value, 
+                             "count": summary.count, "sum": summary.sum, "max": summary.max, 
+                             "percentiles": {f"p{percentile}": seconds for percentile, seconds in summary.percentiles.items()}}
+                            for key, summary in sorted(latency.stats.summary().items())], 
+                "dropped": latency.stats.dropped()}
+
+    return {"trigger": trigger, "list": list_mappings, "status": status, "stats": stats}
+
+def replay_trace(devices: List["TraceDevice"], records: List["TraceRecord"], 
+                 device_mappings: Dict[str, Dict[Trigger, Action]], 
+                 decoder: EventDecoder = EventDecoder.CTYPES, workers: int = 4, 
+                 sequence_timeout: float = DEFAULT_SEQUENCE_TIMEOUT, 
+                 conditioning: ConditioningConfig = ConditioningConfig(), 
+                 fast: bool = False, dry_run: bool = False) -> None:
+    """Replay recorded events (see record_events) through the handlers of the given mappings.
+
+    The events are decoded and handled by the same handlers which handle the events of 
+    the devices in run_macro_keypad (conditioning, sequences and dispatch). Timers are 
+    expired according to the timestamps of the trace rather than the clock, so a trace 
+    triggers the same actions whether it is replayed at its original timing or as fast 
+    as possible. Events of devices without a mapping are skipped.
+
+    Args:
+        devices:
+            The devices of the trace, see event_trace.read_trace.
+
+        records:
+            The recorded events.
+
+        device_mappings: 
+            Mapping of device path -> (mapping of trigger -> action).
+
+        decoder:
+            Representation of the events passed to the handlers.
+
+        workers:
+            Maximum number of actions to execute concurrently.
+
+        sequence_timeout:
+            Maximal time (in seconds) between the keys of a sequence.
+
+        conditioning:
+            Filtering of bursts of keystrokes, see run_macro_keypad.
+
+        fast:
+            True to replay the events as fast as possible, False to replay them at their 
+            original timing.
+
+        dry_run:
+            True to only count the triggered actions, without executing them.
+    """
+    dispatched = 0
+
+    def dispatch(action: Action) -> None:
+        nonlocal dispatched
+        dispatched += 1
+        if not dry_run:
+            executor.submit(action)
+
+    def expire_timers(now: float) -> Optional[float]:
+        deadlines = [deadline for deadline in (timer.expire(now) for timer in compiled.timers) 
+                     if deadline is not None]
+        return min(deadlines, default = None)
+
+    def wait_until(timestamp: float) -> None:
+        if not fast:
+            delay = timestamp + offset - time.time()
+            if delay > 0:
+                time.sleep(delay)
+
+    with ActionExecutor(workers) as executor:
+        compiled = _compile_config(Config(device_mappings, sequence_timeout, conditioning, {}), dispatch)
+        handlers = [compiled.handlers.get(device.path) for device in devices]
+        decode_event = event_decoder(decoder)
+
+        # Time of the clock at which the first event is replayed, relative to its timestamp
+        offset = time.time() - records[0].timestamp if records else 0
+        start = time.perf_counter()
+        deadline = None
+        for record in records:
+            while deadline is not None and deadline <= record.timestamp:
+                wait_until(deadline)
+                deadline = expire_timers(deadline)
+            wait_until(record.timestamp)
+
+            handler = handlers[record.device]
+            if handler is not None:
+                handler(decode_event(record.data))
+                if compiled.timers:
+                    deadline = expire_timers(record.timestamp)
+
+        while deadline is not None:
+            wait_until(deadline)
+            deadline = expire_timers(deadline)
+        elapsed = time.perf_counter() - start
+
+    print(f"Replayed {len(records)} events in {elapsed:.3f} seconds "
+          f"({len(records) / max(elapsed, 1e-9):.0f} events per second), triggering {dispatched} actions")
+
+class DeviceLoop():
+    """Attaches to devices and calls the matching handler for every device event.
+
+    All devices are handled from a single thread, by waiting on all of them at once
+    (using epoll where available), together with any additional sources (see add_source).
+    """
+
+    def __init__(self, handlers: Dict[str, Callable[[Event], None]], grab_device: bool, 
+                 batch_size: int = 1, decoder: EventDecoder = EventDecoder.CTYPES, 
+                 event_masks: Optional[Dict[str, Dict[int, Set[int]]]] = None, 
+                 on_timer: Optional[Callable[[], Optional[float]]] = None, 
+                 hotplug: bool = False, on_dropped: Optional[Callable[[str], None]] = None, 
+                 frames: bool = False, raw: bool = False):
+        """Initialize the loop, see run() for the arguments.
+
+        Additionally, raw is True to transfer the events exactly as read from the devices, 
+        without handling dropped events (see InputDevice.read_raw_events).
+        """
+        if not handlers:
+            raise ValueError("No devices to attach to")
+
+        self._handlers = dict(handlers)
+        self._grab_device = grab_device
+        self._batch_size = batch_size
+        self._decoder = decoder
+        self._event_masks = dict(event_masks or {})
+        self._on_timer = on_timer
+        self._hotplug = hotplug
+        self._on_dropped = on_dropped
+        if raw:
+            self._read = InputDevice.read_raw_events
+        else:
+            self._read = InputDevice.read_frames if frames else InputDevice.read_events
+
+        self._selector: Optional[selectors.BaseSelector] = None
+        self._sources: Dict[Any, Callable[[], None]] = {}
+        self._devices: Dict[str, InputDevice] = {}
+        # Callbacks to call once the events which are ready have been handled, see call_soon
+        self._deferred: List[Callable[[], None]] = []
+
+        # Device path -> time of disconnection (as in time.monotonic())
+        self._disconnected: Dict[str, float] = {}
+        self._watched_directories: Set[str] = set()
+        self._inotify: Optional[Inotify] = None
+
+    @property
+    def devices(self) -> Dict[str, InputDevice]:
+        """The devices currently attached to, by path."""
+        return dict(self._devices)
+
+    def add_source(self, fileobj: Any, callback: Callable[[], None]) -> None:
+        """Call the given callback (from the loop thread) whenever the given file object is readable.
+
+        Args:
+            fileobj:
+                A file object, or any object with a fileno() method.
+
+            callback:
+                Callback to call once the file object is readable.
+        """
+        self._sources[fileobj] = callback
+        if self._selector is not None:
+            self._selector.register(fileobj, selectors.EVENT_READ, callback)
+
+    def remove_source(self, fileobj: Any) -> None:
+        """Stop watching a file object added by add_source (e.g. before closing it)."""
+        del self._sources[fileobj]
+        if self._selector is not None:
+            self._selector.unregister(fileobj)
+
+    def call_soon(self, callback: Callable[[], None]) -> None:
+        """Call the given callback (from the loop thread) once the events which are ready have been handled.
+
+        Must be called from the loop thread. Used for changes to the devices (e.g. set_handlers), which 
+        must not be made while there are pending events of the devices which might be closed.
+        """
+        self._deferred.append(callback)
+
+    def set_handlers(self, handlers: Dict[str, Callable[[Event], None]], 
+                     event_masks: Optional[Dict[str, Dict[int, Set[int]]]] = None) -> None:
+        """Replace the handlers of the devices.
+
+        Must be called from the loop thread, outside of a source callback (e.g. by call_soon), 
+        so that the handlers are replaced between events. Devices which no longer have a handler 
+        are closed, and new devices are attached to if permitted.
+
+        Args:
+            handlers:
+                Mapping of device path -> callback to call for every event (or frame) from the device.
+
+            event_masks:
+                Mapping of device path -> (mapping of event type -> codes), see run().
+        """
+        if not handlers:
+            raise ValueError("No devices to attach to")
+
+        self._handlers = dict(handlers)
+        self._event_masks = dict(event_masks or {})
+        if self._selector is None:
+            return
+
+        for device_path, device in list(self._devices.items()):
+            if device_path not in self._handlers:
+                print(f"Detaching from device '{device.name}'")
+                self._selector.unregister(device)
+                del self._devices[device_path]
+                device.close()
+            else:
+                self._apply_event_mask(device)
+                self._selector.modify(device, selectors.EVENT_READ, self._handlers[device_path])
+
+        for device_path in list(self._disconnected):
+            if device_path not in self._handlers:
+                del self._disconnected[device_path]
+
+        for device_path in self._handlers:
+            if device_path not in self._devices and device_path not in self._disconnected:
+                self._disconnected[device_path] = time.monotonic()
+                self._watch_directory(device_path)
+                self._reattach(device_path)
+                if device_path in self._disconnected and not self._hotplug:
+                    print(f"Can't attach to device '{device_path}'")
+                    del self._disconnected[device_path]
+
+    def run(self, on_connected: Optional[Callable[[], None]] = None) -> None:
+        """Attach to the devices and handle their events, until all devices are disconnected.
+
+        Args:
+            on_connected:
+                Callback to call once connected to the devices, after dropping privileges.
+        """
+        try:
+            with contextlib.ExitStack() as stack, selectors.DefaultSelector() as selector:
+                self._connect(stack, selector, on_connected)
+
+                deadline = None
+                read = self._read
+                while self._devices or self._disconnected:
+                    timeout = None if deadline is None else max(deadline - time.time(), 0)
+                    for key, _ in selector.select(timeout):
+                        if not isinstance(key.fileobj, InputDevice):
+                            key.data()
+                            continue
+                        try:
+                            connected = read(key.fileobj, key.data)
+                        except OSError:
+                            # ENODEV once the device is unplugged
+                            connected = False
+                        if not connected:
+                            self._detach(key.fileobj)
+                    if self._deferred:
+                        self._call_deferred()
+                    if self._on_timer is not None:
+                        deadline = self._on_timer()
+        except PermissionError as e:
+            raise PermissionError("Permission denied, are you running as root?") from e
+        finally:
+            self._selector = None
+
+    async def run_async(self, on_connected: Optional[Callable[[], None]] = None) -> None:
+        """Same as run, handling the events from the running asyncio event loop.
+
+        The devices and the additional sources are registered with the event loop (using add_reader), 
+        and the timer is scheduled on it, so that the event loop handles the devices together with 
+        its own tasks (e.g. actions run by an AsyncActionExecutor), from a single thread.
+
+        Args:
+            on_connected:
+                Callback to call once connected to the devices, after dropping privileges.
+        """
+        import asyncio
+
+        loop = asyncio.get_running_loop()
+        done = loop.create_future()
+        timer: Optional[asyncio.TimerHandle] = None
+        timer_deadline = None
+
+        def schedule_timer():
+            nonlocal timer, timer_deadline
+            deadline = self._on_timer()
+            if deadline == timer_deadline:
+                return
+            if timer is not None:
+                timer.cancel()
+            timer_deadline = deadline
+            timer = None if deadline is None else loop.call_later(max(deadline - time.time(), 0), on_timer)
+
+        def on_timer():
+            nonlocal timer, timer_deadline
+            timer = timer_deadline = None
+            handle_ready(None)
+
+        def handle_ready(key: Optional[selectors.SelectorKey]):
+            try:
+                if key is None:
+                    pass
+                elif not isinstance(key.fileobj, InputDevice):
+                    key.data()
+                else:
+                    try:
+                        connected = self._read(key.fileobj, key.data)
+                    except OSError:
+                        # ENODEV once the device is unplugged
+                        connected = False
+                    if not connected:
+                        self._detach(key.fileobj)
+                if self._deferred:
+                    self._call_deferred()
+                if self._on_timer is not None:
+                    schedule_timer()
+                if not (self._devices or self._disconnected) and not done.done():
+                    done.set_result(None)
+            except BaseException as e:
+                # Raised from run_async, rather than reported by the event loop
+                if not done.done():
+                    done.set_exception(e)
+
+        try:
+            with contextlib.ExitStack() as stack:
+                selector = _LoopSelector(loop, handle_ready)
+                # Registered first, so that the readers are removed only once the devices are closed
+                stack.callback(selector.close)
+                self._connect(stack, selector, on_connected)
+                handle_ready(None)
+                try:
+                    await done
+                finally:
+                    if timer is not None:
+                        timer.cancel()
+        except PermissionError as e:
+            raise PermissionError("Permission denied, are you running as root?") from e
+        finally:
+            self._selector = None
+
+    def _connect(self, stack: contextlib.ExitStack, selector: selectors.BaseSelector, 
+                 on_connected: Optional[Callable[[], None]]) -> None:
+        """Open the devices and the additional sources, and register them with the given selector."""
+        stack.callback(self._close_devices)
+        for device_path in self._handlers:
+            try:
+                self._devices[device_path] = InputDevice(device_path, self._batch_size, self._decoder, self._handle_dropped).open()
+            except FileNotFoundError:
+                if not self._hotplug:
+                    raise
+                print(f"Device '{device_path}' not found, waiting for it to be connected")
+                self._disconnected[device_path] = time.monotonic()
+
+        if self._hotplug:
+            self._inotify = stack.enter_context(Inotify())
+            self._sources[self._inotify] = self._handle_directory_events
+            for device_path in self._handlers:
+                self._watch_directory(device_path)
+
+        for fileobj, callback in self._sources.items():
+            selector.register(fileobj, selectors.EVENT_READ, callback)
+        self._selector = selector
+
+        # Opening the devices must be done as root, drop privileges after
+        drop_privileges(keep_groups = ["input"] if self._hotplug else [])
+        assert(os.getresuid() != (0, 0, 0))
+
+        for device in self._devices.values():
+            print(f"Connected to device '{device.name}'")
+            self._attach(device)
+
+        if on_connected is not None:
+            on_connected()
+
+    def _call_deferred(self) -> None:
+        deferred, self._deferred = self._deferred, []
+        for callback in deferred:
+            callback()
+
+    def _apply_event_mask(self, device: InputDevice) -> None:
+        for event_type, codes in self._event_masks.get(device.path, {}).items():
+            try:
+                device.set_event_mask(event_type, codes)
+            except OSError as e:
+                print(f"Can't filter events of device '{device.name}', all events will be handled ({str(e)})")
+                break
+
+    def _attach(self, device: InputDevice) -> None:
+        if self._grab_device:
+            device.grab(True)
+        self._apply_event_mask(device)
+        self._selector.register(device, selectors.EVENT_READ, self._handlers[device.path])
+
+    def _detach(self, device: InputDevice) -> None:
+        print(f"Device '{device.name}' disconnected")
+        self._selector.unregister(device)
+        del self._devices[device.path]
+        device.close()
+        if self._hotplug:
+            self._disconnected[device.path] = time.monotonic()
+
+    def _reattach(self, device_path: str) -> None:
+        start = time.monotonic()
+        try:
+            device = InputDevice(device_path, self._batch_size, self._decoder, self._handle_dropped).open()
+        except OSError:
+            # Not ready yet (e.g. permissions not set yet by udev), retried on the next change
+            return
+        try:
+            self._attach(device)
+        except OSError:
+            device.close()
+            return
+        self._devices[device_path] = device
+        latency = time.monotonic() - start
+        downtime = start - self._disconnected.pop(device_path)
+        print(f"Reconnected to device '{device.name}' in {latency * 1000:.1f} ms "
+              f"(disconnected for {downtime:.1f} seconds)")
+
+    def _watch_directory(self, device_path: str) -> None:
+        if not self._hotplug:
+            return
+        directory = os.path.dirname(os.path.abspath(device_path))
+        if directory in self._watched_directories:
+            return
+        self._watched_directories.add(directory)
+        # Empty directories such as /dev/input/by-id are removed by udev, so the parent is watched 
+        #  first, and the directory is watched once created (see _handle_directory_events)
+        self._inotify.add_watch(os.path.dirname(directory), DEVICE_DIRECTORY_MASK)
+        try:
+            self._inotify.add_watch(directory, DEVICE_DIRECTORY_MASK)
+        except FileNotFoundError:
+            pass
+
+    def _handle_directory_events(self) -> None:
+        for event in self._inotify.read_events():
+            path = os.path.join(event.path, event.name)
+            if path in self._watched_directories and event.mask & (InotifyMask.IN_CREATE | InotifyMask.IN_MOVED_TO):
+                # The directory of the devices was recreated, the devices might already be in it
+                self._inotify.add_watch(path, DEVICE_DIRECTORY_MASK)
+                for device_path in list(self._disconnected):
+                    if os.path.dirname(device_path) == path:
+                        self._reattach(device_path)
+            elif path in self._disconnected:
+                self._reattach(path)
+
+    def _handle_dropped(self, device: InputDevice) -> None:
+        print(f"Events of device '{device.name}' were dropped by the kernel, resynchronized the state of the keys")
+        if self._on_dropped is not None:
+            self._on_dropped(device.path)
+
+    def _close_devices(self) -> None:
+        for device in self._devices.values():
+            device.close()
+        self._devices.clear()
+
+class _LoopSelector():
+    """The part of the selectors API used by DeviceLoop, on top of an asyncio event loop (see DeviceLoop.run_async).
+
+    The given callback is called with the SelectorKey of every file object which is readable.
+    """
+
+    def __init__(self, loop: "asyncio.AbstractEventLoop", on_ready: Callable[[selectors.SelectorKey], None]):
+        self._loop = loop
+        self._on_ready = on_ready
+        self._keys: Dict[Any, selectors.SelectorKey] = {}
+
+    def register(self, fileobj: Any, events: int, data: Any = None) -> selectors.SelectorKey:
+        key = selectors.SelectorKey(fileobj, fileobj if isinstance(fileobj, int) else fileobj.fileno(), events, data)
+        self._keys[fileobj] = key
+        self._loop.add_reader(key.fd, self._handle_ready, fileobj)
+        return key
+
+    def modify(self, fileobj: Any, events: int, data: Any = None) -> selectors.SelectorKey:
+        key = self._keys[fileobj] = self._keys[fileobj]._replace(events = events, data = data)
+        return key
+
+    def unregister(self, fileobj: Any) -> selectors.SelectorKey:
+        key = self._keys.pop(fileobj)
+        self._loop.remove_reader(key.fd)
+        return key
+
+    def close(self) -> None:
+        for key in self._keys.values():
+            self._loop.remove_reader(key.fd)
+        self._keys.clear()
+
+    def _handle_ready(self, fileobj: Any) -> None:
+        key = self._keys.get(fileobj)
+        if key is not None:
+            self._on_ready(key)
+
+def run(handlers: Dict[str, Callable[[Event], None]], grab_device: bool, 
+        batch_size: int = 1, decoder: EventDecoder = EventDecoder.CTYPES, 
+        on_connected: Optional[Callable[[], None]] = None, 
+        event_masks: Optional[Dict[str, Dict[int, Set[int]]]] = None, 
+        on_timer: Optional[Callable[[], Optional[float]]] = None, 
+        hotplug: bool = False, on_dropped: Optional[Callable[[str], None]] = None, 
+        frames: bool = False) -> None:
+    """Attach to the given devices and call the matching handler for every device event.
+
+    All devices are handled from a single thread, by waiting on all of them at once
+    (using epoll where available).
+
+    Args:
+        handlers:
+            Mapping of device path -> callback to call for every event from the device 
+            (or for every frame, see frames).
+
+        grab_device:
+            True if keystrokes from the devices should be blocked from arriving to other programs.
+
+        batch_size:
+            Maximum number of events to read from a device at once.
+
+        decoder:
+            Representation of the events passed to the handlers.
+
+        on_connected:
+            Callback to call once connected to the devices, after dropping privileges.
+
+        event_masks:
+            Mapping of device path -> (mapping of event type -> codes) of the events which 
+            the handler is interested in. Other events are filtered by the kernel where 
+            supported (see InputDevice.set_event_mask).
+
+        on_timer:
+            Callback to call after handling the available events, returning the time 
+            (as in time.time()) at which it should be called again even if no events 
+            arrive, or None to wait for events only.
+
+        hotplug:
+            True to keep running when devices are disconnected, and reattach to them 
+            once they are connected again. The directories of the devices are watched 
+            with inotify, and the "input" group is kept when dropping privileges in 
+            order to be able to reopen the devices.
+
+        on_dropped:
+            Callback to call with the path of a device whenever the kernel dropped 
+            some of its events since they weren't read fast enough (see InputDevice).
+
+        frames:
+            True to call the handlers once per frame, with the list of events reported 
+            together by the device, rather than once per event (see InputDevice.loop_frames).
+    """
+    DeviceLoop(handlers, grab_device, batch_size, decoder, event_masks, on_timer, hotplug, 
+               on_dropped, frames).run(on_connected)
+
+async def run_async(handlers: Dict[str, Callable[[Event], None]], grab_device: bool, 
+                    batch_size: int = 1, decoder: EventDecoder = EventDecoder.CTYPES, 
+                    on_connected: Optional[Callable[[], None]] = None, 
+                    event_masks: Optional[Dict[str, Dict[int, Set[int]]]] = None, 
+                    on_timer: Optional[Callable[[], Optional[float]]] = None, 
+                    hotplug: bool = False, on_dropped: Optional[Callable[[str], None]] = None, 
+                    frames: bool = False) -> None:
+    """Same as run, handling the events from the running asyncio event loop (see DeviceLoop.run_async).
+
+    The handlers and callbacks are called from the event loop, hence they may start tasks 
+    of the event loop, e.g. for actions which need to wait for I/O.
+    """
+    await DeviceLoop(handlers, grab_device, batch_size, decoder, event_masks, on_timer, hotplug, 
+                     on_dropped, frames).run_async(on_connected)
+
+
+
+if __name__ == "__main__":
+    # Only needed when running as a program, kept off the import path
+    import argparse
+    import enum
+    import sys
+
+    from startup_profile import profile_startup, startup_complete
+
+    class Commands(enum.Enum):
+        """Commands for argument parsing."""
+        LIST    = "list"
+        RUN     = "run"
+        STATS   = "stats"
+        RECORD  = "record"
+        REPLAY  = "replay"
+        CONTROL = "control"
+
+    parser = argparse.ArgumentParser(description = 'A program to utilize a dedicated keyboard as a macro keyboard')
+    parser.add_argument('--profile-startup', action = 'store_true', 
+                        help = "Print how long the startup takes, by the time spent importing each module")
+
+    subparsers = parser.add_subparsers(dest = 'command', required = True, title = 'subcommands',
+                                       description = 'Valid subcommands')
+    # A "list" command
+    list_parser = subparsers.add_parser(Commands.LIST.value, help = 'List the devices under /dev/input/by-id/')
+
+    # A "run" command
+    run_parser = subparsers.add_parser(Commands.RUN.value, help = 'Attach to keyboard devices and handle keystrokes')
+    run_parser.add_argument('-d', '--device', action = 'append', default = [], dest = 'devices',
+                            help = "The device path to connect to (can be repeated). "
+                                   "Optional with -m if the configuration file lists devices")
+    run_action = run_parser.add_mutually_exclusive_group(required = True)
+    run_action.add_argument('-p', '--print-keystrokes', action = 'store_true', help = "Interactively print the user keystrokes")
+    run_action.add_argument('-m', '--macro', action = 'store', type = str, metavar = ('CONFIG_FILE'), 
+                            help = "Execute macros with the given configuration file")
+    run_parser.add_argument('-b', '--batch-size', action = 'store', type = int, default = 1, 
+                            help = "Maximum number of events to read from the device at once (default: %(default)s)")
+    run_parser.add_argument('--decoder', action = 'store', choices = [d.value for d in EventDecoder], 
+                            default = EventDecoder.CTYPES.value, help = "Event decoder to use (default: %(default)s)")
+    run_parser.add_argument('-w', '--workers', action = 'store', type = int, default = 4, 
+                            help = "Maximum number of actions to execute concurrently (default: %(default)s)")
+    run_parser.add_argument('-c', '--config-cache', action = 'store', type = str, metavar = ('CACHE_FILE'), 
+                            help = "Cache the parsed configuration file in the given file, for faster startup")
+    run_parser.add_argument('--hotplug', action = 'store_true', 
+                            help = "Keep running when a device is disconnected, and reattach to it once reconnected")
+    run_parser.add_argument('--frames', action = 'store_true', 
+                            help = "Handle the events reported together by a device (up to its SYN_REPORT) at once")
+    run_parser.add_argument('--asyncio', action = 'store_true', dest = 'use_asyncio', 
+                            help = "Handle the devices and execute the actions from a single asyncio event loop, "
+                                   "instead of worker threads")
+    run_parser.add_argument('--metrics-file', action = 'store', type = str, metavar = ('METRICS_FILE'), 
+                            help = "Measure the latency of handling keystrokes, and periodically write it "
+                                   "to the given file in the Prometheus text format")
+    run_parser.add_argument('--metrics-interval', action = 'store', type = float, default = 10.0, 
+                            help = "Time (in seconds) between writes of the metrics file (default: %(default)s)")
+    run_parser.add_argument('--control-socket', action = 'store', type = str, metavar = ('SOCKET_PATH'), 
+                            help = "Serve requests for triggering actions and querying the state on a Unix "
+                                   "domain socket at the given path (see the control command)")
+    run_parser.add_argument('--control-socket-mode', action = 'store', type = lambda mode: int(mode, 8), default = 0o600, 
+                            help = "Permissions of the control socket, in octal (default: 600, i.e. root only)")
+
+    # A "record" command
+    record_parser = subparsers.add_parser(Commands.RECORD.value, help = 'Record the events of keyboard devices to a trace file')
+    record_parser.add_argument('-d', '--device', action = 'append', required = True, dest = 'devices',
+                               help = "The device path to record (can be repeated)")
+    record_parser.add_argument('-o', '--output', action = 'store', type = str, required = True, metavar = ('TRACE_FILE'), 
+                               help = "Trace file to write")
+    record_parser.add_argument('-b', '--batch-size', action = 'store', type = int, default = 1, 
+                               help = "Maximum number of events to read from the device at once (default: %(default)s)")
+
+    # A "replay" command
+    replay_parser = subparsers.add_parser(Commands.REPLAY.value, 
+                                          help = 'Replay a trace file, executing the macros triggered by its events')
+    replay_parser.add_argument('trace_file', metavar = 'TRACE_FILE', help = "Trace file written by the record command")
+    replay_parser.add_argument('-m', '--macro', action = 'store', type = str, required = True, metavar = ('CONFIG_FILE'), 
+                               help = "Configuration file with the macros, applied to the recorded devices")
+    replay_parser.add_argument('-f', '--fast', action = 'store_true', 
+                               help = "Replay the events as fast as possible, instead of at their original timing")
+    replay_parser.add_argument('-n', '--dry-run', action = 'store_true', 
+                               help = "Only count the actions triggered, without executing them")
+    replay_parser.add_argument('--decoder', action = 'store', choices = [d.value for d in EventDecoder], 
+                               default = EventDecoder.CTYPES.value, help = "Event decoder to use (default: %(default)s)")
+    replay_parser.add_argument('-w', '--workers', action = 'store', type = int, default = 4, 
+                               help = "Maximum number of actions to execute concurrently (default: %(default)s)")
+
+    # A "control" command
+    control_parser = subparsers.add_parser(Commands.CONTROL.value, 
+                                           help = 'Send a request to the control socket of a running instance')
+    control_parser.add_argument('-s', '--socket', action = 'store', type = str, required = True, metavar = ('SOCKET_PATH'), 
+                                help = "Path of the control socket (see run --control-socket)")
+    control_parser.add_argument('request', choices = ["trigger", "list", "status", "stats"], 
+                                help = "trigger: execute the action with the given name, list: list the mappings, "
+                                       "status: list the running actions, stats: report the latency statistics")
+    control_parser.add_argument('name', nargs = '?', help = "Name of the action to trigger")
+
+    # A "stats" command
+    stats_parser = subparsers.add_parser(Commands.STATS.value, 
+                                         help = 'Print the latency percentiles from a metrics file, per key and per action')
+    stats_parser.add_argument('metrics_file', metavar = 'METRICS_FILE', help = "Metrics file written by run --metrics-file")
+
+    args = parser.parse_args()
+    if args.profile_startup:
+        sys.exit(profile_startup(sys.argv))
+
+    try:
+        if args.command == Commands.LIST.value:
+            startup_complete()
+            list_devices()
+        elif args.command == Commands.RUN.value:
+            if args.print_keystrokes:
+                startup_complete()
+                print_keystrokes(args.devices, args.batch_size, EventDecoder(args.decoder), args.hotplug, args.frames)
+            elif args.macro:
+                config = load_config(args.macro, args.devices, cache_file = args.config_cache)
+                startup_complete()
+                with contextlib.ExitStack() as stack:
+                    reloader = stack.enter_context(ConfigReloader(args.macro, args.devices, config))
+                    latency = None
+                    if args.metrics_file is not None:
+                        from latency import LatencyTracker, MetricsWriter
+                        latency = LatencyTracker()
+                        stack.enter_context(MetricsWriter(latency.stats, args.metrics_file, args.metrics_interval))
+                    control = None
+                    if args.control_socket is not None:
+                        from control import ControlServer
+                        control = stack.enter_context(ControlServer(args.control_socket, args.control_socket_mode))
+                    run_macro_keypad(config.device_mappings, args.batch_size, EventDecoder(args.decoder), 
+                                     args.workers, config.sequence_timeout, config.conditioning, args.hotplug, 
+                                     reloader, latency, args.frames, args.use_asyncio, control)
+        elif args.command == Commands.RECORD.value:
+            startup_complete()
+            record_events(args.devices, args.output, args.batch_size)
+        elif args.command == Commands.REPLAY.value:
+            from event_trace import read_trace
+            devices, records = read_trace(args.trace_file)
+            config = load_config(args.macro, [device.path for device in devices])
+            startup_complete()
+            for index, device in enumerate(devices):
+                print(f"Replaying {sum(record.device == index for record in records)} events of device "
+                      f"'{device.name}' ({device.path}){'' if device.path in config.device_mappings else ', not mapped'}")
+            replay_trace(devices, records, config.device_mappings, EventDecoder(args.decoder), args.workers, 
+                         config.sequence_timeout, config.conditioning, args.fast, args.dry_run)
+        elif args.command == Commands.STATS.value:
+            from latency import print_summary, read_metrics
+            print_summary(read_metrics(args.metrics_file))
+        elif args.command == Commands.CONTROL.value:
+            import json
+            from control import send_request
+            if args.request == "trigger" and args.name is None:
+                raise ValueError("The name of the action to trigger is required")
+            request = {"command": args.request}
+            if args.name is not None:
+                request["name"] = args.name
+            print(json.dumps(send_request(args.socket, request), indent = 4))
+    except Exception as e:
+        print(f"Error: {str(e)}")
+    except KeyboardInterrupt:
+        print ("\nQuitting...")
+
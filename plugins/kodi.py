@@ -1,231 +1,1173 @@
-"""Basic Python wrapper for communicating with Kodi over JSON RPC.
-
-This program can play streams on a remote Kodi setup.
-Kodi needs to be configured to accept JSON-RPC payload as detailed in the
-official Wiki:
-https://kodi.wiki/view/JSON-RPC_API
-
-This program requires the youtube_dl package:
-https://youtube-dl.org/
-
-Example Usage
--------------
-
-Play YouTube Video:
-python3 kodi.py -k 192.168.1.50:8080 play -y "https://www.youtube.com/watch?v=dQw4w9WgXcQ"
-
-Play Stream:
-python3 kodi.py -k 192.168.1.50:8080 play -s "http://glzwizzlv.bynetcdn.com/glglz_rock_mp3?awCollectionId=misc&awEpisodeId=glglz_rock"
-
-Play Song by ID:
-python3 kodi.py -k 192.168.1.50:8080 play -g 101
-
-Stop Playback:
-python3 kodi.py -k 192.168.1.50:8080 stop
-
-Sources:
-    https://github.com/Dvd848/macro_keyboard
-
-License:
-    LGPL v2.1
-
-    This library is free software; you can redistribute it and/or
-    modify it under the terms of the GNU Lesser General Public
-    License as published by the Free Software Foundation; either
-    version 2.1 of the License, or (at your option) any later version.
-
-    This library is distributed in the hope that it will be useful,
-    but WITHOUT ANY WARRANTY; without even the implied warranty of
-    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
-    Lesser General Public License for more details.
-
-    You should have received a copy of the GNU Lesser General Public
-    License along with this library; if not, write to the Free Software
-    Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301  USA
-
-"""
-
-import argparse
-import enum
-import requests
-import time
-
-from collections import namedtuple
-from pprint import pprint
-
-class KodiPlayer():
-    """Wrapper for communicating with Kodi over JSON-RPC."""
-
-    Album = namedtuple("Album", "id label")
-    Song = namedtuple("Song", "id label")
-
-    def __init__(self, host: str):
-        """Initialize class.
-
-        Args:
-            host:
-                Hostname/IP and port in the format 'host:port'.
-        """
-        self.host = host
-
-    def play_youtube(self, url: str) -> None:
-        """Play a YouTube stream.
-
-        Args:
-            url:
-                URL of the public video page. Actual stream URL is fetched automatically.
-        """
-        from youtube_dl import YoutubeDL
-        with YoutubeDL({'format': 'bestaudio'}) as ydl:
-            info_dict = ydl.extract_info(url, download=False)
-            try:
-                video_url = info_dict['formats'][0]['url']
-                return self.play_stream(video_url)
-            except IndexError:
-                raise RuntimeError(f"Can't find stream URL for youtube video {url}")
-
-    def play_stream(self, url: str) -> None:
-        """Play a stream.
-
-        Args:
-            url:
-                URL of the stream.
-        """
-        json_req = {"method": "Player.Open", "id": int(time.time()) , "jsonrpc": "2.0", "params": {"item": {"file": url}}}
-        return self._send_request(json_req)
-
-    def play_song(self, songid: int) -> None:
-        """Play a song.
-
-        Args:
-            songid:
-                The song's ID.
-        """
-        json_req = {"method": "Player.Open", "id": int(time.time()) , "jsonrpc": "2.0", "params": {"item": {"songid": songid}}}
-        return self._send_request(json_req)
-
-    def get_active_players(self):
-        """Returns a list of active player IDs."""
-        json_req = {"jsonrpc": "2.0", "method": "Player.GetActivePlayers", "id": int(time.time())}
-        response = self._send_request(json_req)
-        return [result["playerid"] for result in response["result"]]
-
-    def stop(self) -> None:
-        """Stop the current active players."""
-        active_players = self.get_active_players()
-        result = []
-        for id in active_players:
-            json_req = {"method": "Player.Stop", "id": int(time.time()) , "jsonrpc": "2.0", "params": { "playerid": id }}
-            result.append(self._send_request(json_req))
-        return result[0] if len(result) == 1 else result
-
-    def _send_request(self, json_req):
-        """Send a JSON request to the remote Kodi.
-
-        Args:
-            json_req: JSON request to send.
-        
-        Returns:
-            The JSON response if the response code was OK (raises exception otherwise).
-        """
-        print(json_req)
-        r = requests.post(f"http://{self.host}/jsonrpc", json=json_req)
-        if (r.status_code != 200):
-            raise RuntimeError(f"Got status code {r.status_code}")
-        return r.json()
-
-    def get_albums(self):
-        """Return a list of albums."""
-        json_req = {"jsonrpc": "2.0", "method": "AudioLibrary.GetAlbums", "id": int(time.time())}
-        response = self._send_request(json_req)
-        result = []
-        albums = response["result"]["albums"]
-        for album in albums:
-            result.append(self.Album(id = album["albumid"], label = album["label"]))
-        return result
-
-    def get_songs(self):
-        """Return a list of songs."""
-        json_req = {"jsonrpc": "2.0", "method": "AudioLibrary.GetSongs", "id": int(time.time())}
-        response = self._send_request(json_req)
-        result = []
-        songs = response["result"]["songs"]
-        for song in songs:
-            result.append(self.Song(id = song["songid"], label = song["label"]))
-        return result
-    
-    def get_audio_output(self):
-        """Return audio output device."""
-        json_req = {"jsonrpc": "2.0", "method": "Settings.GetSettingValue", "id": int(time.time()), 
-                    "params": {"setting": "audiooutput.audiodevice"}}
-        response = self._send_request(json_req)
-        return response["result"]["value"]
-    
-    def set_audio_output(self, device):
-        """Set audio output device."""
-        json_req = {"jsonrpc": "2.0", "method": "Settings.SetSettingValue", "id": int(time.time()), 
-                    "params": {"setting": "audiooutput.audiodevice", "value": device}}
-        response = self._send_request(json_req)
-        return response["result"]
-        
-
-if __name__ == "__main__":
-    class Commands(enum.Enum):
-        """Commands for argument parsing."""
-        PLAY    = "play"
-        STOP    = "stop"
-        LIST    = "list"
-        AUDIO   = "audio"
-
-    parser = argparse.ArgumentParser(description = 'Wrapper for controlling Kodi from remote')
-    parser.add_argument("-k", "--kodi-host", required = True, help="Kodi URL in form of host:port")
-
-    subparsers = parser.add_subparsers(dest = 'command', required = True, title = 'subcommands',
-                                       description = 'Valid subcommands')
-
-    play_parser = subparsers.add_parser(Commands.PLAY.value, help = 'Play media')
-    play_command = play_parser.add_mutually_exclusive_group(required = True)
-    play_command.add_argument('-s', '--stream', action = 'store', type = str, help = "Play stream")
-    play_command.add_argument('-y', '--youtube', action = 'store', type = str, help = "Play YouTube video")
-    play_command.add_argument('-g', '--song', action = 'store', type = int, metavar = "SONG_ID", help = "Play song with given song ID")
-
-    stop_parser = subparsers.add_parser(Commands.STOP.value, help = 'Stop')
-
-    list_parser = subparsers.add_parser(Commands.LIST.value, help = 'List details')
-    list_command = list_parser.add_mutually_exclusive_group(required = True)
-    list_command.add_argument('--albums', action = 'store_true', help = "List albums")
-    list_command.add_argument('--songs', action = 'store_true', help = "List songs")
-
-    audio_parser = subparsers.add_parser(Commands.AUDIO.value, help = 'Audio Settings')
-    audio_command = audio_parser.add_mutually_exclusive_group(required = True)
-    audio_command.add_argument('--get-output', action = 'store_true', help = "Get Audio Output Device")
-    audio_command.add_argument('--set-output', action = 'store', help = "Set Audio Output Device") # "ALSA:@" / "ALSA:sysdefault:CARD=Headphones"
-
-    args = parser.parse_args()
-
-    try:
-        player = KodiPlayer(args.kodi_host)
-        if args.command == Commands.PLAY.value:
-            if args.youtube:
-                print(player.play_youtube(args.youtube))
-            elif args.stream:
-                print(player.play_stream(args.stream))
-            elif args.song:
-                print(player.play_song(args.song))
-        elif args.command == Commands.STOP.value:
-            print(player.stop())
-        elif args.command == Commands.LIST.value:
-            if args.albums:
-                pprint(player.get_albums())
-            elif args.songs:
-                pprint(player.get_songs())
-        elif args.command == Commands.AUDIO.value:
-            if args.get_output:
-                print(player.get_audio_output())
-            elif args.set_output:
-                print(player.set_audio_output(args.set_output))
-
-    except Exception as e:
-        print(f"Error: {str(e)}")
-    except KeyboardInterrupt:
+"""Basic Python wrapper for communicating with Kodi over JSON RPC.
+
+This program can play streams on a remote Kodi setup.
+Kodi needs to be configured to accept JSON-RPC payload as detailed in the
+official Wiki:
+https://kodi.wiki/view/JSON-RPC_API
+
+This program requires the youtube_dl package:
+https://youtube-dl.org/
+
+Example Usage
+-------------
+
+Play YouTube Video:
+python3 kodi.py -k 192.168.1.50:8080 play -y "https://www.youtube.com/watch?v=dQw4w9WgXcQ"
+
+Play Stream:
+python3 kodi.py -k 192.168.1.50:8080 play -s "http://glzwizzlv.bynetcdn.com/glglz_rock_mp3?awCollectionId=misc&awEpisodeId=glglz_rock"
+
+Play Song by ID:
+python3 kodi.py -k 192.168.1.50:8080 play -g 101
+
+Play Stream on a specific audio output (single batch request):
+python3 kodi.py -k 192.168.1.50:8080 play -o "ALSA:@" -s "http://glzwizzlv.bynetcdn.com/glglz_rock_mp3?awCollectionId=misc&awEpisodeId=glglz_rock"
+
+Play Song by label, using a cached library index:
+python3 kodi.py -k 192.168.1.50:8080 -c kodi_library.json play -l "Bohemian Rhapsody"
+
+Find Songs in a cached library index:
+python3 kodi.py -k 192.168.1.50:8080 -c kodi_library.json list --songs -f "Bohemian"
+
+Play YouTube Video, caching the resolved stream URL for subsequent calls:
+python3 kodi.py -k 192.168.1.50:8080 --youtube-cache youtube.json play -y "https://www.youtube.com/watch?v=dQw4w9WgXcQ"
+
+Stop Playback:
+python3 kodi.py -k 192.168.1.50:8080 stop
+
+Stop Playback of all players with a single batch request:
+python3 kodi.py -k 192.168.1.50:8080 stop -b
+
+Pause / Resume Playback:
+python3 kodi.py -k 192.168.1.50:8080 toggle
+
+Profile the startup time (the imports done until the player is created):
+python3 kodi.py --profile-startup -k 192.168.1.50:8080 stop
+
+When used in-process (e.g. as a macro_keypad plugin), KodiPlayer can track the
+player state via Kodi's notifications (see KodiState), by passing
+notifications_port = 9090.
+
+The requests package (the slowest import by far) is only imported once the first
+request is sent, or in the background by prepare_action(), so that loading the
+plugin doesn't delay the startup of macro_keypad.
+
+Sources:
+    https://github.com/Dvd848/macro_keyboard
+
+License:
+    LGPL v2.1
+
+    This library is free software; you can redistribute it and/or
+    modify it under the terms of the GNU Lesser General Public
+    License as published by the Free Software Foundation; either
+    version 2.1 of the License, or (at your option) any later version.
+
+    This library is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+    Lesser General Public License for more details.
+
+    You should have received a copy of the GNU Lesser General Public
+    License along with this library; if not, write to the Free Software
+    Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301  USA
+
+"""
+
+import bisect
+import codecs
+import enum
+import json
+import os
+import socket
+import sys
+import threading
+import time
+
+
+from collections import namedtuple
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+class KodiBatch():
+    """A JSON-RPC 2.0 batch: several calls sent to Kodi in a single request.
+
+    Example usage:
+
+    >>> batch = player.batch()
+    >>> batch.add("Player.Stop", {"playerid": 0})
+    >>> batch.add("Player.Open", {"item": {"file": url}})
+    >>> stop_response, open_response = batch.send()
+    """
+
+    def __init__(self, player: "KodiPlayer"):
+        """Initialize an empty batch.
+
+        Args:
+            player:
+                The player to send the batch through.
+        """
+        self._player = player
+        self._requests = []
+
+    def __len__(self) -> int:
+        return len(self._requests)
+
+    def add(self, method: str, params: Optional[Dict[str, Any]] = None) -> None:
+        """Add a call to the batch.
+
+        Args:
+            method:
+                JSON-RPC method name, e.g. "Player.Stop".
+
+            params:
+                Parameters for the method, if any.
+        """
+        json_req = {"jsonrpc": "2.0", "method": method, "id": len(self._requests) + 1}
+        if params is not None:
+            json_req["params"] = params
+        self._requests.append(json_req)
+
+    def send(self) -> List[Dict[str, Any]]:
+        """Send all calls in a single request.
+
+        Returns:
+            The JSON responses, in the order in which the calls were added 
+            (each response may contain a "result" or an "error").
+        """
+        if not self._requests:
+            return []
+
+        responses = self._player._send_request(self._requests)
+        if not isinstance(responses, list):
+            # Kodi responds with a single error if the batch itself is invalid
+            raise RuntimeError(f"Batch request failed: {responses}")
+
+        responses_by_id = {response.get("id"): response for response in responses}
+        try:
+            return [responses_by_id[json_req["id"]] for json_req in self._requests]
+        except KeyError as e:
+            raise RuntimeError(f"Missing response for request {e}") from e
+
+class KodiState():
+    """Local model of Kodi's player state, kept up to date by Kodi's notifications.
+
+    Maintains a persistent connection to Kodi's raw JSON-RPC TCP interface (enabled
+    via "Allow remote control from applications on other systems", port 9090 by default),
+    over which Kodi pushes notifications such as Player.OnPlay and Player.OnStop.
+    This allows answering questions such as "which players are active" locally, 
+    without a round trip to Kodi.
+
+    The connection is handled by a background thread, which reconnects if needed.
+
+    Example usage:
+
+    >>> with KodiState("192.168.1.50") as state:
+    ...     if state.synced:
+    ...         print(state.active_players)
+    """
+
+    def __init__(self, host: str, port: int = 9090, reconnect_delay: float = 5.0):
+        """Initialize class.
+
+        Args:
+            host:
+                Hostname/IP of Kodi.
+
+            port:
+                Port of the JSON-RPC TCP interface.
+
+            reconnect_delay:
+                Delay (in seconds) before reconnecting after the connection was lost.
+        """
+        self.host = host
+        self.port = port
+        self.reconnect_delay = reconnect_delay
+        self._lock = threading.Lock()
+        self._players: Dict[int, Dict[str, Any]] = {}
+        self._synced = False
+        self._socket = None
+        self._closed = threading.Event()
+        self._next_id = 1
+        self._response_handlers: Dict[int, Callable[[Any], None]] = {}
+        self._listeners: List[Callable[[str, Dict[str, Any]], None]] = []
+        self._thread = threading.Thread(target = self._run, name = "kodi-state", daemon = True)
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def start(self) -> None:
+        """Connect to Kodi and start tracking its state in the background."""
+        self._thread.start()
+
+    def close(self) -> None:
+        """Disconnect from Kodi and stop tracking its state."""
+        self._closed.set()
+        sock = self._socket
+        if sock is not None:
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+        if self._thread.is_alive():
+            self._thread.join()
+
+    @property
+    def synced(self) -> bool:
+        """True if connected to Kodi and the local state reflects Kodi's state."""
+        return self._synced
+
+    @property
+    def active_players(self) -> Dict[int, Dict[str, Any]]:
+        """Active players as a dictionary of player ID -> {"type": ..., "speed": ...}.
+
+        A speed of 0 means that the player is paused.
+        """
+        with self._lock:
+            return {playerid: dict(player) for playerid, player in self._players.items()}
+
+    def add_listener(self, listener: Callable[[str, Dict[str, Any]], None]) -> None:
+        """Register a callback to be called (from the background thread) for every notification.
+
+        Args:
+            listener:
+                Callback accepting the notification method and its parameters.
+        """
+        self._listeners.append(listener)
+
+    def send(self, method: str, params: Optional[Dict[str, Any]] = None, 
+             handler: Optional[Callable[[Any], None]] = None) -> None:
+        """Send a request over the notification connection without waiting for the response.
+
+        Args:
+            method:
+                JSON-RPC method name.
+
+            params:
+                Parameters for the method, if any.
+
+            handler:
+                Callback to call (from the background thread) with the result.
+        """
+        with self._lock:
+            sock = self._socket
+            if sock is None:
+                raise ConnectionError("Not connected to Kodi")
+            json_req = {"jsonrpc": "2.0", "method": method, "id": self._next_id}
+            if params is not None:
+                json_req["params"] = params
+            if handler is not None:
+                self._response_handlers[self._next_id] = handler
+            self._next_id += 1
+        sock.sendall(json.dumps(json_req).encode("utf-8"))
+
+    def _run(self) -> None:
+        """Background thread: connect, process messages and reconnect upon failure."""
+        while not self._closed.is_set():
+            try:
+                with socket.create_connection((self.host, self.port)) as sock:
+                    with self._lock:
+                        self._socket = sock
+                    self.send("Player.GetActivePlayers", handler = self._on_active_players)
+                    self._receive(sock)
+            except OSError as e:
+                if not self._closed.is_set():
+                    print(f"Kodi notification connection failed: {str(e)}")
+            finally:
+                with self._lock:
+                    self._socket = None
+                    self._synced = False
+                    self._players.clear()
+                    self._response_handlers.clear()
+
+            self._closed.wait(self.reconnect_delay)
+
+    def _receive(self, sock: socket.socket) -> None:
+        """Process messages until the connection is closed.
+
+        Kodi sends JSON objects back to back, without any delimiter.
+        """
+        decoder = json.JSONDecoder()
+        # A character might be split between reads
+        utf8_decoder = codecs.getincrementaldecoder("utf-8")(errors = "replace")
+        buffer = ""
+        while True:
+            data = sock.recv(65536)
+            if not data:
+                return
+            buffer += utf8_decoder.decode(data)
+            while buffer:
+                try:
+                    message, end = decoder.raw_decode(buffer)
+                except ValueError:
+                    # Incomplete message
+                    break
+                buffer = buffer[end:].lstrip()
+                self._on_message(message)
+
+    def _on_message(self, message: Dict[str, Any]) -> None:
+        """Handle a response or a notification from Kodi."""
+        if "id" in message:
+            with self._lock:
+                handler = self._response_handlers.pop(message["id"], None)
+            if handler is not None and "result" in message:
+                try:
+                    handler(message["result"])
+                except Exception as e:
+                    print(f"Error handling response to request {message['id']}: {str(e)}")
+            return
+
+        method = message.get("method")
+        params = message.get("params", {})
+        data = params.get("data") or {}
+        player = data.get("player", {})
+
+        with self._lock:
+            if method in ("Player.OnPlay", "Player.OnResume", "Player.OnAVStart", 
+                          "Player.OnPause", "Player.OnSpeedChanged"):
+                if "playerid" in player and player["playerid"] >= 0:
+                    state = self._players.setdefault(player["playerid"], {"type": data.get("item", {}).get("type")})
+                    state["speed"] = player.get("speed", state.get("speed", 1))
+            elif method == "Player.OnStop":
+                # OnStop doesn't specify which player was stopped
+                self._players.clear()
+
+        if method == "Player.OnStop":
+            self.send("Player.GetActivePlayers", handler = self._on_active_players)
+
+        for listener in self._listeners:
+            try:
+                listener(method, params)
+            except Exception as e:
+                print(f"Error handling {method} notification: {str(e)}")
+
+    def _on_active_players(self, result: List[Dict[str, Any]]) -> None:
+        """Handle the response to Player.GetActivePlayers."""
+        with self._lock:
+            previous = self._players
+            self._players = {player["playerid"]: {"type": player.get("type"), 
+                                                  "speed": previous.get(player["playerid"], {}).get("speed", 1)} 
+                             for player in result}
+            self._synced = True
+
+class YoutubeStreamCache():
+    """Cache of resolved YouTube stream URLs, optionally persisted to a file.
+
+    Resolving the stream URL of a YouTube video (via youtube_dl) takes seconds.
+    The resolved stream URLs are valid for several hours, until the time given 
+    in their "expire" parameter, so they are cached until shortly before then.
+    """
+
+    # Time to keep a stream URL without an expiry parameter
+    DEFAULT_TTL = 60 * 60
+
+    # Stop using a stream URL this many seconds before it expires
+    EXPIRY_MARGIN = 5 * 60
+
+    def __init__(self, cache_file: Optional[str] = None):
+        """Initialize the cache, loading it from the cache file if it exists.
+
+        Args:
+            cache_file:
+                Path of the file to persist the cache in, or None for an in-memory cache.
+        """
+        self._cache_file = cache_file
+        self._lock = threading.Lock()
+        self._entries: Dict[str, Dict[str, Any]] = {}
+        # URL -> event set once the URL is no longer being resolved
+        self._resolving: Dict[str, threading.Event] = {}
+        # URLs waiting to be resolved by the prefetch thread, while it runs
+        self._prefetch_urls: List[str] = []
+        self._prefetching = False
+        if cache_file is not None and os.path.exists(cache_file):
+            try:
+                with open(cache_file) as f:
+                    entries = json.load(f)
+            except (OSError, ValueError) as e:
+                # E.g. truncated by a crash, the cache is rebuilt as streams are resolved
+                print(f"Ignoring YouTube stream cache {cache_file}: {str(e)}")
+            else:
+                if isinstance(entries, dict):
+                    self._entries = entries
+
+    def resolve(self, url: str) -> str:
+        """Return the stream URL of a YouTube video, resolving it if it isn't cached.
+
+        If the URL is already being resolved (e.g. prefetched), waits for it instead of resolving it again.
+
+        Args:
+            url:
+                URL of the public video page.
+
+        Returns:
+            URL of the stream.
+        """
+        while True:
+            with self._lock:
+                entry = self._entries.get(url)
+                if entry is not None and entry["expires"] > time.time():
+                    return entry["stream_url"]
+                resolving = self._resolving.get(url)
+                if resolving is None:
+                    resolving = self._resolving[url] = threading.Event()
+                    break
+            # Cached once resolved, or resolved here if that failed
+            resolving.wait()
+
+        try:
+            stream_url = self._extract_stream_url(url)
+            with self._lock:
+                self._entries[url] = {"stream_url": stream_url, "expires": self._get_expiry(stream_url)}
+                self._entries = {url: entry for url, entry in self._entries.items() if entry["expires"] > time.time()}
+                self._save()
+        finally:
+            with self._lock:
+                del self._resolving[url]
+            resolving.set()
+        return stream_url
+
+    def prefetch(self, urls: List[str]) -> None:
+        """Resolve the given URLs in the background, so that they are cached when needed.
+
+        The URLs are resolved one at a time, by a single thread (for all calls).
+
+        Args:
+            urls:
+                URLs of public video pages.
+        """
+        with self._lock:
+            self._prefetch_urls.extend(urls)
+            if self._prefetching:
+                return
+            self._prefetching = True
+        threading.Thread(target = self._prefetch_pending, name = "youtube-prefetch", daemon = True).start()
+
+    def _prefetch_pending(self) -> None:
+        """Background thread: resolve the URLs waiting to be prefetched, until there are none left."""
+        while True:
+            with self._lock:
+                if not self._prefetch_urls:
+                    self._prefetching = False
+                    return
+                url = self._prefetch_urls.pop(0)
+            try:
+                self.resolve(url)
+            except Exception as e:
+                print(f"Can't resolve stream URL for youtube video {url}: {str(e)}")
+
+    @staticmethod
+    def _extract_stream_url(url: str) -> str:
+        """Resolve the stream URL of a YouTube video using youtube_dl."""
+        from youtube_dl import YoutubeDL
+        with YoutubeDL({'format': 'bestaudio'}) as ydl:
+            info_dict = ydl.extract_info(url, download=False)
+            try:
+                return info_dict['formats'][0]['url']
+            except IndexError:
+                raise RuntimeError(f"Can't find stream URL for youtube video {url}")
+
+    @classmethod
+    def _get_expiry(cls, stream_url: str) -> float:
+        """Return the time until which the given stream URL can be used."""
+        import urllib.parse
+
+        query = urllib.parse.parse_qs(urllib.parse.urlparse(stream_url).query)
+        try:
+            return float(query["expire"][0]) - cls.EXPIRY_MARGIN
+        except (KeyError, ValueError):
+            return time.time() + cls.DEFAULT_TTL
+
+    def _save(self) -> None:
+        """Write the cache to the cache file (atomically, by replacing the file). Must be called with the lock held.
+
+        Failing to write the cache (e.g. no longer permitted after dropping privileges) is reported, 
+        and doesn't fail the resolution of the stream URL.
+        """
+        if self._cache_file is None:
+            return
+        temp_file = f"{self._cache_file}.tmp"
+        try:
+            with open(temp_file, "w") as f:
+                json.dump(self._entries, f)
+            os.replace(temp_file, self._cache_file)
+        except OSError as e:
+            print(f"Can't save YouTube stream cache {self._cache_file}: {str(e)}")
+
+class KodiPlayer():
+    """Wrapper for communicating with Kodi over JSON-RPC."""
+
+    Album = namedtuple("Album", "id label")
+    Song = namedtuple("Song", "id label")
+
+    def __init__(self, host: str, pool_size: int = 2, timeout: float = 5.0, 
+                 retries: int = 3, backoff_factor: float = 0.2, notifications_port: Optional[int] = None,
+                 library_cache: Optional[str] = None, youtube_cache: Optional[str] = None):
+        """Initialize class.
+
+        All requests are sent over a single session, keeping the connections to Kodi
+        alive and reusing them for subsequent requests.
+        If a notifications port is given, the player state is tracked locally 
+        (see KodiState), saving the requests needed for querying the active players.
+
+        Args:
+            host:
+                Hostname/IP and port in the format 'host:port'.
+
+            pool_size:
+                Maximum number of connections to keep alive (i.e. concurrent requests 
+                which don't need to open a new connection).
+
+            timeout:
+                Timeout (in seconds) for connecting to Kodi and for receiving a response.
+
+            retries:
+                Number of times to retry connecting to Kodi. Requests which were already
+                sent are not retried, since they might have been executed.
+
+            backoff_factor:
+                Factor for the exponential delay between connection retries.
+
+            notifications_port:
+                Port of Kodi's JSON-RPC TCP interface (usually 9090), or None
+                to query the state over HTTP when needed.
+
+            library_cache:
+                Path of the file to cache the library index in (see library).
+
+            youtube_cache:
+                Path of the file to cache resolved YouTube stream URLs in 
+                (see YoutubeStreamCache), or None to only cache them in memory.
+        """
+        self.host = host
+        self.timeout = timeout
+        self._url = f"http://{host}/jsonrpc"
+        self._pool_size = pool_size
+        self._retries = retries
+        self._backoff_factor = backoff_factor
+        self._session = None
+        self._session_lock = threading.Lock()
+        self._warming_up = False
+
+        self.state = None
+        if notifications_port is not None:
+            self.state = KodiState(host.rsplit(":", 1)[0], notifications_port)
+            self.state.start()
+
+        self._library = None
+        self._library_cache = library_cache
+        self._library_lock = threading.Lock()
+        self._youtube = YoutubeStreamCache(youtube_cache)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self) -> None:
+        """Close the connections to Kodi, saving the library index if needed."""
+        with self._session_lock:
+            if self._session is not None:
+                self._session.close()
+        if self.state is not None:
+            self.state.close()
+        with self._library_lock:
+            library = self._library
+        if library is not None:
+            library.close()
+
+    def prepare_action(self, method: str, args: List[Any], kwargs: Dict[str, Any]) -> None:
+        """Prepare for calls of the given method with the given arguments, which are expected in the future.
+
+        Called by macro_keypad for every action calling the player. YouTube stream URLs 
+        are resolved in the background, so that playing them doesn't wait for youtube_dl.
+        The first call also creates the HTTP session in the background (see _get_session).
+
+        Args:
+            method:
+                Name of the method to be called.
+
+            args:
+                Positional arguments for the call.
+
+            kwargs:
+                Keyword arguments for the call.
+        """
+        if not self._warming_up:
+            self._warming_up = True
+            threading.Thread(target = self._get_session, name = "KodiSession", daemon = True).start()
+
+        if method == "play_youtube":
+            self._youtube.prefetch([args[0] if args else kwargs["url"]])
+
+    def _get_session(self) -> "requests.Session":
+        """Return the session used for all requests, creating it upon first use."""
+        with self._session_lock:
+            if self._session is None:
+                import requests
+                from requests.adapters import HTTPAdapter
+                from urllib3.util.retry import Retry
+
+                session = requests.Session()
+                retry = Retry(total = self._retries, connect = self._retries, read = 0, status = 0, 
+                              backoff_factor = self._backoff_factor, allowed_methods = None)
+                adapter = HTTPAdapter(pool_connections = 1, pool_maxsize = self._pool_size, max_retries = retry)
+                session.mount("http://", adapter)
+                self._session = session
+            return self._session
+
+    @property
+    def library(self) -> "KodiLibraryIndex":
+        """Index of the audio library, loaded from the library cache and refreshed upon first use.
+
+        If the state is tracked via notifications, the index is kept up to date as well.
+        """
+        with self._library_lock:
+            if self._library is None:
+                library = KodiLibraryIndex(self, self._library_cache)
+                library.refresh()
+                if self.state is not None:
+                    library.attach(self.state)
+                self._library = library
+        return self._library
+
+    def play_youtube(self, url: str, audio_output: Optional[str] = None) -> None:
+        """Play a YouTube stream.
+
+        Args:
+            url:
+                URL of the public video page. Actual stream URL is fetched automatically.
+
+            audio_output:
+                Audio output device to switch to before playing (in the same request).
+        """
+        return self.play_stream(self._youtube.resolve(url), audio_output)
+
+    def play_stream(self, url: str, audio_output: Optional[str] = None) -> None:
+        """Play a stream.
+
+        Args:
+            url:
+                URL of the stream.
+
+            audio_output:
+                Audio output device to switch to before playing (in the same request).
+        """
+        if audio_output is not None:
+            return self._play_with_audio_output({"file": url}, audio_output)
+        json_req = {"method": "Player.Open", "id": int(time.time()) , "jsonrpc": "2.0", "params": {"item": {"file": url}}}
+        return self._send_request(json_req)
+
+    def play_song(self, songid: int, audio_output: Optional[str] = None) -> None:
+        """Play a song.
+
+        Args:
+            songid:
+                The song's ID.
+
+            audio_output:
+                Audio output device to switch to before playing (in the same request).
+        """
+        if audio_output is not None:
+            return self._play_with_audio_output({"songid": songid}, audio_output)
+        json_req = {"method": "Player.Open", "id": int(time.time()) , "jsonrpc": "2.0", "params": {"item": {"songid": songid}}}
+        return self._send_request(json_req)
+
+    def play_song_by_label(self, label: str, audio_output: Optional[str] = None) -> None:
+        """Play the song which best matches the given label (see KodiLibraryIndex.find_songs).
+
+        Args:
+            label:
+                The song's label (or its prefix).
+
+            audio_output:
+                Audio output device to switch to before playing (in the same request).
+        """
+        songs = self.library.find_songs(label, limit = 1)
+        if not songs:
+            raise RuntimeError(f"Can't find song '{label}'")
+        return self.play_song(songs[0].id, audio_output)
+
+    def _play_with_audio_output(self, item: Dict[str, Any], audio_output: str):
+        """Set the audio output device and play the given item using a single batch request."""
+        batch = self.batch()
+        batch.add("Settings.SetSettingValue", {"setting": "audiooutput.audiodevice", "value": audio_output})
+        batch.add("Player.Open", {"item": item})
+        return batch.send()
+
+    def get_active_players(self):
+        """Returns a list of active player IDs."""
+        if self.state is not None and self.state.synced:
+            return list(self.state.active_players)
+
+        json_req = {"jsonrpc": "2.0", "method": "Player.GetActivePlayers", "id": int(time.time())}
+        response = self._send_request(json_req)
+        return [result["playerid"] for result in response["result"]]
+
+    def stop(self, batch: bool = False) -> None:
+        """Stop the current active players.
+
+        Args:
+            batch:
+                Stop all players using a single batch request, instead of a request per player.
+        """
+        active_players = self.get_active_players()
+        if batch:
+            stop_batch = self.batch()
+            for id in active_players:
+                stop_batch.add("Player.Stop", { "playerid": id })
+            result = stop_batch.send()
+        else:
+            result = []
+            for id in active_players:
+                json_req = {"method": "Player.Stop", "id": int(time.time()) , "jsonrpc": "2.0", "params": { "playerid": id }}
+                result.append(self._send_request(json_req))
+        return result[0] if len(result) == 1 else result
+
+    def toggle_play(self) -> None:
+        """Pause the active players if they are playing, or resume them if they are paused."""
+        result = []
+        for id in self.get_active_players():
+            json_req = {"method": "Player.PlayPause", "id": int(time.time()) , "jsonrpc": "2.0", "params": { "playerid": id }}
+            result.append(self._send_request(json_req))
+        return result[0] if len(result) == 1 else result
+
+    def batch(self) -> KodiBatch:
+        """Return a new batch for sending several calls in a single request."""
+        return KodiBatch(self)
+
+    def _send_request(self, json_req):
+        """Send a JSON request to the remote Kodi.
+
+        Args:
+            json_req: JSON request to send (or a list of requests for a batch).
+        
+        Returns:
+            The JSON response if the response code was OK (raises exception otherwise).
+        """
+        print(json_req)
+        r = self._get_session().post(self._url, json=json_req, timeout=self.timeout)
+        if (r.status_code != 200):
+            raise RuntimeError(f"Got status code {r.status_code}")
+        return r.json()
+
+    def get_albums(self):
+        """Return a list of albums."""
+        json_req = {"jsonrpc": "2.0", "method": "AudioLibrary.GetAlbums", "id": int(time.time())}
+        response = self._send_request(json_req)
+        result = []
+        albums = response["result"]["albums"]
+        for album in albums:
+            result.append(self.Album(id = album["albumid"], label = album["label"]))
+        return result
+
+    def get_songs(self):
+        """Return a list of songs."""
+        json_req = {"jsonrpc": "2.0", "method": "AudioLibrary.GetSongs", "id": int(time.time())}
+        response = self._send_request(json_req)
+        result = []
+        songs = response["result"]["songs"]
+        for song in songs:
+            result.append(self.Song(id = song["songid"], label = song["label"]))
+        return result
+
+    def get_albums_page(self, start: int, end: int, newest_first: bool = False) -> Tuple[List[Album], int]:
+        """Return a page of albums.
+
+        Args:
+            start:
+                Index of the first album to return.
+
+            end:
+                Index after the last album to return.
+
+            newest_first:
+                Sort the albums by the date they were added to the library, newest first.
+
+        Returns:
+            The albums in the page and the total number of albums in the library.
+        """
+        albums, total = self._get_library_page("AudioLibrary.GetAlbums", "albums", start, end, newest_first)
+        return [self.Album(id = album["albumid"], label = album["label"]) for album in albums], total
+
+    def get_songs_page(self, start: int, end: int, newest_first: bool = False) -> Tuple[List[Song], int]:
+        """Return a page of songs.
+
+        Args:
+            start:
+                Index of the first song to return.
+
+            end:
+                Index after the last song to return.
+
+            newest_first:
+                Sort the songs by the date they were added to the library, newest first.
+
+        Returns:
+            The songs in the page and the total number of songs in the library.
+        """
+        songs, total = self._get_library_page("AudioLibrary.GetSongs", "songs", start, end, newest_first)
+        return [self.Song(id = song["songid"], label = song["label"]) for song in songs], total
+
+    def _get_library_page(self, method: str, key: str, start: int, end: int, newest_first: bool):
+        """Return a page of library items using Kodi's "limits", and the total number of items."""
+        params = {"limits": {"start": start, "end": end}}
+        if newest_first:
+            params["sort"] = {"method": "dateadded", "order": "descending"}
+        json_req = {"jsonrpc": "2.0", "method": method, "id": int(time.time()), "params": params}
+        response = self._send_request(json_req)
+        return response["result"].get(key, []), response["result"]["limits"]["total"]
+    
+    def get_audio_output(self):
+        """Return audio output device."""
+        json_req = {"jsonrpc": "2.0", "method": "Settings.GetSettingValue", "id": int(time.time()), 
+                    "params": {"setting": "audiooutput.audiodevice"}}
+        response = self._send_request(json_req)
+        return response["result"]["value"]
+    
+    def set_audio_output(self, device):
+        """Set audio output device."""
+        json_req = {"jsonrpc": "2.0", "method": "Settings.SetSettingValue", "id": int(time.time()), 
+                    "params": {"setting": "audiooutput.audiodevice", "value": device}}
+        response = self._send_request(json_req)
+        return response["result"]
+        
+
+class KodiLibraryIndex():
+    """Index of Kodi's audio library (songs and albums), cached on disk.
+
+    Allows looking up songs and albums by ID or by label (exact, prefix or fuzzy match)
+    without fetching the library from Kodi. The index is refreshed incrementally: 
+    new items are fetched page by page (newest first) until reaching known items, 
+    and if a KodiState is attached, AudioLibrary.OnUpdate / OnRemove notifications
+    are applied as they arrive (and saved once they stop arriving, see SAVE_DELAY).
+
+    Example usage:
+
+    >>> index = KodiLibraryIndex(player, "/var/cache/macro_keypad/kodi_library.json")
+    >>> index.refresh()
+    >>> index.find_songs("Bohemian")
+    """
+
+    CACHE_VERSION = 1
+
+    # Time (in seconds) to wait for further notifications before saving, so that e.g. 
+    #  a library scan, which sends a notification per item, saves the index once
+    SAVE_DELAY = 10.0
+
+    # Kodi library item types: (name, page getter, details method, details key)
+    _TYPES = {
+        "song":  ("get_songs_page",  "AudioLibrary.GetSongDetails",  "songdetails",  "songid"),
+        "album": ("get_albums_page", "AudioLibrary.GetAlbumDetails", "albumdetails", "albumid"),
+    }
+
+    def __init__(self, player: KodiPlayer, cache_file: Optional[str] = None, page_size: int = 500):
+        """Initialize the index, loading it from the cache file if it exists.
+
+        Args:
+            player:
+                Player used for fetching the library.
+
+            cache_file:
+                Path of the file to cache the index in, or None for an in-memory index.
+
+            page_size:
+                Number of items to fetch from Kodi per request.
+        """
+        self._player = player
+        self._cache_file = cache_file
+        self._page_size = page_size
+        self._lock = threading.RLock()
+        self._items: Dict[str, Dict[int, str]] = {item_type: {} for item_type in self._TYPES}
+        self._labels: Dict[str, Optional[List[Tuple[str, int]]]] = {item_type: None for item_type in self._TYPES}
+        # Pending save of changes applied from notifications
+        self._save_timer: Optional[threading.Timer] = None
+        if cache_file is not None and os.path.exists(cache_file):
+            self._load()
+
+    def close(self) -> None:
+        """Save the changes which weren't saved yet (see SAVE_DELAY)."""
+        with self._lock:
+            pending = self._save_timer is not None
+        if pending:
+            self._save()
+
+    @property
+    def songs(self) -> Dict[int, KodiPlayer.Song]:
+        """All songs, by ID."""
+        with self._lock:
+            return {id: KodiPlayer.Song(id, label) for id, label in self._items["song"].items()}
+
+    @property
+    def albums(self) -> Dict[int, KodiPlayer.Album]:
+        """All albums, by ID."""
+        with self._lock:
+            return {id: KodiPlayer.Album(id, label) for id, label in self._items["album"].items()}
+
+    def find_songs(self, label: str, fuzzy: bool = True, limit: int = 10) -> List[KodiPlayer.Song]:
+        """Find songs by label (see _find)."""
+        return [KodiPlayer.Song(id, label) for id, label in self._find("song", label, fuzzy, limit)]
+
+    def find_albums(self, label: str, fuzzy: bool = True, limit: int = 10) -> List[KodiPlayer.Album]:
+        """Find albums by label (see _find)."""
+        return [KodiPlayer.Album(id, label) for id, label in self._find("album", label, fuzzy, limit)]
+
+    def _find(self, item_type: str, label: str, fuzzy: bool, limit: int) -> List[Tuple[int, str]]:
+        """Find items whose label starts with the given label (case insensitive).
+
+        If no such item exists and fuzzy is True, return the items with the closest labels instead.
+        """
+        prefix = label.lower()
+        with self._lock:
+            labels = self._sorted_labels(item_type)
+            items = self._items[item_type]
+            result = []
+            i = bisect.bisect_left(labels, (prefix, -1))
+            while i < len(labels) and labels[i][0].startswith(prefix) and len(result) < limit:
+                result.append((labels[i][1], items[labels[i][1]]))
+                i += 1
+
+            if not result and fuzzy:
+                import difflib
+
+                lowercase_labels = {}
+                for lowercase_label, id in labels:
+                    lowercase_labels.setdefault(lowercase_label, []).append(id)
+                for match in difflib.get_close_matches(prefix, lowercase_labels.keys(), n = limit):
+                    result.extend((id, items[id]) for id in lowercase_labels[match])
+            return result[:limit]
+
+    def _sorted_labels(self, item_type: str) -> List[Tuple[str, int]]:
+        """Return the (lowercase label, ID) pairs of the given type, sorted. Must be called with the lock held."""
+        if self._labels[item_type] is None:
+            self._labels[item_type] = sorted((label.lower(), id) for id, label in self._items[item_type].items())
+        return self._labels[item_type]
+
+    def refresh(self, full: bool = False) -> None:
+        """Fetch the changes in Kodi's library and update the cache file.
+
+        Args:
+            full:
+                Fetch the complete library instead of only the items added since the last refresh.
+        """
+        for item_type, (get_page, _, _, _) in self._TYPES.items():
+            with self._lock:
+                known = set() if full else set(self._items[item_type])
+            fetched, total = self._fetch_new_items(get_page, known)
+
+            if known and len(known) + len(fetched) != total:
+                # Items were removed while we weren't watching, start over
+                known = set()
+                fetched, total = self._fetch_new_items(get_page, known)
+
+            with self._lock:
+                if known:
+                    self._items[item_type].update(fetched)
+                else:
+                    self._items[item_type] = fetched
+                self._labels[item_type] = None
+        self._save()
+
+    def _fetch_new_items(self, get_page: str, known: set) -> Tuple[Dict[int, str], int]:
+        """Fetch pages of items, newest first, until reaching the known items.
+
+        Returns:
+            Dictionary of ID -> label of the new items, and the total number of items.
+        """
+        fetched = {}
+        start = 0
+        while True:
+            page, total = getattr(self._player, get_page)(start, start + self._page_size, newest_first = True)
+            new_items = {item.id: item.label for item in page if item.id not in known}
+            fetched.update(new_items)
+            start += len(page)
+            if not page or start >= total or len(new_items) < len(page):
+                return fetched, total
+
+    def attach(self, state: KodiState) -> None:
+        """Keep the index up to date using the library notifications received by the given state.
+
+        Args:
+            state:
+                Connection to Kodi's notifications.
+        """
+        def on_notification(method: str, params: Dict[str, Any]) -> None:
+            data = params.get("data") or {}
+            item_type = data.get("type")
+            if item_type not in self._TYPES or "id" not in data:
+                return
+            if method == "AudioLibrary.OnRemove":
+                self._remove(item_type, data["id"])
+            elif method == "AudioLibrary.OnUpdate":
+                _, details_method, details_key, id_field = self._TYPES[item_type]
+                state.send(details_method, {id_field: data["id"]}, 
+                           lambda result: self._update(item_type, data["id"], result[details_key]["label"]))
+
+        state.add_listener(on_notification)
+
+    def _update(self, item_type: str, id: int, label: str) -> None:
+        with self._lock:
+            self._items[item_type][id] = label
+            self._labels[item_type] = None
+        self._save_later()
+
+    def _remove(self, item_type: str, id: int) -> None:
+        with self._lock:
+            self._items[item_type].pop(id, None)
+            self._labels[item_type] = None
+        self._save_later()
+
+    def _load(self) -> None:
+        """Load the index from the cache file, ignoring an incompatible or corrupt cache."""
+        try:
+            with open(self._cache_file) as f:
+                cache = json.load(f)
+            if not isinstance(cache, dict) or cache.get("version") != self.CACHE_VERSION or cache.get("host") != self._player.host:
+                return
+            items = {item_type: {int(id): label for id, label in cache.get(item_type, {}).items()} for item_type in self._TYPES}
+        except (OSError, ValueError, AttributeError) as e:
+            # E.g. truncated by a crash, the index is rebuilt by the next refresh
+            print(f"Ignoring library cache {self._cache_file}: {str(e)}")
+            return
+        with self._lock:
+            for item_type in self._TYPES:
+                self._items[item_type] = items[item_type]
+                self._labels[item_type] = None
+
+    def _save_later(self) -> None:
+        """Save the index once SAVE_DELAY passes, unless already pending."""
+        if self._cache_file is None:
+            return
+        with self._lock:
+            if self._save_timer is None:
+                self._save_timer = threading.Timer(self.SAVE_DELAY, self._save)
+                self._save_timer.daemon = True
+                self._save_timer.start()
+
+    def _save(self) -> None:
+        """Write the index to the cache file (atomically, by replacing the file), reporting a failure to write it."""
+        if self._cache_file is None:
+            return
+        with self._lock:
+            if self._save_timer is not None:
+                self._save_timer.cancel()
+                self._save_timer = None
+            cache = {"version": self.CACHE_VERSION, "host": self._player.host}
+            cache.update({item_type: items for item_type, items in self._items.items()})
+            temp_file = f"{self._cache_file}.tmp"
+            try:
+                with open(temp_file, "w") as f:
+                    json.dump(cache, f)
+                os.replace(temp_file, self._cache_file)
+            except OSError as e:
+                # The index is still kept in memory
+                print(f"Can't save library cache {self._cache_file}: {str(e)}")
+
+if __name__ == "__main__":
+    import argparse
+
+    # Must match startup_profile.PROFILE_STARTUP_ENV (the module isn't imported unless profiling)
+    PROFILE_STARTUP_ENV = "PROFILE_STARTUP"
+
+    class Commands(enum.Enum):
+        """Commands for argument parsing."""
+        PLAY    = "play"
+        STOP    = "stop"
+        TOGGLE  = "toggle"
+        LIST    = "list"
+        AUDIO   = "audio"
+
+    parser = argparse.ArgumentParser(description = 'Wrapper for controlling Kodi from remote')
+    parser.add_argument("-k", "--kodi-host", required = True, help="Kodi URL in form of host:port")
+    parser.add_argument("-t", "--timeout", type = float, default = 5.0, help="Request timeout in seconds (default: %(default)s)")
+    parser.add_argument("-r", "--retries", type = int, default = 3, help="Connection retries (default: %(default)s)")
+    parser.add_argument("-c", "--library-cache", help="File to cache the library index in, for listing and finding songs")
+    parser.add_argument("--youtube-cache", help="File to cache resolved YouTube stream URLs in")
+    parser.add_argument("--profile-startup", action = 'store_true', 
+                        help = "Print the time spent importing modules until the player is created, and exit")
+
+    subparsers = parser.add_subparsers(dest = 'command', required = True, title = 'subcommands',
+                                       description = 'Valid subcommands')
+
+    play_parser = subparsers.add_parser(Commands.PLAY.value, help = 'Play media')
+    play_command = play_parser.add_mutually_exclusive_group(required = True)
+    play_command.add_argument('-s', '--stream', action = 'store', type = str, help = "Play stream")
+    play_command.add_argument('-y', '--youtube', action = 'store', type = str, help = "Play YouTube video")
+    play_command.add_argument('-g', '--song', action = 'store', type = int, metavar = "SONG_ID", help = "Play song with given song ID")
+    play_command.add_argument('-l', '--song-label', action = 'store', type = str, metavar = "LABEL", 
+                              help = "Play song best matching the given label")
+    play_parser.add_argument('-o', '--audio-output', action = 'store', 
+                             help = "Set the audio output device before playing, in the same (batch) request")
+
+    stop_parser = subparsers.add_parser(Commands.STOP.value, help = 'Stop')
+    stop_parser.add_argument('-b', '--batch', action = 'store_true', help = "Stop all players in a single batch request")
+
+    toggle_parser = subparsers.add_parser(Commands.TOGGLE.value, help = 'Pause / Resume')
+
+    list_parser = subparsers.add_parser(Commands.LIST.value, help = 'List details')
+    list_command = list_parser.add_mutually_exclusive_group(required = True)
+    list_command.add_argument('--albums', action = 'store_true', help = "List albums")
+    list_command.add_argument('--songs', action = 'store_true', help = "List songs")
+    list_parser.add_argument('-f', '--find', action = 'store', metavar = "LABEL", 
+                             help = "Only list items matching the given label (prefix or fuzzy match)")
+
+    audio_parser = subparsers.add_parser(Commands.AUDIO.value, help = 'Audio Settings')
+    audio_command = audio_parser.add_mutually_exclusive_group(required = True)
+    audio_command.add_argument('--get-output', action = 'store_true', help = "Get Audio Output Device")
+    audio_command.add_argument('--set-output', action = 'store', help = "Set Audio Output Device") # "ALSA:@" / "ALSA:sysdefault:CARD=Headphones"
+
+    args = parser.parse_args()
+
+    if args.profile_startup:
+        sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+        from startup_profile import profile_startup
+        sys.exit(profile_startup(sys.argv))
+
+    try:
+        player = KodiPlayer(args.kodi_host, timeout = args.timeout, retries = args.retries, 
+                            library_cache = args.library_cache, youtube_cache = args.youtube_cache)
+        if os.environ.get(PROFILE_STARTUP_ENV):
+            sys.exit(0)
+        if args.command == Commands.PLAY.value:
+            if args.youtube:
+                print(player.play_youtube(args.youtube, args.audio_output))
+            elif args.stream:
+                print(player.play_stream(args.stream, args.audio_output))
+            elif args.song:
+                print(player.play_song(args.song, args.audio_output))
+            elif args.song_label:
+                print(player.play_song_by_label(args.song_label, args.audio_output))
+        elif args.command == Commands.STOP.value:
+            print(player.stop(args.batch))
+        elif args.command == Commands.TOGGLE.value:
+            print(player.toggle_play())
+        elif args.command == Commands.LIST.value:
+            from pprint import pprint
+
+            if args.find is not None:
+                if args.albums:
+                    pprint(player.library.find_albums(args.find))
+                elif args.songs:
+                    pprint(player.library.find_songs(args.find))
+            elif args.library_cache is not None:
+                if args.albums:
+                    pprint(list(player.library.albums.values()))
+                elif args.songs:
+                    pprint(list(player.library.songs.values()))
+            elif args.albums:
+                pprint(player.get_albums())
+            elif args.songs:
+                pprint(player.get_songs())
+        elif args.command == Commands.AUDIO.value:
+            if args.get_output:
+                print(player.get_audio_output())
+            elif args.set_output:
+                print(player.set_audio_output(args.set_output))
+
+    except Exception as e:
+        print(f"Error: {str(e)}")
+    except KeyboardInterrupt:
         print ("\nQuitting...")
\ No newline at end of file
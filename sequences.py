@@ -0,0 +1,192 @@
+"""Matching of key sequences and chords.
+
+A sequence is a list of keys pressed one after the other (e.g. KEY_KP1 then KEY_KP2),
+where each key must be released within a timeout of the previous one.
+A chord is a set of keys held down together (e.g. KEY_LEFTCTRL + KEY_KP1), 
+triggered as soon as the last key of the chord is pressed.
+
+Sequences are compiled into a prefix trie, so matching a keystroke is a single 
+dictionary lookup regardless of the number of sequences defined.
+
+Sources:
+    https://github.com/Dvd848/macro_keyboard
+
+License:
+    LGPL v2.1
+
+    This library is free software; you can redistribute it and/or
+    modify it under the terms of the GNU Lesser General Public
+    License as published by the Free Software Foundation; either
+    version 2.1 of the License, or (at your option) any later version.
+
+    This library is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+    Lesser General Public License for more details.
+
+    You should have received a copy of the GNU Lesser General Public
+    License along with this library; if not, write to the Free Software
+    Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301  USA
+
+"""
+from typing import Callable, Dict, FrozenSet, Optional, Set, Tuple, Union
+
+from actions import Action
+from input_device import Event, event_timestamp
+from linux_input import EventType, KeyEvent
+
+EV_KEY = EventType.EV_KEY.value
+KEY_UP = KeyEvent.KEY_UP.value
+KEY_DOWN = KeyEvent.KEY_DOWN.value
+
+# A trigger of an action, by key codes: a single key, a sequence of keys or a chord
+Trigger = Union[int, Tuple[int, ...], FrozenSet[int]]
+
+class _TrieNode():
+    """A node in the sequence trie: the sequence leading to it may continue with any of the children."""
+    __slots__ = ("children", "action")
+
+    def __init__(self):
+        self.children: Dict[int, _TrieNode] = {}
+        self.action: Optional[Action] = None
+
+class KeySequenceMatcher():
+    """Matches the key events of a device against single keys, sequences and chords.
+
+    When a sequence is a prefix of a longer one (e.g. KEY_KP1 and KEY_KP1 + KEY_KP2),
+    the shorter one is only triggered once the timeout expires without the longer 
+    one being continued, or once a key which doesn't continue it is released.
+    Hence, expire() must be called periodically (see next_deadline).
+
+    Timing is based on the timestamps of the events, as reported by the kernel.
+    """
+
+    def __init__(self, action_mapping: Dict[Trigger, Action], dispatch: Callable[[Action], None], 
+                 timeout: float = 1.0):
+        """Compile an action mapping into a matcher.
+
+        Args:
+            action_mapping:
+                Mapping of trigger -> action, where the trigger is a key code, a tuple of 
+                key codes (a sequence) or a frozenset of key codes (a chord).
+
+            dispatch:
+                Callback to call with each triggered action.
+
+            timeout:
+                Maximal time (in seconds) between the keys of a sequence.
+        """
+        self._dispatch = dispatch
+        self._timeout = timeout
+        self._root = _TrieNode()
+        self._chords: Dict[FrozenSet[int], Action] = {}
+
+        for trigger, action in action_mapping.items():
+            if isinstance(trigger, frozenset):
+                self._chords[trigger] = action
+                continue
+
+            node = self._root
+            for code in (trigger if isinstance(trigger, tuple) else (trigger,)):
+                node = node.children.setdefault(code, _TrieNode())
+            node.action = action
+
+        self._node = self._root
+        self._deadline: Optional[float] = None
+        self._held: Set[int] = set()
+        self._consumed: Set[int] = set()
+
+    @property
+    def next_deadline(self) -> Optional[float]:
+        """Time (as in time.time()) at which expire() should be called, or None if not needed."""
+        return self._deadline
+
+    def event_mask(self) -> Dict[int, Set[int]]:
+        """Return the events which may trigger an action, for InputDevice.set_event_mask.
+
+        Returns:
+            Dictionary of event type -> codes (where type 0 maps to the event types).
+        """
+        codes = set()
+        pending = [self._root]
+        while pending:
+            node = pending.pop()
+            codes.update(node.children)
+            pending.extend(node.children.values())
+        for chord in self._chords:
+            codes.update(chord)
+        return {EventType.EV_SYN.value: {EV_KEY}, EV_KEY: codes}
+
+    def handle_event(self, input_event: Event) -> None:
+        """Handle an event from the device, dispatching the actions it triggers.
+
+        Args:
+            input_event:
+                The event.
+        """
+        if input_event.type != EV_KEY:
+            return
+
+        code = input_event.code
+        if input_event.value == KEY_DOWN:
+            self._held.add(code)
+            if self._chords:
+                action = self._chords.get(frozenset(self._held))
+                if action is not None:
+                    # A chord interrupts any sequence in progress, and its keys aren't part of any sequence
+                    self._consumed.update(self._held)
+                    self._reset()
+                    self._dispatch(action)
+        elif input_event.value == KEY_UP:
+            self._held.discard(code)
+            if code in self._consumed:
+                self._consumed.discard(code)
+                return
+            self._advance(code, event_timestamp(input_event))
+
+    def expire(self, now: float) -> Optional[float]:
+        """Trigger the pending action if the sequence in progress timed out.
+
+        Args:
+            now:
+                The current time, as in time.time().
+
+        Returns:
+            The next deadline (see next_deadline).
+        """
+        if self._deadline is not None and now >= self._deadline:
+            self._trigger_pending()
+        return self._deadline
+
+    def _advance(self, code: int, timestamp: float) -> None:
+        """Advance the sequence in progress with the given (released) key."""
+        if self._deadline is not None and timestamp > self._deadline:
+            self._trigger_pending()
+
+        child = self._node.children.get(code)
+        if child is None and self._node is not self._root:
+            # The sequence in progress doesn't continue with this key, it might start a new one
+            self._trigger_pending()
+            child = self._root.children.get(code)
+
+        if child is None:
+            return
+
+        if child.children:
+            # Wait for the sequence to continue
+            self._node = child
+            self._deadline = timestamp + self._timeout
+        else:
+            self._reset()
+            self._dispatch(child.action)
+
+    def _trigger_pending(self) -> None:
+        """End the sequence in progress, triggering its action (if the keys so far are a sequence by themselves)."""
+        action = self._node.action
+        self._reset()
+        if action is not None:
+            self._dispatch(action)
+
+    def _reset(self) -> None:
+        self._node = self._root
+        self._deadline = None
@@ -0,0 +1,130 @@
+"""Profiling of the startup time of a program, by the time spent importing modules.
+
+profile_startup() runs the program again with "-X importtime", until the program
+reports that its startup is complete (see startup_complete), and prints a summary
+of the imports: the slowest modules by their own import time, and the total import
+time of each module imported directly by the program.
+
+Example usage, where the program supports a --profile-startup option:
+
+    if args.profile_startup:
+        sys.exit(profile_startup(sys.argv))
+    ...
+    startup_complete()
+    # Do the actual work
+
+Sources:
+    https://github.com/Dvd848/macro_keyboard
+    https://docs.python.org/3/using/cmdline.html#cmdoption-X
+
+License:
+    LGPL v2.1
+
+    This library is free software; you can redistribute it and/or
+    modify it under the terms of the GNU Lesser General Public
+    License as published by the Free Software Foundation; either
+    version 2.1 of the License, or (at your option) any later version.
+
+    This library is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+    Lesser General Public License for more details.
+
+    You should have received a copy of the GNU Lesser General Public
+    License along with this library; if not, write to the Free Software
+    Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301  USA
+
+"""
+import os
+import sys
+
+from collections import namedtuple
+from typing import List
+
+# Set for the profiled program, which exits once its startup is complete
+PROFILE_STARTUP_ENV = "PROFILE_STARTUP"
+
+# A module import as reported by -X importtime, where the times are in microseconds
+# and depth 0 means the module was imported directly by the program
+ImportTime = namedtuple("ImportTime", "name self_time cumulative_time depth")
+
+def startup_complete() -> None:
+    """Mark the end of the startup of the program, exiting if its startup is being profiled."""
+    if os.environ.get(PROFILE_STARTUP_ENV):
+        sys.exit(0)
+
+def parse_import_times(output: str) -> List[ImportTime]:
+    """Parse the output of -X importtime.
+
+    Args:
+        output:
+            The output (stderr) of the program.
+
+    Returns:
+        The imports, in the order of the output.
+    """
+    imports = []
+    for line in output.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        fields = line[len("import time:"):].split("|")
+        if len(fields) != 3 or not fields[0].strip().isdigit():
+            # The header line
+            continue
+        name = fields[2].rstrip()
+        stripped_name = name.lstrip()
+        imports.append(ImportTime(stripped_name, int(fields[0]), int(fields[1]),
+                                  (len(name) - len(stripped_name) - 1) // 2))
+    return imports
+
+def profile_startup(argv: List[str], option: str = "--profile-startup", top: int = 15) -> int:
+    """Run the program again with -X importtime and print a summary of its imports.
+
+    Args:
+        argv:
+            The command line of the program (sys.argv), including the given option.
+
+        option:
+            The option which requested the profiling, removed from the command line.
+
+        top:
+            Number of modules to list.
+
+    Returns:
+        The exit code of the program.
+    """
+    import subprocess
+    import time
+
+    command = [sys.executable, "-X", "importtime", argv[0]] + [arg for arg in argv[1:] if arg != option]
+    start = time.perf_counter()
+    result = subprocess.run(command, env = dict(os.environ, **{PROFILE_STARTUP_ENV: "1"}),
+                            stderr = subprocess.PIPE, universal_newlines = True)
+    elapsed = time.perf_counter() - start
+
+    imports = parse_import_times(result.stderr)
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:"):
+            print(line, file = sys.stderr)
+
+    # Modules imported while starting the interpreter (e.g. by site) aren't imported by the program
+    program_imports = []
+    for module in reversed(imports):
+        if module.depth == 0 and module.name in ("site", "encodings"):
+            break
+        program_imports.append(module)
+
+    print(f"Startup took {elapsed * 1000:.1f} ms (including the interpreter), "
+          f"of which {sum(module.cumulative_time for module in program_imports if module.depth == 0) / 1000:.1f} ms "
+          f"were spent importing {len(program_imports)} modules")
+
+    print("\nSlowest modules (own import time):")
+    for module in sorted(program_imports, key = lambda module: module.self_time, reverse = True)[:top]:
+        print(f"  {module.self_time / 1000:>7.1f} ms  {module.name}")
+
+    print("\nModules imported by the program (including their own imports):")
+    for module in sorted((module for module in program_imports if module.depth == 0),
+                         key = lambda module: module.cumulative_time, reverse = True)[:top]:
+        print(f"  {module.cumulative_time / 1000:>7.1f} ms  {module.name}")
+
+    return result.returncode
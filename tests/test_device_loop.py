@@ -0,0 +1,107 @@
+"""Tests of attaching to devices and handling their events by the DeviceLoop.
+
+The devices are FIFOs, written by a background thread.
+
+License:
+    LGPL v2.1
+
+    This library is free software; you can redistribute it and/or
+    modify it under the terms of the GNU Lesser General Public
+    License as published by the Free Software Foundation; either
+    version 2.1 of the License, or (at your option) any later version.
+
+    This library is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+    Lesser General Public License for more details.
+
+    You should have received a copy of the GNU Lesser General Public
+    License along with this library; if not, write to the Free Software
+    Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301  USA
+
+"""
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+
+from unittest import mock
+
+import linux_input
+import macro_keypad
+from event_trace import read_trace
+from input_device import InputDevice, EV_KEY, SYN_REPORT, SYN_DROPPED, KEY_DOWN, KEY_UP
+
+EV_SYN = linux_input.EventType.EV_SYN.value
+KEY_A = linux_input.Keys.KEY_A.value
+KEY_B = linux_input.Keys.KEY_B.value
+
+class StopLoop(Exception):
+    """Raised by a handler to stop the loop."""
+
+class DeviceLoopTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        # The devices are FIFOs, which have no name, and privileges are kept
+        for patcher in (mock.patch.object(InputDevice, "name", property(lambda device: device.path)),
+                        mock.patch.object(macro_keypad, "drop_privileges"),
+                        mock.patch.object(macro_keypad.os, "getresuid", return_value = (1, 1, 1))):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_hotplug_missing_directory(self):
+        # As /dev/input/by-id, which udev removes once no device is connected
+        device_directory = os.path.join(self.directory, "by-id")
+        device_path = os.path.join(device_directory, "kbd")
+        events = []
+
+        def handle_event(input_event):
+            events.append((input_event.type, input_event.code, input_event.value))
+            if input_event.type == EV_SYN:
+                raise StopLoop()
+
+        def connect():
+            time.sleep(0.05)
+            os.mkdir(device_directory)
+            time.sleep(0.05)
+            os.mkfifo(device_path)
+            with open(device_path, "wb") as f:
+                f.write(linux_input.INPUT_EVENT_STRUCT.pack(1, 0, EV_KEY, KEY_A, KEY_DOWN) +
+                        linux_input.INPUT_EVENT_STRUCT.pack(1, 0, EV_SYN, SYN_REPORT, 0))
+
+        connector = threading.Thread(target = connect)
+        connector.start()
+        loop = macro_keypad.DeviceLoop({device_path: handle_event}, False, hotplug = True)
+        with self.assertRaises(StopLoop):
+            loop.run()
+        connector.join()
+        self.assertEqual(events, [(EV_KEY, KEY_A, KEY_DOWN), (EV_SYN, SYN_REPORT, 0)])
+
+    def test_record_dropped_events(self):
+        device_path = os.path.join(self.directory, "kbd")
+        trace_file = os.path.join(self.directory, "kbd.trace")
+        os.mkfifo(device_path)
+        events = [(EV_KEY, KEY_A, KEY_DOWN), (EV_SYN, SYN_REPORT, 0), 
+                  (EV_KEY, KEY_B, KEY_DOWN), (EV_SYN, SYN_DROPPED, 0), 
+                  (EV_KEY, KEY_B, KEY_UP), (EV_SYN, SYN_REPORT, 0)]
+
+        def write_events():
+            with open(device_path, "wb") as f:
+                f.write(b"".join(linux_input.INPUT_EVENT_STRUCT.pack(1, 0, *event) for event in events))
+
+        for batch_size in (1, 64):
+            with self.subTest(batch_size = batch_size):
+                writer = threading.Thread(target = write_events)
+                writer.start()
+                macro_keypad.record_events([device_path], trace_file, batch_size)
+                writer.join()
+                _, records = read_trace(trace_file)
+                # As read, rather than resynchronized
+                self.assertEqual([linux_input.INPUT_EVENT_STRUCT.unpack(record.data)[2:] for record in records], events)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,52 @@
+"""Tests of dispatching events to actions through a DispatchTable.
+
+License:
+    LGPL v2.1
+
+    This library is free software; you can redistribute it and/or
+    modify it under the terms of the GNU Lesser General Public
+    License as published by the Free Software Foundation; either
+    version 2.1 of the License, or (at your option) any later version.
+
+    This library is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+    Lesser General Public License for more details.
+
+    You should have received a copy of the GNU Lesser General Public
+    License along with this library; if not, write to the Free Software
+    Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301  USA
+
+"""
+import unittest
+
+import linux_input
+from actions import Action
+from dispatch import DispatchTable, EV_KEY
+from linux_input import InputEvent, KeyEvent, KEY_CNT
+
+KEY_A = linux_input.Keys.KEY_A.value
+
+class DispatchTableTest(unittest.TestCase):
+
+    def test_codes_out_of_range(self):
+        action = Action("a")
+        table = DispatchTable({KEY_A: action}, KeyEvent.KEY_DOWN)
+        # The first would alias KEY_A pressed, at index (KEY_DOWN * KEY_CNT + KEY_A)
+        events = [InputEvent(0, 0, EV_KEY, KEY_CNT + KEY_A, KeyEvent.KEY_UP.value), 
+                  InputEvent(0, 0, EV_KEY, KEY_A, KeyEvent.KEY_DOWN.value)]
+
+        dispatched = []
+        handle_event = table.create_handler(dispatched.append)
+        for input_event in events:
+            handle_event(input_event)
+        self.assertEqual(dispatched, [action])
+
+        dispatched = []
+        table.create_frame_handler(dispatched.append)(events)
+        self.assertEqual(dispatched, [action])
+
+        self.assertEqual([table.lookup(*input_event[2:]) for input_event in events], [None, action])
+
+if __name__ == "__main__":
+    unittest.main()
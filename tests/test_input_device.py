@@ -0,0 +1,127 @@
+"""Tests of reading events from an input device.
+
+The events are read from a regular file, which behaves as a device on which
+ioctls fail (see InputDevice._resync).
+
+License:
+    LGPL v2.1
+
+    This library is free software; you can redistribute it and/or
+    modify it under the terms of the GNU Lesser General Public
+    License as published by the Free Software Foundation; either
+    version 2.1 of the License, or (at your option) any later version.
+
+    This library is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+    Lesser General Public License for more details.
+
+    You should have received a copy of the GNU Lesser General Public
+    License along with this library; if not, write to the Free Software
+    Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301  USA
+
+"""
+import os
+import tempfile
+import threading
+import time
+import unittest
+
+from typing import List, Tuple
+
+import linux_input
+from input_device import InputDevice, EventDecoder, EV_KEY, SYN_REPORT, SYN_DROPPED, KEY_UP, KEY_DOWN
+
+EV_SYN = linux_input.EventType.EV_SYN.value
+KEY_A = linux_input.Keys.KEY_A.value
+KEY_B = linux_input.Keys.KEY_B.value
+KEY_C = linux_input.Keys.KEY_C.value
+
+def pack_events(events: List[Tuple[int, int, int]]) -> bytes:
+    """Pack (type, code, value) events as read from a device."""
+    return b"".join(linux_input.INPUT_EVENT_STRUCT.pack(1, index, event_type, code, value)
+                    for index, (event_type, code, value) in enumerate(events))
+
+class InputDeviceTest(unittest.TestCase):
+
+    def setUp(self):
+        fd, self.path = tempfile.mkstemp()
+        os.close(fd)
+        self.addCleanup(os.remove, self.path)
+
+    def write_events(self, events: List[Tuple[int, int, int]]) -> None:
+        with open(self.path, "wb") as f:
+            f.write(pack_events(events))
+
+    def read_frames(self, batch_size: int, decoder: EventDecoder) -> List[List[Tuple[int, int, int]]]:
+        frames = []
+        with InputDevice(self.path, batch_size, decoder) as device:
+            device.read_frames(frames.append)
+            device.loop_frames(frames.append)
+            dropped = device.dropped
+        self.assertEqual(dropped, 1)
+        return [[(event.type, event.code, event.value) for event in frame] for frame in frames]
+
+    def test_frames_discard_partial_frame_on_drop(self):
+        self.write_events([(EV_KEY, KEY_A, KEY_DOWN), (EV_SYN, SYN_REPORT, 0),
+                           (EV_KEY, KEY_B, KEY_DOWN), (EV_SYN, SYN_DROPPED, 0),
+                           (EV_KEY, KEY_C, KEY_DOWN), (EV_SYN, SYN_REPORT, 0)])
+        for decoder in EventDecoder:
+            for batch_size in (1, 2, 3, 64):
+                with self.subTest(decoder = decoder, batch_size = batch_size):
+                    # The partial frame pressing KEY_B isn't delivered, so neither is its release 
+                    #  by the resynchronized state
+                    self.assertEqual(self.read_frames(batch_size, decoder), 
+                                     [[(EV_KEY, KEY_A, KEY_DOWN)], [(EV_KEY, KEY_A, KEY_UP)]])
+
+    def read_events(self, batch_size: int, decoder: EventDecoder) -> List[Tuple[int, int, int]]:
+        events = []
+        with InputDevice(self.path, batch_size, decoder) as device:
+            device.loop_events(events.append)
+        return [(event.type, event.code, event.value) for event in events]
+
+    def test_events_queued_behind_resync(self):
+        # The release of KEY_A is queued behind the SYN_REPORT ending the drop, so it's already 
+        #  reflected by the resynchronized state (all keys released, as ioctls fail on a file)
+        self.write_events([(EV_KEY, KEY_A, KEY_DOWN), (EV_SYN, SYN_REPORT, 0),
+                           (EV_SYN, SYN_DROPPED, 0), (EV_KEY, KEY_C, KEY_DOWN), (EV_SYN, SYN_REPORT, 0),
+                           (EV_KEY, KEY_A, KEY_UP), (EV_SYN, SYN_REPORT, 0),
+                           (EV_KEY, KEY_B, KEY_DOWN), (EV_SYN, SYN_REPORT, 0)])
+        for decoder in EventDecoder:
+            for batch_size in (1, 2, 64):
+                with self.subTest(decoder = decoder, batch_size = batch_size):
+                    # KEY_A is released once, by the resync
+                    self.assertEqual(self.read_events(batch_size, decoder), 
+                                     [(EV_KEY, KEY_A, KEY_DOWN), (EV_SYN, SYN_REPORT, 0), 
+                                      (EV_KEY, KEY_A, KEY_UP), (EV_SYN, SYN_REPORT, 0), 
+                                      (EV_SYN, SYN_REPORT, 0), 
+                                      (EV_KEY, KEY_B, KEY_DOWN), (EV_SYN, SYN_REPORT, 0)])
+
+    def test_partial_reads(self):
+        os.remove(self.path)
+        os.mkfifo(self.path)
+        data = pack_events([(EV_KEY, KEY_A, KEY_DOWN), (EV_SYN, SYN_REPORT, 0), 
+                            (EV_KEY, KEY_A, KEY_UP), (EV_SYN, SYN_REPORT, 0)])
+
+        def write_in_parts():
+            # Splitting events, as a pipe (e.g. replaying a recording) might
+            with open(self.path, "wb", buffering = 0) as f:
+                for offset in range(0, len(data), 10):
+                    f.write(data[offset:offset + 10])
+                    time.sleep(0.001)
+
+        for decoder in EventDecoder:
+            for batch_size in (1, 2, 64):
+                with self.subTest(decoder = decoder, batch_size = batch_size):
+                    writer = threading.Thread(target = write_in_parts)
+                    writer.start()
+                    events = []
+                    with InputDevice(self.path, batch_size, decoder) as device:
+                        device.loop_events(events.append)
+                    writer.join()
+                    self.assertEqual([(event.type, event.code, event.value) for event in events], 
+                                     [(EV_KEY, KEY_A, KEY_DOWN), (EV_SYN, SYN_REPORT, 0), 
+                                      (EV_KEY, KEY_A, KEY_UP), (EV_SYN, SYN_REPORT, 0)])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,181 @@
+"""Tests of the Kodi plugin against a local fake Kodi.
+
+License:
+    LGPL v2.1
+
+    This library is free software; you can redistribute it and/or
+    modify it under the terms of the GNU Lesser General Public
+    License as published by the Free Software Foundation; either
+    version 2.1 of the License, or (at your option) any later version.
+
+    This library is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+    Lesser General Public License for more details.
+
+    You should have received a copy of the GNU Lesser General Public
+    License along with this library; if not, write to the Free Software
+    Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301  USA
+
+"""
+import json
+import os
+import queue
+import shutil
+import socket
+import tempfile
+import threading
+import time
+import unittest
+
+from unittest import mock
+
+from plugins import kodi
+from plugins.kodi import KodiLibraryIndex, KodiState, YoutubeStreamCache
+
+# Timeout (in seconds) for anything the tests wait for
+TIMEOUT = 5
+
+class FakeKodi():
+    """Accepts a single connection to Kodi's raw JSON-RPC TCP interface, and sends whatever it is told to."""
+
+    def __init__(self):
+        self._server = socket.create_server(("127.0.0.1", 0))
+        self.port = self._server.getsockname()[1]
+        self._connection = None
+
+    def close(self) -> None:
+        if self._connection is not None:
+            self._connection.close()
+        self._server.close()
+
+    def accept(self) -> None:
+        self._server.settimeout(TIMEOUT)
+        self._connection, _ = self._server.accept()
+        self._connection.settimeout(TIMEOUT)
+
+    def receive_request(self) -> dict:
+        # The requests are small, and aren't sent back to back by the tests
+        return json.loads(self._connection.recv(65536))
+
+    def send_in_chunks(self, message: dict, chunk_size: int) -> None:
+        data = json.dumps(message, ensure_ascii = False).encode("utf-8")
+        for offset in range(0, len(data), chunk_size):
+            self._connection.sendall(data[offset:offset + chunk_size])
+            time.sleep(0.001)
+
+class KodiStateTest(unittest.TestCase):
+
+    def setUp(self):
+        self.kodi = FakeKodi()
+        self.addCleanup(self.kodi.close)
+        self.notifications = queue.Queue()
+        self.state = KodiState("127.0.0.1", self.kodi.port, reconnect_delay = 0.1)
+        self.state.add_listener(lambda method, params: self.notifications.put((method, params)))
+        self.state.start()
+        self.addCleanup(self.state.close)
+        self.kodi.accept()
+
+    def test_chunked_messages(self):
+        request = self.kodi.receive_request()
+        self.assertEqual(request["method"], "Player.GetActivePlayers")
+        self.kodi.send_in_chunks({"id": request["id"], "jsonrpc": "2.0",
+                                  "result": [{"playerid": 0, "type": "audio"}]}, 7)
+        # A chunk size of 1 splits every multi-byte character
+        title = "Café ☕ 音楽"
+        self.kodi.send_in_chunks({"jsonrpc": "2.0", "method": "Player.OnPlay",
+                                  "params": {"data": {"item": {"type": "song", "title": title},
+                                                      "player": {"playerid": 0, "speed": 1}}}}, 1)
+
+        method, params = self.notifications.get(timeout = TIMEOUT)
+        self.assertEqual(method, "Player.OnPlay")
+        self.assertEqual(params["data"]["item"]["title"], title)
+        self.assertTrue(self.state.synced)
+        self.assertEqual(self.state.active_players, {0: {"type": "audio", "speed": 1}})
+
+    def test_failing_response_handler(self):
+        request = self.kodi.receive_request()
+        self.kodi.send_in_chunks({"id": request["id"], "jsonrpc": "2.0", "result": []}, 65536)
+        deadline = time.monotonic() + TIMEOUT
+        while not self.state.synced and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+        def fail(result):
+            raise ValueError(result)
+
+        self.state.send("JSONRPC.Ping", handler = fail)
+        request = self.kodi.receive_request()
+        self.kodi.send_in_chunks({"id": request["id"], "jsonrpc": "2.0", "result": "pong"}, 65536)
+        self.kodi.send_in_chunks({"jsonrpc": "2.0", "method": "Player.OnPause",
+                                  "params": {"data": {"item": {"type": "song"},
+                                                      "player": {"playerid": 0, "speed": 0}}}}, 65536)
+
+        # Notifications are still handled after the failure
+        method, _ = self.notifications.get(timeout = TIMEOUT)
+        self.assertEqual(method, "Player.OnPause")
+        self.assertEqual(self.state.active_players, {0: {"type": "song", "speed": 0}})
+
+class KodiLibraryIndexTest(unittest.TestCase):
+
+    class Player():
+        host = "127.0.0.1"
+
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self.cache_file = os.path.join(directory, "kodi_library.json")
+
+    def test_notifications_saved_once(self):
+        index = KodiLibraryIndex(self.Player(), self.cache_file)
+        index.SAVE_DELAY = 0.2
+        with mock.patch.object(kodi.json, "dump", wraps = json.dump) as dump:
+            # As a library scan
+            for id in range(1000):
+                index._update("song", id, f"Song {id}")
+            index._remove("song", 0)
+            self.assertFalse(os.path.exists(self.cache_file))
+            time.sleep(0.5)
+            self.assertEqual(dump.call_count, 1)
+
+            index._update("song", 1000, "Song 1000")
+            index.close()
+            self.assertEqual(dump.call_count, 2)
+
+        self.assertEqual(len(KodiLibraryIndex(self.Player(), self.cache_file).songs), 1000)
+
+class YoutubeStreamCacheTest(unittest.TestCase):
+
+    def test_prefetch(self):
+        lock = threading.Lock()
+        extracted = []
+        running = [0, 0]
+
+        def extract_stream_url(url):
+            with lock:
+                extracted.append(url)
+                running[0] += 1
+                running[1] = max(running)
+            time.sleep(0.1)
+            with lock:
+                running[0] -= 1
+            return f"{url}/stream"
+
+        cache = YoutubeStreamCache()
+        urls = [f"https://www.youtube.com/watch?v={id}" for id in range(4)]
+        with mock.patch.object(YoutubeStreamCache, "_extract_stream_url", staticmethod(extract_stream_url)):
+            for url in urls[:3]:
+                cache.prefetch([url])
+            time.sleep(0.5)
+            # Resolved one at a time
+            self.assertEqual(extracted, urls[:3])
+            self.assertEqual(running[1], 1)
+
+            cache.prefetch([urls[3]])
+            time.sleep(0.05)
+            # Waits for the prefetch in progress, rather than resolving again
+            for url in urls:
+                self.assertEqual(cache.resolve(url), f"{url}/stream")
+        self.assertEqual(extracted, urls)
+
+if __name__ == "__main__":
+    unittest.main()